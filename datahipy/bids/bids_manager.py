@@ -7,53 +7,137 @@ import os
 import re
 import json
 
-from datahipy.bids.dataset import create_bids_layout
+# Regular expression matching a zero-padded run index in a filename (e.g. "_run-01_")
+ZERO_PADDED_RUN_REGEX = re.compile(r"_run-0([0-9])_")
 
 
-def post_import_bids_refinement(bids_dir):
+def post_import_bids_refinement(bids_dir, subjects=None, sessions=None):
     """Refine BIDS files after import.
 
+    The files of the dataset are walked once and each file is passed to the
+    rules of `REFINEMENT_RULES` matching its suffix and extension. The walk can
+    be restricted to the subjects and sessions of the imported files, in which
+    case only the dataset-level files are refined in addition.
+
     Parameters
     ----------
     bids_dir : str
         Path to the BIDS dataset.
+
+    subjects : list of str
+        List of subject labels (with or without the `sub-` prefix) whose files
+        are refined. If None, the files of all the subjects are refined.
+
+    sessions : list of str
+        List of session labels (with or without the `ses-` prefix) whose files
+        are refined. The files outside of session directories are always refined.
+        If None, the files of all the sessions are refined.
     """
-    # Create BIDSLayout object representation
-    layout = create_bids_layout(bids_dir)
-    # Correct BIDS iEEG json files
-    correct_bids_ieeg_json_files(layout)
-    # Remove scans.tsv files
-    remove_scans_tsv_files(layout)
-    # Remove events.tsv files if they consist only of one line (i.e., header)
-    clean_empty_events_tsv_files(layout)
     # Correct format of some fields expecting list type in dataset_description.json
     ensure_list_fields_in_dataset_description(
         bids_dir=bids_dir, fields=["Funding", "ReferencesAndLinks"]
     )
-    # Rename files with run-0X to run-X
-    correct_run_index_filename(layout)
+    # Apply the rules matching each file in a single pass
+    for filepath in iter_refinement_files(
+        bids_dir, subjects=subjects, sessions=sessions
+    ):
+        apply_refinement_rules(filepath)
+
 
+def iter_refinement_files(bids_dir, subjects=None, sessions=None):
+    """Yield the paths of the top-level files and of the subject files of a BIDS dataset.
 
-def correct_bids_ieeg_json_files(layout):
-    """Correct BIDS iEEG json files.
+    Hidden files and directories are skipped, as well as the top-level directories
+    not indexed by pybids (e.g. `code/`, `sourcedata/`, `derivatives/`).
 
     Parameters
     ----------
-    layout : bids.BIDSLayout
-        BIDSLayout object representation of the BIDS dataset.
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    subjects : list of str
+        List of subject labels (with or without the `sub-` prefix) whose files are
+        yielded. If None, the files of all the subjects are yielded.
+
+    sessions : list of str
+        List of session labels (with or without the `ses-` prefix) whose files are
+        yielded. The files outside of session directories are always yielded.
+        If None, the files of all the sessions are yielded.
+
+    Yields
+    ------
+    str
+        Path of a file.
     """
-    ieeg_json_files = layout.get(suffix="ieeg", extension="json")
-    for ieeg_json_file in ieeg_json_files:
-        print(f"> Correcting {ieeg_json_file.path}...")
-        correct_bids_ieeg_json_content = correct_bids_ieeg_json_file(
-            ieeg_json_file.path
-        )
-        print(f"  .. New content: {correct_bids_ieeg_json_content}")
+    if subjects is not None:
+        subjects = {"sub-" + sub.replace("sub-", "", 1) for sub in subjects}
+    if sessions is not None:
+        sessions = {"ses-" + ses.replace("ses-", "", 1) for ses in sessions}
+    with os.scandir(bids_dir) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            if entry.name.startswith("."):
+                continue
+            if not entry.is_dir():
+                yield entry.path
+            elif entry.name.startswith("sub-") and (
+                subjects is None or entry.name in subjects
+            ):
+                for root, dirs, files in os.walk(entry.path):
+                    dirs[:] = sorted(
+                        d
+                        for d in dirs
+                        if not d.startswith(".")
+                        and (
+                            sessions is None
+                            or root != entry.path
+                            or not d.startswith("ses-")
+                            or d in sessions
+                        )
+                    )
+                    for filename in sorted(files):
+                        if not filename.startswith("."):
+                            yield os.path.join(root, filename)
+
+
+def apply_refinement_rules(filepath):
+    """Apply the refinement rules matching a file.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the file.
+
+    Returns
+    -------
+    filepath : str
+        Path to the file after refinement, or None if the file was removed.
+    """
+    for suffix, extension, rule in REFINEMENT_RULES:
+        filename = os.path.basename(filepath)
+        stem, _, file_extension = filename.partition(".")
+        if suffix is not None and stem.rsplit("_", 1)[-1] != suffix:
+            continue
+        if extension is not None and f".{file_extension}" != extension:
+            continue
+        filepath = rule(filepath)
+        if filepath is None:
+            break
+    return filepath
+
+
+def correct_bids_ieeg_json_rule(filepath):
+    """Correct a BIDS iEEG json file (see :py:func:`correct_bids_ieeg_json_file`)."""
+    print(f"> Correcting {filepath}...")
+    correct_bids_ieeg_json_content = correct_bids_ieeg_json_file(filepath)
+    print(f"  .. New content: {correct_bids_ieeg_json_content}")
+    return filepath
 
 
 def correct_bids_ieeg_json_file(bids_ieeg_json):
     """Correct BIDS iEEG json file.
 
+    The file is only overwritten if its content is modified.
+
     Parameters
     ----------
     bids_ieeg_json : str
@@ -74,47 +158,49 @@ def correct_bids_ieeg_json_file(bids_ieeg_json):
     if "AcquisitionDate" in bids_ieeg_json_content.keys():
         del bids_ieeg_json_content["AcquisitionDate"]
 
-    # Save the corrected BIDS iEEG json file
-    with open(bids_ieeg_json, "w") as f:
-        json.dump(bids_ieeg_json_content, f, indent=4)
+        # Save the corrected BIDS iEEG json file
+        with open(bids_ieeg_json, "w") as f:
+            json.dump(bids_ieeg_json_content, f, indent=4)
 
     return bids_ieeg_json_content
 
 
-def remove_scans_tsv_files(layout):
-    """Remove scans.tsv files.
+def remove_scans_tsv_rule(filepath):
+    """Remove a scans.tsv file."""
+    print(f"> Removing {filepath}...")
+    os.remove(filepath)
+    return None
 
-    Parameters
-    ----------
-    layout : bids.BIDSLayout
-        BIDSLayout object representation of the BIDS dataset.
-    """
-    scans_files = layout.get(suffix="scans", extension="tsv")
-    for scans_file in scans_files:
-        print(f"> Removing {scans_file.path}...")
-        os.remove(scans_file.path)
 
+def clean_empty_events_tsv_rule(filepath):
+    """Remove an events.tsv file if it consists only of one line (i.e., header)."""
+    with open(filepath, "r") as f:
+        events_file_content = f.readlines()
+    if len(events_file_content) == 1:
+        print(f"> Removing {filepath} which is empty...")
+        os.remove(filepath)
+        return None
+    return filepath
 
-def clean_empty_events_tsv_files(layout):
-    """Remove empty events.tsv files.
 
-    Parameters
-    ----------
-    layout : bids.BIDSLayout
-        BIDSLayout object representation of the BIDS dataset.
-    """
-    events_files = layout.get(suffix="events", extension="tsv")
-    for events_file in events_files:
-        with open(events_file.path, "r") as f:
-            events_file_content = f.readlines()
-        if len(events_file_content) == 1:
-            print(f"> Removing {events_file.path} which is empty...")
-            os.remove(events_file.path)
+def correct_run_index_rule(filepath):
+    """Rename a file with a zero-padded run index (run-0X to run-X)."""
+    filename = os.path.basename(filepath)
+    if not ZERO_PADDED_RUN_REGEX.search(filename):
+        return filepath
+    new_filepath = os.path.join(
+        os.path.dirname(filepath), ZERO_PADDED_RUN_REGEX.sub(r"_run-\1_", filename)
+    )
+    print(f"> Renaming {filepath} to {new_filepath}...")
+    os.rename(filepath, new_filepath)
+    return new_filepath
 
 
 def ensure_list_fields_in_dataset_description(bids_dir, fields):
     """Ensure that some fields are list type in dataset_description.json.
 
+    The file is only overwritten if one of the fields is modified.
+
     Parameters
     ----------
     bids_dir : str
@@ -127,31 +213,28 @@ def ensure_list_fields_in_dataset_description(bids_dir, fields):
     with open(dataset_desc_path, "r") as f:
         dataset_desc = json.load(f)
     # Ensure that some fields are list type
+    is_modified = False
     for field in fields:
         if field in dataset_desc.keys():
             if not isinstance(dataset_desc[field], list):
                 dataset_desc[field] = [dataset_desc[field]]
+                is_modified = True
     # Overwrite dataset_description.json
-    with open(dataset_desc_path, "w") as f:
-        json.dump(dataset_desc, f, indent=4)
-
+    if is_modified:
+        with open(dataset_desc_path, "w") as f:
+            json.dump(dataset_desc, f, indent=4)
 
-def correct_run_index_filename(layout):
-    """Correct run index in BIDS filenames.
 
-    Parameters
-    ----------
-    layout : bids.BIDSLayout
-        BIDSLayout object representation of the BIDS dataset.
-    """
-    for filename in layout.get(return_type="file"):
-        if re.search(r"_run-0[0-9]_", os.path.basename(filename)):
-            run_num = int(
-                re.search(r"_run-0([0-9])_", os.path.basename(filename)).group(1)
-            )
-            new_filename = os.path.join(
-                os.path.dirname(filename),
-                os.path.basename(filename).replace(f"run-0{run_num}", f"run-{run_num}"),
-            )
-            print(f"> Renaming {filename} to {new_filename}...")
-            os.rename(filename, new_filename)
+# Rules applied in order to the files of a dataset after import as
+# (suffix, extension, rule) where a suffix or extension set to None matches any file.
+# A rule returns the path to the file after its application, or None if the file was removed.
+REFINEMENT_RULES = [
+    # Correct BIDS iEEG json files
+    ("ieeg", ".json", correct_bids_ieeg_json_rule),
+    # Remove scans.tsv files
+    ("scans", ".tsv", remove_scans_tsv_rule),
+    # Remove events.tsv files if they consist only of one line (i.e., header)
+    ("events", ".tsv", clean_empty_events_tsv_rule),
+    # Rename files with run-0X to run-X
+    (None, None, correct_run_index_rule),
+]
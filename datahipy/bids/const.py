@@ -5,6 +5,9 @@
 
 BIDS_VERSION = "v1.7.0"
 
+# Output formats supported by the datasets.get command
+DATASETS_OUTPUT_FORMATS = ["json", "ndjson"]
+
 BIDS_ENTITY_MAP = {
     "subject": "sub",
     "session": "ses",
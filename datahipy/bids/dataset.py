@@ -4,9 +4,15 @@
 """Utility functions to retrieve BIDS dataset content to be indexed by the Elasticsearch engine of the HIP."""
 
 import os
+import re
+import math
 import json
-import subprocess
-from concurrent.futures import ProcessPoolExecutor
+import shutil
+import hashlib
+import time
+import tempfile
+import threading
+from collections import OrderedDict
 from pkg_resources import resource_filename
 from sre_constants import SUCCESS
 from datetime import date
@@ -17,17 +23,61 @@ import datalad.api
 
 from datahipy.bids.electrophy import get_ieeg_info
 from datahipy.bids.participant import get_participants_info
+from datahipy.bids.size import get_dataset_size_info, format_size, SIZE_CACHE_NAMESPACE
 from datahipy.bids.validation import (
     add_bidsignore_validation_rule,
     get_bids_validator_output_info,
 )
+from datahipy.bids.const import DATASETS_OUTPUT_FORMATS
 from datahipy.bids.version import determine_bids_schema_version
+from datahipy.info import __version__
+from datahipy.utils.cache import (
+    get_cache_entry_path,
+    get_dataset_fingerprint,
+    get_toplevel_fingerprints,
+    load_cache_entry,
+    peek_cache_entry,
+    save_cache_entry,
+    invalidate_cache_entry,
+    evict_cache,
+)
+from datahipy.utils.saving import save_dataset
+from datahipy.utils.scheduler import run_tasks
 
 # Set the number of threads to use for parallel processing
 # Modify this value if you want to use more or less threads or
 # if you want to set it to 1 to avoid parallel processing
 NUM_THREADS = os.cpu_count() - 1 if os.cpu_count() > 1 else 1
 
+# Name of the cache namespace used to store dataset summaries
+SUMMARY_CACHE_NAMESPACE = "summaries"
+
+# Top-level entries of a dataset whose modification only changes the size in its summary
+SUMMARY_SIZE_ONLY_ENTRIES = ["CHANGES"]
+
+# Name of the cache namespace used to store the past runtimes of datasets.get
+RUNTIME_CACHE_NAMESPACE = "runtimes"
+
+# Number of past runtimes kept for each dataset
+RUNTIME_HISTORY_SIZE = 5
+
+# Estimated processing time in seconds per file of a dataset,
+# used when no runtime was recorded for the dataset
+DEFAULT_SECONDS_PER_FILE = 0.01
+
+# Name of the cache namespace used to store PyBIDS layout databases
+LAYOUT_CACHE_NAMESPACE = "layouts"
+
+# Top-level directories not indexed by PyBIDS
+LAYOUT_IGNORED_DIRS = ["code", "derivatives", "models", "sourcedata", "stimuli"]
+
+# Maximal number of PyBIDS layouts kept in memory by a process
+LAYOUT_MEMORY_CACHE_SIZE = 8
+
+# PyBIDS layouts created by the current process indexed by (dataset, scope)
+_LAYOUTS = OrderedDict()
+_LAYOUTS_LOCK = threading.Lock()
+
 
 def create_initial_bids_readme(bids_dir, dataset_desc):
     """Create an initial `README` file for a BIDS dataset.
@@ -135,34 +185,158 @@ def create_empty_bids_dataset(bids_dir=None, dataset_desc=None, project_dir=None
         save_params["path"] = bids_dir
     else:
         save_params["dataset"] = bids_dir
-    datalad.api.save(**save_params)
+    save_dataset(**save_params)
     print(SUCCESS)
 
 
-def create_bids_layout(bids_dir=None, **kwargs):
+def create_bids_layout(bids_dir=None, subjects=None, use_cache=True, **kwargs):
     """Create a pybids representation of a BIDS dataset.
 
+    The layout index is persisted in a SQLite database of the datahipy cache
+    and reused as long as the indexed files are unchanged. Within a process,
+    the layout object itself is reused. The index can be restricted to a list
+    of subjects so that it is only refreshed when one of them changes.
+
     Parameters
     ----------
     bids_dir : str
         Path to the BIDS dataset.
 
+    subjects : list of str
+        List of subject labels (with or without the `sub-` prefix) to restrict
+        the index to. If None, all the subjects are indexed.
+
+    use_cache : bool
+        If False, the layout is created without reusing any index.
+
     kwargs : dict
         Dictionary of arguments key/value to pass to the pybids BIDSLayout function.
+        The index is not persisted if any is specified.
 
     Returns
     -------
     layout : pybids.BIDSLayout
         Pybids representation of the BIDS dataset.
     """
-    # Create a pybids representation of the dataset
-    layout = BIDSLayout(
+    bids_dir = os.path.abspath(bids_dir)
+    if subjects is not None:
+        subjects = sorted({sub.replace("sub-", "", 1) for sub in subjects})
+        kwargs["ignore"] = get_layout_ignore_patterns(subjects)
+    if not use_cache or (set(kwargs) - {"ignore"}):
+        return _create_bids_layout(bids_dir, **kwargs)
+    scope = "all" if subjects is None else "sub-" + ",".join(subjects)
+    fingerprint = get_layout_fingerprint(bids_dir, subjects=subjects)
+    # Reuse the layout already created by the current process
+    with _LAYOUTS_LOCK:
+        if _LAYOUTS.get((bids_dir, scope), (None,))[0] == fingerprint:
+            _LAYOUTS.move_to_end((bids_dir, scope))
+            return _LAYOUTS[(bids_dir, scope)][1]
+    # Reuse the layout database of the cache or (re-)index the dataset
+    try:
+        layout = _load_or_index_bids_layout(bids_dir, scope, fingerprint, **kwargs)
+    except Exception as e:  # pragma: no cover
+        print(f"WARNING: Could not use the cached layout database: {e}")
+        layout = _create_bids_layout(bids_dir, **kwargs)
+    with _LAYOUTS_LOCK:
+        _LAYOUTS[(bids_dir, scope)] = (fingerprint, layout)
+        _LAYOUTS.move_to_end((bids_dir, scope))
+        while len(_LAYOUTS) > LAYOUT_MEMORY_CACHE_SIZE:
+            _LAYOUTS.popitem(last=False)
+    return layout
+
+
+def _create_bids_layout(bids_dir, **kwargs):
+    """Create a pybids representation of a BIDS dataset with the datahipy configuration."""
+    return BIDSLayout(
         root=bids_dir,
         validate=False,
         config=resource_filename("datahipy", "bids/config/bids.json"),
         **kwargs,
     )
-    return layout
+
+
+def _load_or_index_bids_layout(bids_dir, scope, fingerprint, **kwargs):
+    """Load a layout from its up-to-date cached database, or index the dataset in a new one."""
+    database_dir = get_cache_entry_path(
+        LAYOUT_CACHE_NAMESPACE, bids_dir, name=scope, suffix=""
+    )
+    fingerprint_file = os.path.join(database_dir, "fingerprint.json")
+    try:
+        with open(fingerprint_file, "r") as f:
+            is_valid = json.load(f) == {"version": __version__, "fingerprint": fingerprint}
+    except (OSError, ValueError):
+        is_valid = False
+    if not is_valid:
+        print(f"> Index dataset {bids_dir} (scope: {scope})...")
+        # Index the dataset in a temporary database that replaces the stale one
+        # once complete so that concurrent processes never load a partial index
+        tmp_dir = tempfile.mkdtemp(prefix=".", dir=os.path.dirname(database_dir))
+        _create_bids_layout(bids_dir, database_path=tmp_dir, **kwargs)
+        with open(os.path.join(tmp_dir, "fingerprint.json"), "w") as f:
+            json.dump({"version": __version__, "fingerprint": fingerprint}, f)
+        shutil.rmtree(database_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, database_dir)
+        except OSError:  # pragma: no cover
+            # Another process has just written an up-to-date database
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        evict_cache(LAYOUT_CACHE_NAMESPACE)
+    else:
+        # Update the modification time used for least-recently-used eviction
+        os.utime(database_dir)
+    return _create_bids_layout(bids_dir, database_path=database_dir, **kwargs)
+
+
+def get_layout_ignore_patterns(subjects):
+    """Return the PyBIDS ignore patterns restricting the index of a dataset to a list of subjects.
+
+    Parameters
+    ----------
+    subjects : list of str
+        List of subject labels (without the `sub-` prefix).
+
+    Returns
+    -------
+    ignore : list
+        List of paths and regular expressions to pass as `ignore` to BIDSLayout.
+    """
+    try:
+        from bids.layout.validation import DEFAULT_LOCATIONS_TO_IGNORE
+
+        ignore = list(DEFAULT_LOCATIONS_TO_IGNORE)
+    except ImportError:  # pragma: no cover
+        ignore = ["code", "stimuli", "sourcedata", "models", re.compile(r"^\.")]
+    labels = "|".join(re.escape(sub) for sub in subjects)
+    ignore.append(re.compile(rf"^/?sub-(?!(?:{labels})(?:/|$))"))
+    return ignore
+
+
+def get_layout_fingerprint(bids_dir, subjects=None):
+    """Return a fingerprint of the files of a BIDS dataset indexed by PyBIDS.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    subjects : list of str
+        List of subject labels (without the `sub-` prefix) the index is restricted to.
+        If None, all subjects are considered.
+
+    Returns
+    -------
+    fingerprint : str
+        Hexadecimal digest of the fingerprints of the indexed top-level entries.
+    """
+    digest = hashlib.sha1()
+    for name, entry_fingerprint in sorted(get_toplevel_fingerprints(bids_dir).items()):
+        if os.path.isdir(os.path.join(bids_dir, name)):
+            if name in LAYOUT_IGNORED_DIRS or name.startswith("."):
+                continue
+            if subjects is not None and name not in [f"sub-{sub}" for sub in subjects]:
+                continue
+        digest.update(f"{name}:{entry_fingerprint}\n".encode())
+    return digest.hexdigest()
 
 
 def get_bids_layout_info(bids_dir):
@@ -199,7 +373,7 @@ def get_bids_layout_info(bids_dir):
 
 
 def get_dataset_size(bids_dir=None):
-    """Return the size of the BIDS dataset in megabytes.
+    """Return the size of the BIDS dataset in a human-readable format (e.g. "12M").
 
     Parameters
     ----------
@@ -209,32 +383,100 @@ def get_dataset_size(bids_dir=None):
     Returns
     -------
     total_size_megabytes : str
-        Size of the BIDS dataset in megabytes.
+        Size of the BIDS dataset in a human-readable format,
+        as computed by :py:func:`datahipy.bids.size.get_dataset_size_info`.
     """
-    # Get total number of files and size
-    total_size_megabytes = (
-        subprocess.check_output(["du", "-sh", bids_dir]).split()[0].decode("utf-8")
-    )
-    ## Alternative: Count only files outside sourcedata/
-    # total_size_bytes = 0
-    # files = layout.get_files()
-    # for f in files:
-    #     total_size_bytes += os.path.getsize(f)
-    # # Convert once from bytes to megabytes (getsize return bytes)
-    # total_size_megabytes = 1e-6 * total_size_bytes
-    # total_size_megabytes = f'{total_size_megabytes:.2f}'
-    # del files
-    return total_size_megabytes
-
-
-def get_bidsdataset_content(bids_dir=None):
+    return format_size(get_dataset_size_info(bids_dir)["TotalBytes"])
+
+
+def get_bidsdataset_content(bids_dir=None, use_cache=True):
     """Create a dictionary storing dataset information indexed by the HIP platform.
 
+    The summary is cached on disk and reused as long as the dataset is unchanged,
+    i.e. as long as its git HEAD commit and its working tree are the same
+    (see :py:func:`datahipy.utils.cache.get_dataset_fingerprint`).
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    use_cache : bool
+        If False, the summary is recomputed and the cache entry of the dataset
+        is invalidated.
+
+    Returns
+    -------
+    dataset_desc : dict
+        Dictionary storing dataset information indexed by the HIP platform.
+    """
+    # Import here to avoid circular import
+    from datahipy.utils.versioning import get_latest_tag
+    # Create the .bidsignore file if it does not exist and
+    # add the line to ignore CT files (not yet supported by the validator).
+    # This is done first as it might modify the dataset fingerprint.
+    add_bidsignore_validation_rule(bids_dir, "**/*_ct.*")
+    # Reuse the cached summary if the dataset has not changed since it was computed
+    dataset_desc = None
+    fingerprint = get_dataset_fingerprint(bids_dir)
+    if use_cache:
+        dataset_desc = load_cache_entry(SUMMARY_CACHE_NAMESPACE, bids_dir, fingerprint)
+        if dataset_desc is not None:
+            print(f"> Reuse cached summary of dataset {bids_dir}")
+    else:
+        invalidate_cache_entry(SUMMARY_CACHE_NAMESPACE, bids_dir)
+    if dataset_desc is None:
+        dataset_desc = compute_bidsdataset_content(bids_dir, use_cache=use_cache)
+        save_cache_entry(SUMMARY_CACHE_NAMESPACE, bids_dir, fingerprint, dataset_desc)
+    # Add the latest tag of the dataset as the dataset version.
+    # Tags are not part of the fingerprint so it is always retrieved.
+    dataset_desc["DatasetVersion"] = get_latest_tag(bids_dir)
+    # Return the created dataset_desc dictionary to be indexed
+    return dataset_desc
+
+
+def get_bidsdataset_state(bids_dir):
+    """Return the state of a dataset before a modification, to update its summary afterwards.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    Returns
+    -------
+    state : dict
+        Dictionary with the fingerprints of the top-level entries of the dataset
+        (`toplevel`) and its cached summary (`summary`, None if not cached).
+        To be passed to :py:func:`get_updated_bidsdataset_content`.
+    """
+    # Same modification as in get_bidsdataset_content to get the same fingerprint
+    add_bidsignore_validation_rule(bids_dir, "**/*_ct.*")
+    fingerprint = get_dataset_fingerprint(bids_dir)
+    return {
+        "toplevel": get_toplevel_fingerprints(bids_dir),
+        "summary": load_cache_entry(SUMMARY_CACHE_NAMESPACE, bids_dir, fingerprint),
+    }
+
+
+def get_updated_bidsdataset_content(bids_dir, state):
+    """Return the summary of a modified dataset, reusing its previous summary if possible.
+
+    If only entries of `SUMMARY_SIZE_ONLY_ENTRIES` (e.g. `CHANGES` when a version is
+    released) changed since the state was retrieved and the summary was cached at
+    that time, the participants, bids-validator and pybids information of the cached
+    summary are reused and only the sizes are updated. Otherwise, the summary is
+    retrieved with :py:func:`get_bidsdataset_content`.
+
     Parameters
     ----------
     bids_dir : str
         Path to the BIDS dataset.
 
+    state : dict
+        State of the dataset before the modification,
+        as returned by :py:func:`get_bidsdataset_state`.
+
     Returns
     -------
     dataset_desc : dict
@@ -242,37 +484,88 @@ def get_bidsdataset_content(bids_dir=None):
     """
     # Import here to avoid circular import
     from datahipy.utils.versioning import get_latest_tag
+
+    toplevel = get_toplevel_fingerprints(bids_dir)
+    changed_entries = {
+        name
+        for name in set(toplevel) | set(state["toplevel"])
+        if toplevel.get(name) != state["toplevel"].get(name)
+    }
+    if state["summary"] is None or not changed_entries <= set(SUMMARY_SIZE_ONLY_ENTRIES):
+        return get_bidsdataset_content(bids_dir)
+    print(
+        f"> Reuse summary of dataset {bids_dir} "
+        f"(changed top-level entries: {sorted(changed_entries)})"
+    )
+    dataset_desc = dict(state["summary"])
+    # Update the sizes, reusing the cached sizes of the unchanged directories
+    size_info = get_dataset_size_info(bids_dir)
+    dataset_desc["Size"] = format_size(size_info["TotalBytes"])
+    dataset_desc["SizeInfo"] = size_info
+    save_cache_entry(
+        SUMMARY_CACHE_NAMESPACE, bids_dir, get_dataset_fingerprint(bids_dir), dataset_desc
+    )
+    dataset_desc["DatasetVersion"] = get_latest_tag(bids_dir)
+    return dataset_desc
+
+
+def compute_bidsdataset_content(bids_dir=None, use_cache=True):
+    """Compute the dataset information indexed by the HIP platform without using the cache.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    use_cache : bool
+        If False, the cached directory sizes and bids-validator outputs are not reused.
+
+    Returns
+    -------
+    dataset_desc : dict
+        Dictionary storing dataset information indexed by the HIP platform
+        (except the dataset version).
+    """
     # Load the dataset_description.json as initial dictionary-based description
     with open(os.path.join(bids_dir, "dataset_description.json"), "r") as f:
         dataset_desc = json.load(f)
     # Load the participants.tsv file to extract information about participants
     dataset_desc.update(get_participants_info(bids_dir=bids_dir))
-    # Get the dataset size
-    dataset_desc["Size"] = get_dataset_size(bids_dir)
+    # Get the dataset size in a human-readable format and
+    # the detailed sizes in bytes
+    size_info = get_dataset_size_info(bids_dir, use_cache=use_cache)
+    dataset_desc["Size"] = format_size(size_info["TotalBytes"])
+    dataset_desc["SizeInfo"] = size_info
     # Check if the field BIDSVersion is present in the dataset_description.json.
     # If not, use the default BIDS_VERSION. If present, add 'v' to match the
     # schema version expected by the validator
     bids_schema_version = determine_bids_schema_version(dataset_desc)
-    # Create the .bidsignore file if it does not exist and
-    # add the line to ignore CT files (not yet supported by the validator)
-    add_bidsignore_validation_rule(bids_dir, "**/*_ct.*")
     # Run the bids-validator on the dataset with the specified schema version and
     # update dataset_desc with the execution dictionary output
-    dataset_desc.update(get_bids_validator_output_info(bids_dir, bids_schema_version))
+    dataset_desc.update(
+        get_bids_validator_output_info(bids_dir, bids_schema_version, use_cache=use_cache)
+    )
     # Add information retrieved with pybids to dataset_desc
     dataset_desc.update(get_bids_layout_info(bids_dir))
-    # Add the latest tag of the dataset as the dataset version
-    dataset_desc["DatasetVersion"] = get_latest_tag(bids_dir)
-    # Return the created dataset_desc dictionary to be indexed
     return dataset_desc
 
 
 def get_all_datasets_content(
     input_data=None,
     output_file=None,
+    use_cache=True,
+    output_format="json",
+    num_workers=None,
+    timeout=None,
+    retries=0,
 ):
     """Return a JSON file containing a list of dataset dictionaries as response to HIP request.
 
+    Datasets are processed in a pool of worker processes (see
+    :py:func:`datahipy.utils.scheduler.run_tasks`). A dataset that cannot be
+    processed does not abort the others and is reported by an error record
+    ``{"path": "/path/to/dataset", "error": {"type": ..., "message": ..., "attempts": ...}}``.
+
     Parameters
     ----------
     input_data : str
@@ -280,27 +573,140 @@ def get_all_datasets_content(
 
     output_file : str
         Path to the output JSON file.
+
+    use_cache : bool
+        If False, do not reuse the cached dataset summaries.
+
+    output_format : str
+        Format of the output file, either:
+
+        * "json": a JSON list of dataset dictionaries (or error records) in the order
+          of the request, written once all datasets have been processed.
+        * "ndjson": one JSON record per line in the order of completion,
+          written and flushed as soon as a dataset has been processed, in the format
+          ``{"path": "/path/to/dataset", "summary": {...}}`` (or an error record).
+
+    num_workers : int
+        Number of worker processes. Default to `NUM_THREADS`.
+
+    timeout : float
+        Maximal duration in seconds of the processing of each dataset (no limit if None).
+
+    retries : int
+        Number of times the processing of a dataset is retried if it fails.
     """
+    if output_format not in DATASETS_OUTPUT_FORMATS:
+        raise ValueError(
+            f"Invalid output format {output_format} "
+            f"(must be one of {DATASETS_OUTPUT_FORMATS})"
+        )
     # Load the HIP json request
     with open(input_data, "r") as f:
         input_content = json.load(f)
     # Extract the list of dataset paths
     dataset_paths = [dataset["path"] for dataset in input_content["datasets"]]
+    # Process the most expensive datasets first so that they do not
+    # end up alone at the end of the run
+    costs = [estimate_dataset_cost(ds_path) for ds_path in dataset_paths]
+    order = sorted(range(len(dataset_paths)), key=lambda i: costs[i], reverse=True)
     # Create a list of dictionaries storing the dataset information
-    # indexed by the HIP platform
-    with ProcessPoolExecutor(max_workers=NUM_THREADS) as executor:
-        datasets_desc = [
-            executor.submit(get_bidsdataset_content, ds_path)
-            for ds_path in dataset_paths
-        ]
-        datasets_desc = [f.result() for f in datasets_desc]
-    # Dump the dataset_desc dict in a .json file
-    if output_file:
+    # indexed by the HIP platform, and write them as soon as they are
+    # computed in the NDJSON format
+    f = open(output_file, "w") if output_file and output_format == "ndjson" else None
+    datasets_desc = [None] * len(dataset_paths)
+    failed_paths = []
+    try:
+        for task_index, task_result, error in run_tasks(
+            get_timed_bidsdataset_content,
+            [(dataset_paths[i], use_cache) for i in order],
+            max_workers=num_workers or NUM_THREADS,
+            timeout=timeout,
+            retries=retries,
+        ):
+            index = order[task_index]
+            if error is not None:
+                failed_paths.append(dataset_paths[index])
+                record = {"path": dataset_paths[index], "error": error}
+                datasets_desc[index] = record
+            else:
+                dataset_desc, duration = task_result
+                # Record the runtime to schedule the dataset better in the next runs
+                record_dataset_runtime(dataset_paths[index], duration)
+                record = {"path": dataset_paths[index], "summary": dataset_desc}
+                datasets_desc[index] = dataset_desc
+            if f is not None:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+    finally:
+        if f is not None:
+            f.close()
+    # Dump the list of dataset_desc dict in a .json file
+    if output_file and output_format == "json":
         with open(output_file, "w") as f:
             json.dump(datasets_desc, f, indent=4)
+    if failed_paths:
+        print(f"WARNING: Could not get the content of datasets {failed_paths}")
     print(SUCCESS)
 
 
+def get_timed_bidsdataset_content(bids_dir, use_cache=True):
+    """Return the summary of :py:func:`get_bidsdataset_content` and its computation time."""
+    start = time.monotonic()
+    dataset_desc = get_bidsdataset_content(bids_dir, use_cache)
+    return dataset_desc, time.monotonic() - start
+
+
+def estimate_dataset_cost(bids_dir):
+    """Estimate the time in seconds needed to get the content of a dataset.
+
+    The estimate is the longest of the last runtimes recorded by
+    :py:func:`record_dataset_runtime` for the dataset, so that a dataset whose
+    summary was recently reused from the cache is not underestimated. If there is
+    none, it is derived from the number of files found the last time the size of
+    the dataset was computed (see :py:func:`datahipy.bids.size.get_dataset_size_info`).
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    Returns
+    -------
+    cost : float
+        Estimated time in seconds, or `math.inf` if the dataset was never processed.
+    """
+    history = peek_cache_entry(RUNTIME_CACHE_NAMESPACE, bids_dir)
+    if history and history.get("durations"):
+        return max(history["durations"])
+    size_entries = peek_cache_entry(SIZE_CACHE_NAMESPACE, bids_dir)
+    if size_entries:
+        file_count = sum(entry["files"] for entry in size_entries.values())
+        return file_count * DEFAULT_SECONDS_PER_FILE
+    # Unknown datasets may be large so they are processed first
+    return math.inf
+
+
+def record_dataset_runtime(bids_dir, duration):
+    """Add the time needed to get the content of a dataset to its runtime history.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    duration : float
+        Time in seconds needed to get the content of the dataset.
+    """
+    history = peek_cache_entry(RUNTIME_CACHE_NAMESPACE, bids_dir) or {}
+    durations = history.get("durations", []) + [duration]
+    save_cache_entry(
+        RUNTIME_CACHE_NAMESPACE,
+        bids_dir,
+        None,
+        {"durations": durations[-RUNTIME_HISTORY_SIZE:]},
+    )
+
+
 def dataset_publish(input_data, output_file):
     """Publish a dataset to the public space of the HIP.
 
@@ -3,24 +3,109 @@
 
 """Utility functions to retrieve information about electrophysiology files (EEG/MEG/iEEG) from a BIDS dataset."""
 
-import pandas as pd
+import os
+import hashlib
+import threading
+from collections import OrderedDict
 
+from datahipy.bids.tsv import iter_tsv_rows
 
-def get_channels_info(channels_tsv_file):
-    """Extract the content from a BIDS _channels.tsv file in JSON format.
+# Maximal number of parsed _channels.tsv files kept in memory
+CHANNELS_CACHE_SIZE = 256
+
+# Parsed _channels.tsv files indexed by the digest of their content
+_CHANNELS_CACHE = OrderedDict()
+_CHANNELS_CACHE_LOCK = threading.Lock()
+
+
+def get_channels_digest(channels_tsv_file):
+    """Return the SHA1 digest of the content of a BIDS _channels.tsv file.
+
+    Parameters
+    ----------
+    channels_tsv_file : str
+        Path to the BIDS _channels.tsv file.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the content of the file.
+    """
+    with open(channels_tsv_file, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def get_channels_info(channels_tsv_file, digest=None):
+    """Extract the content from a BIDS _channels.tsv file as a list of records.
+
+    Files with identical content (e.g. the channels of the different runs of
+    a recording) are parsed only once. The returned list is shared between
+    such files and must not be modified.
 
     Parameters
     ----------
     channels_tsv_file : str
         Path to the BIDS _channels.tsv file.
 
+    digest : str
+        Digest of the content of the file if already computed
+        (see :py:func:`get_channels_digest`).
+
     Returns
     -------
-    channels_info : str
-        JSON representation of the content of the BIDS _channels.tsv file.
+    channels_info : list of dict
+        Content of the BIDS _channels.tsv file with one dictionary per channel.
+        Missing values are set to None.
     """
-    channels_df = pd.read_csv(channels_tsv_file, sep="\t")
-    return channels_df.to_json(orient="records")
+    if digest is None:
+        digest = get_channels_digest(channels_tsv_file)
+    with _CHANNELS_CACHE_LOCK:
+        if digest in _CHANNELS_CACHE:
+            _CHANNELS_CACHE.move_to_end(digest)
+            return _CHANNELS_CACHE[digest]
+    channels_info = list(iter_tsv_rows(channels_tsv_file))
+    with _CHANNELS_CACHE_LOCK:
+        _CHANNELS_CACHE[digest] = channels_info
+        while len(_CHANNELS_CACHE) > CHANNELS_CACHE_SIZE:
+            _CHANNELS_CACHE.popitem(last=False)
+    return channels_info
+
+
+def write_channels_parquet(channels_tsv_file, output_dir):
+    """Write the content of a BIDS _channels.tsv file in a columnar Parquet file.
+
+    The Parquet file is named after the digest of the content of the _channels.tsv
+    file so that files with identical content share the same Parquet file, which
+    is only written once. This requires the optional `pyarrow` package.
+
+    Parameters
+    ----------
+    channels_tsv_file : str
+        Path to the BIDS _channels.tsv file.
+
+    output_dir : str
+        Directory in which the Parquet file is written.
+
+    Returns
+    -------
+    channels_parquet_file : str
+        Path to the Parquet file.
+    """
+    # Import here as pyarrow is an optional dependency
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    digest = get_channels_digest(channels_tsv_file)
+    channels_parquet_file = os.path.join(output_dir, f"{digest}.parquet")
+    if not os.path.exists(channels_parquet_file):
+        os.makedirs(output_dir, exist_ok=True)
+        channels_info = get_channels_info(channels_tsv_file, digest=digest)
+        table = pa.Table.from_pylist(channels_info)
+        # Write to a temporary file first so that a partial file is never reused
+        tmp_file = f"{channels_parquet_file}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_file)
+        os.replace(tmp_file, channels_parquet_file)
+    return channels_parquet_file
 
 
 def get_ieeg_info(layout):
@@ -0,0 +1,135 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Utility functions to resolve the metadata of BIDS files from their JSON sidecars."""
+
+import os
+import json
+import threading
+
+
+def parse_bids_filename(filename):
+    """Return the entities and the suffix of a BIDS filename.
+
+    Parameters
+    ----------
+    filename : str
+        Name of a BIDS file (e.g. `sub-01_ses-01_run-1_T1w.nii.gz`).
+
+    Returns
+    -------
+    entities : dict
+        Entities of the filename (e.g. `{"sub": "01", "ses": "01", "run": "1"}`),
+        or None if the filename does not follow the BIDS naming convention.
+
+    suffix : str
+        Suffix of the filename (e.g. "T1w").
+    """
+    tokens = filename.split(".", 1)[0].split("_")
+    entities = {}
+    for token in tokens[:-1]:
+        key, sep, value = token.partition("-")
+        if not sep:
+            return None, tokens[-1]
+        entities[key] = value
+    return entities, tokens[-1]
+
+
+class SidecarResolver:
+    """Resolver of the metadata of BIDS files from their JSON sidecars.
+
+    Following the BIDS inheritance principle, the metadata of a file merges the
+    JSON sidecars with the same suffix located in its directory or in one of its
+    parent directories up to the dataset root, whose entities are a subset of the
+    entities of the file. The most specific sidecars take precedence.
+
+    Directory listings and parsed JSON sidecars are memoized, so that a sidecar
+    inherited by many files (e.g. from the dataset or session level) is read only once.
+    The resolver can be shared between threads.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+    """
+
+    def __init__(self, bids_dir):
+        self.bids_dir = os.path.abspath(bids_dir)
+        self._sidecars = {}
+        self._contents = {}
+        self._lock = threading.Lock()
+
+    def get_metadata(self, path):
+        """Return the metadata of a file resolved from its JSON sidecars.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file in the BIDS dataset.
+
+        Returns
+        -------
+        metadata : dict
+            Merged content of the JSON sidecars of the file (empty if none).
+        """
+        path = os.path.abspath(path)
+        entities, suffix = parse_bids_filename(os.path.basename(path))
+        if entities is None:
+            return {}
+        # List the directories from the dataset root to the directory of the file
+        relative_dir = os.path.relpath(os.path.dirname(path), self.bids_dir)
+        directories = [self.bids_dir]
+        if relative_dir != os.curdir:
+            for part in relative_dir.split(os.sep):
+                directories.append(os.path.join(directories[-1], part))
+        metadata = {}
+        for directory in directories:
+            # Apply the sidecars of a directory from the least to the most specific
+            sidecars = self._list_sidecars(directory)
+            candidates = [
+                (len(sidecar_entities), sidecar_path)
+                for sidecar_path, sidecar_entities, sidecar_suffix in sidecars
+                if sidecar_suffix == suffix
+                and sidecar_path != path
+                and all(entities.get(k) == v for k, v in sidecar_entities.items())
+            ]
+            for _, sidecar_path in sorted(candidates):
+                metadata.update(self._load_sidecar(sidecar_path))
+        return metadata
+
+    def _list_sidecars(self, directory):
+        """Return the (path, entities, suffix) of the JSON sidecars of a directory."""
+        with self._lock:
+            if directory in self._sidecars:
+                return self._sidecars[directory]
+        sidecars = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or entry.name.startswith("."):
+                        continue
+                    entities, suffix = parse_bids_filename(entry.name)
+                    if entities is not None:
+                        sidecars.append((entry.path, entities, suffix))
+        except OSError:
+            pass
+        with self._lock:
+            self._sidecars[directory] = sidecars
+        return sidecars
+
+    def _load_sidecar(self, sidecar_path):
+        """Return the parsed content of a JSON sidecar (empty if it cannot be read)."""
+        with self._lock:
+            if sidecar_path in self._contents:
+                return self._contents[sidecar_path]
+        try:
+            with open(sidecar_path, "r") as f:
+                content = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Could not read JSON sidecar {sidecar_path}: {e}")
+            content = {}
+        if not isinstance(content, dict):
+            content = {}
+        with self._lock:
+            self._contents[sidecar_path] = content
+        return content
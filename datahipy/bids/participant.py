@@ -3,24 +3,54 @@
 
 """Utility functions to retrieve participant-level information from a BIDS dataset."""
 
-import pandas as pd
+import os
 from os import path as op
+from concurrent.futures import ThreadPoolExecutor
 from datahipy.bids.const import (
     VALID_EXTENSIONS,
     BIDS_ENTITY_MAP,
     BIDSJSONFILE_DATATYPE_KEY_MAP,
     BIDSTSVFILE_DATATYPE_KEY_MAP,
 )
+from datahipy.bids.metadata import SidecarResolver
+from datahipy.bids.tsv import get_participants_tsv_summary
 
+# Default number of threads used to extract the metadata of the files of a subject
+METADATA_MAX_WORKERS = min(8, os.cpu_count() or 1)
 
-def get_subject_bidsfile_info(bids_dir, **kwargs):
+
+def get_subject_bidsfile_info(
+    bids_dir, channels_dir=None, num_threads=None, layout=None, resolver=None, **kwargs
+):
     """Return a list of dictionaries with BIDS file information for a given subject.
 
+    The channels of the EEG, MEG and iEEG files are included as lists of records,
+    or, if `channels_dir` is specified, written as Parquet files in this directory
+    and referenced by their path.
+
     Parameters
     ----------
     bids_dir : str
         Path to the BIDS dataset.
 
+    channels_dir : str
+        Directory in which the channels are written as Parquet files
+        (requires the optional `pyarrow` package). If None or if `pyarrow`
+        is not installed, the channels are included in the returned information.
+
+    num_threads : int
+        Number of threads used to extract the metadata and the channels of the files.
+        Default to `METADATA_MAX_WORKERS`. The order of the returned list does not
+        depend on it.
+
+    layout : pybids.BIDSLayout
+        Pybids representation of the dataset to reuse. If None, it is created
+        and restricted to the subject(s) if specified.
+
+    resolver : datahipy.bids.metadata.SidecarResolver
+        Resolver of the metadata of the files of the dataset to reuse
+        (e.g. between subjects). If None, a new one is created.
+
     kwargs : dict
         Dictionary of arguments key/value to pass to the pybids BIDSLayout.get() function.
 
@@ -31,15 +61,20 @@ def get_subject_bidsfile_info(bids_dir, **kwargs):
     """
     # Import the required functions
     from datahipy.bids.dataset import create_bids_layout
-    from datahipy.bids.electrophy import get_channels_info
 
-    # Create a pybids representation of the dataset
-    layout = create_bids_layout(bids_dir)
+    channels_dir = check_channels_dir(channels_dir)
+    # Create a pybids representation of the dataset,
+    # restricted to the subject(s) if specified
+    if layout is None:
+        subjects = kwargs.get("subject")
+        if isinstance(subjects, str):
+            subjects = [subjects]
+        layout = create_bids_layout(bids_dir, subjects=subjects)
     # Get the list of files for the given subject (and session, task and run if provided)
     files = layout.get(**kwargs)
-    # Initialize the dictionary to be returned
-    subject_bids_file_info = []
-    # Loop over the found files
+    # Extract the information available in the layout in the main thread,
+    # as the layout cannot be shared between threads
+    file_infos = []
     for file in files:
         # Initialize the dictionary with the file information
         file_info = {}
@@ -59,26 +94,134 @@ def get_subject_bidsfile_info(bids_dir, **kwargs):
                 file_info[BIDS_ENTITY_MAP[key]] = file.entities[key]
         # Extract the relative path of the file
         file_info["fileLoc"] = file.relpath
-        # Extract the file metadata from the BIDS json sidecar file
-        file_metadata = layout.get_metadata(file.path)
-        if file_metadata:
-            file_info[
-                BIDSJSONFILE_DATATYPE_KEY_MAP[file_info["datatype"]]
-            ] = file_metadata
-            del file_metadata
-        # Extract the channel information from the channels tsv file for EEG, MEG and iEEG
-        if file_info["datatype"] in ["eeg", "meg", "ieeg"]:
-            file_info[
-                BIDSTSVFILE_DATATYPE_KEY_MAP[file_info["datatype"]]
-            ] = get_channels_info(
-                file.path.split(f'_{file_info["datatype"]}')[0] + "_channels.tsv"
+        file_infos.append((file.path, file_info))
+    # Extract the metadata and channels of the files in parallel (I/O bound),
+    # the JSON sidecars shared by several files being read only once
+    resolver = resolver or SidecarResolver(bids_dir)
+    num_threads = num_threads or METADATA_MAX_WORKERS
+    if num_threads > 1 and len(file_infos) > 1:
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            # map() returns the results in the order of the files
+            subject_bids_file_info = list(
+                executor.map(
+                    lambda args: add_bidsfile_metadata(*args, resolver, channels_dir),
+                    file_infos,
+                )
             )
-        # Add the file information to the list
-        subject_bids_file_info.append(file_info)
+    else:
+        subject_bids_file_info = [
+            add_bidsfile_metadata(path, file_info, resolver, channels_dir)
+            for path, file_info in file_infos
+        ]
     # Return the list of dictionaries
     return subject_bids_file_info
 
 
+def iter_subjects_bidsfile_info(
+    bids_dir, subjects=None, channels_dir=None, num_threads=None
+):
+    """Yield the BIDS file information of several subjects, indexing the dataset once.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    subjects : list of str
+        List of subject labels (without the `sub-` prefix). If None, all the
+        subjects of the dataset are considered.
+
+    channels_dir : str
+        Directory in which the channels are written as Parquet files
+        (see :py:func:`get_subject_bidsfile_info`).
+
+    num_threads : int
+        Number of threads used to extract the metadata and the channels of the files.
+
+    Yields
+    ------
+    subject : str
+        Subject label.
+
+    subject_info : list
+        List of dictionaries with BIDS file information for the subject
+        (see :py:func:`get_subject_bidsfile_info`).
+    """
+    # Import the required functions
+    from datahipy.bids.dataset import create_bids_layout
+
+    channels_dir = check_channels_dir(channels_dir)
+    # Create a single pybids representation and metadata resolver shared by all subjects
+    layout = create_bids_layout(bids_dir, subjects=subjects)
+    resolver = SidecarResolver(bids_dir)
+    if subjects is None:
+        subjects = sorted(layout.get_subjects())
+    for subject in subjects:
+        yield subject, get_subject_bidsfile_info(
+            bids_dir,
+            channels_dir=channels_dir,
+            num_threads=num_threads,
+            layout=layout,
+            resolver=resolver,
+            subject=subject,
+        )
+
+
+def check_channels_dir(channels_dir):
+    """Return the directory of the channels Parquet files, or None if pyarrow is not installed."""
+    if channels_dir is not None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print(
+                "WARNING: pyarrow is not installed. Channels are included in the output."
+            )
+            return None
+    return channels_dir
+
+
+def add_bidsfile_metadata(path, file_info, resolver, channels_dir=None):
+    """Add the metadata and the channels (EEG, MEG and iEEG) of a BIDS file to its information.
+
+    Parameters
+    ----------
+    path : str
+        Path to the BIDS file.
+
+    file_info : dict
+        Dictionary with the information of the file, including its `datatype`.
+
+    resolver : datahipy.bids.metadata.SidecarResolver
+        Resolver of the metadata of the files of the dataset.
+
+    channels_dir : str
+        Directory in which the channels are written as Parquet files.
+        If None, the channels are included in the file information.
+
+    Returns
+    -------
+    file_info : dict
+        Dictionary with the information of the file, updated in place.
+    """
+    from datahipy.bids.electrophy import get_channels_info, write_channels_parquet
+
+    # Extract the file metadata from the BIDS json sidecar files
+    file_metadata = resolver.get_metadata(path)
+    if file_metadata:
+        file_info[BIDSJSONFILE_DATATYPE_KEY_MAP[file_info["datatype"]]] = file_metadata
+    # Extract the channel information from the channels tsv file for EEG, MEG and iEEG
+    if file_info["datatype"] in ["eeg", "meg", "ieeg"]:
+        channels_tsv_file = path.split(f'_{file_info["datatype"]}')[0] + "_channels.tsv"
+        if channels_dir is not None:
+            channels_info = {
+                "ParquetFile": write_channels_parquet(channels_tsv_file, channels_dir)
+            }
+        else:
+            channels_info = get_channels_info(channels_tsv_file)
+        file_info[BIDSTSVFILE_DATATYPE_KEY_MAP[file_info["datatype"]]] = channels_info
+    return file_info
+
+
 def get_participants_info(bids_dir):
     """Update the input `dataset_desc` dictionary with information from the `participants.tsv` file.
 
@@ -95,31 +238,5 @@ def get_participants_info(bids_dir):
     dataset_desc : dict
         Updated dictionary with the dataset content to be indexed.
     """
-    participants_info = {}
-    # Load the participants.tsv file to extract information about participants
-    try:
-        participants_df = pd.read_csv(
-            op.join(bids_dir, "participants.tsv"),
-            sep="\t",
-            header=0,
-            na_filter=False,
-        )
-    except pd.errors.EmptyDataError:
-        participants_df = pd.DataFrame()
-    # Get min and max age of participants
-    if "age" in participants_df.keys():
-        participants_info["AgeMin"] = f'{participants_df["age"].min()}'
-        participants_info["AgeMax"] = f'{participants_df["age"].max()}'
-    else:
-        participants_info["AgeMin"] = None
-        participants_info["AgeMax"] = None
-    participants_info["ParticipantsCount"] = len(participants_df.index)
-    participants_info["ParticipantsGroups"] = (
-        list(participants_df["group"].unique())
-        if "group" in participants_df.keys()
-        else [None]
-    )
-    # Store content of participants.tsv as a dictionary
-    participants_info["Participants"] = participants_df.to_dict(orient="records")
-    del participants_df
-    return participants_info
+    # Load the participants.tsv file in one pass to extract information about participants
+    return get_participants_tsv_summary(op.join(bids_dir, "participants.tsv"))
@@ -0,0 +1,109 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Utility functions to determine the run numbers of files imported in a BIDS dataset."""
+
+import os
+import re
+
+# Regular expression matching the run entity of a filename (e.g. "run-01")
+RUN_REGEX = re.compile(r"^run-([0-9]{1,3})$")
+
+
+class RunIndex:
+    """Index of the maximal run numbers of the files of a subject directory.
+
+    The subject directory is scanned once. For each file with a run entity, the
+    index maps the entities directly preceding the run entity together with the
+    suffix directly following it (e.g. `(("sub-01", "ses-01"), "T1w")` for
+    `sub-01_ses-01_run-02_T1w.nii.gz`) to the maximal run number found, so that
+    the maximal run of a set of entities and a modality is looked up in constant time.
+
+    Parameters
+    ----------
+    root_dir : str
+        Path to the subject directory (e.g. `/path/to/dataset/sub-01`).
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._max_runs = {}
+        for _, _, files in os.walk(root_dir):
+            for filename in files:
+                self.add_filename(filename)
+
+    def add_filename(self, filename):
+        """Add the run number of a filename to the index.
+
+        Parameters
+        ----------
+        filename : str
+            Name of a BIDS file (e.g. `sub-01_ses-01_run-02_T1w.nii.gz`).
+        """
+        tokens = filename.split(".", 1)[0].split("_")
+        for idx, token in enumerate(tokens[:-1]):
+            match = RUN_REGEX.match(token)
+            if not match:
+                continue
+            run = int(match.group(1))
+            # Index all sequences of entities ending right before the run entity
+            for start in range(idx + 1):
+                key = (tuple(tokens[start:idx]), tokens[idx + 1])
+                if run > self._max_runs.get(key, 0):
+                    self._max_runs[key] = run
+
+    @staticmethod
+    def make_key(bids_entities, bids_modality):
+        """Return the index key of a set of BIDS entities and a modality."""
+        return (
+            tuple(
+                f"{bids_key}-{bids_value}"
+                for bids_key, bids_value in bids_entities.items()
+                if bids_value
+            ),
+            bids_modality,
+        )
+
+    def get_max_run(self, bids_entities, bids_modality):
+        """Return the maximal run number of the files with these entities and modality (0 if none).
+
+        Parameters
+        ----------
+        bids_entities : dict
+            BIDS entities (e.g. `{"sub": "01", "ses": "01"}`) in the order
+            they appear in the filenames. Entities without value are ignored.
+
+        bids_modality : str
+            BIDS modality / suffix (e.g. "T1w").
+
+        Returns
+        -------
+        int
+            Maximal run number.
+        """
+        return self._max_runs.get(self.make_key(bids_entities, bids_modality), 0)
+
+    def assign_run(self, bids_entities, bids_modality):
+        """Return the next run number of these entities and modality and record it in the index.
+
+        Parameters
+        ----------
+        bids_entities : dict
+            BIDS entities (e.g. `{"sub": "01", "ses": "01"}`) of the file to import.
+
+        bids_modality : str
+            BIDS modality / suffix (e.g. "T1w") of the file to import.
+
+        Returns
+        -------
+        int
+            Run number assigned to the file.
+        """
+        key = self.make_key(bids_entities, bids_modality)
+        run = self._max_runs.get(key, 0) + 1
+        # Record the run for the key and all the shorter sequences of entities it ends with
+        for start in range(len(key[0]) + 1):
+            sub_key = (key[0][start:], bids_modality)
+            if run > self._max_runs.get(sub_key, 0):
+                self._max_runs[sub_key] = run
+        return run
@@ -0,0 +1,238 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Utility functions to compute the size of a BIDS dataset managed by Datalad/git-annex."""
+
+import os
+import re
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from datahipy.utils.cache import (
+    run_git,
+    load_cache_entry,
+    save_cache_entry,
+)
+
+# Name of the cache namespace used to store directory sizes
+SIZE_CACHE_NAMESPACE = "sizes"
+
+# Top-level directories whose size is reported separately
+SIZE_CATEGORY_DIRS = {
+    "sourcedata": "Sourcedata",
+    "derivatives": "Derivatives",
+}
+
+# Regular expression to extract the size of a git-annex key
+# (e.g. MD5E-s1234--0123456789abcdef.nii.gz)
+ANNEX_KEY_SIZE_REGEX = re.compile(r"-s([0-9]+)(?=-|$)")
+
+
+def get_dataset_size_info(bids_dir, max_workers=None, use_cache=True):
+    """Return the size in bytes of a BIDS dataset split by category.
+
+    The dataset is walked with `os.scandir` in parallel over its top-level
+    directories (and over the sub-directories of `sourcedata/` and `derivatives/`),
+    without following the content of `.git/`. The size of files annexed by
+    git-annex is read from their key, so that content that is not present
+    locally is also accounted for.
+
+    The content of each directory is cached and reused as long as its modification
+    time is unchanged, i.e. as long as no file is added, removed, or renamed in it,
+    and as long as the size and modification time of each of its files that are not
+    annexed are unchanged, as files like JSON sidecars or TSV files can be rewritten
+    in place. The top-level directory is always scanned. The presence of annexed
+    content is re-checked whenever the `git-annex` branch changes.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    max_workers : int
+        Maximal number of threads used to walk the dataset.
+
+    use_cache : bool
+        If False, the whole dataset is walked.
+
+    Returns
+    -------
+    size_info : dict
+        Dictionary with the following sizes in bytes: `TotalBytes`, `RawBytes`,
+        `SourcedataBytes`, `DerivativesBytes`, `AnnexedBytes`, `AnnexPresentBytes`,
+        and `AnnexAbsentBytes`, and the total number of files `FileCount`.
+    """
+    bids_dir = os.path.abspath(bids_dir)
+    annex_state = run_git(bids_dir, "rev-parse", "-q", "--verify", "refs/heads/git-annex")
+    cache = load_cache_entry(SIZE_CACHE_NAMESPACE, bids_dir, annex_state) if use_cache else None
+    cache = cache or {}
+    new_cache = {}
+    size_info = {
+        "TotalBytes": 0,
+        "RawBytes": 0,
+        "SourcedataBytes": 0,
+        "DerivativesBytes": 0,
+        "AnnexedBytes": 0,
+        "AnnexPresentBytes": 0,
+        "AnnexAbsentBytes": 0,
+        "FileCount": 0,
+    }
+    # Scan the files of the top-level directory and list the directories to walk
+    root_entry = _scan_directory(bids_dir, None)
+    _add_directory_sizes(size_info, "Raw", root_entry)
+    tasks = []
+    for name in root_entry["subdirs"]:
+        if name == ".git":
+            continue
+        if name in SIZE_CATEGORY_DIRS:
+            category_entry = _scan_directory(os.path.join(bids_dir, name), cache.get(name))
+            new_cache[name] = category_entry
+            _add_directory_sizes(size_info, SIZE_CATEGORY_DIRS[name], category_entry)
+            tasks += [
+                (SIZE_CATEGORY_DIRS[name], f"{name}/{subdir}")
+                for subdir in category_entry["subdirs"]
+            ]
+        else:
+            tasks.append(("Raw", name))
+    # Walk the directories in parallel
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_walk_directory, bids_dir, rel_path, cache)
+            for _, rel_path in tasks
+        ]
+        for (category, _), future in zip(tasks, futures):
+            for rel_path, entry in future.result():
+                new_cache[rel_path] = entry
+                _add_directory_sizes(size_info, category, entry)
+    size_info["TotalBytes"] = (
+        size_info["RawBytes"]
+        + size_info["SourcedataBytes"]
+        + size_info["DerivativesBytes"]
+    )
+    if use_cache:
+        save_cache_entry(SIZE_CACHE_NAMESPACE, bids_dir, annex_state, new_cache)
+    return size_info
+
+
+def _walk_directory(bids_dir, rel_path, cache):
+    """Return the list of (relative path, entry) of a directory and all its sub-directories."""
+    entries = []
+    to_walk = [rel_path]
+    while to_walk:
+        current = to_walk.pop()
+        entry = _scan_directory(os.path.join(bids_dir, current), cache.get(current))
+        entries.append((current, entry))
+        to_walk += [f"{current}/{subdir}" for subdir in entry["subdirs"]]
+    return entries
+
+
+def _scan_directory(path, cached_entry):
+    """Return the sizes of the files directly contained in a directory.
+
+    The cached entry is reused if the modification time of the directory and the
+    size and modification time of its files that are not annexed are unchanged.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    if _is_cached_entry_valid(path, cached_entry, mtime):
+        return cached_entry
+    entry = {
+        "mtime": mtime,
+        "bytes": 0,
+        "files": 0,
+        "annexed": [],
+        "subdirs": [],
+        # Size and modification time of the files that are not annexed
+        "stats": {},
+    }
+    with os.scandir(path) as it:
+        for dir_entry in it:
+            if dir_entry.is_dir(follow_symlinks=False):
+                entry["subdirs"].append(dir_entry.name)
+                continue
+            entry["files"] += 1
+            if dir_entry.is_symlink():
+                target = os.readlink(dir_entry.path)
+                if "annex/objects/" in target:
+                    key_size = get_annex_key_size(os.path.basename(target))
+                    present = os.path.exists(dir_entry.path)
+                    if key_size is None:
+                        key_size = os.stat(dir_entry.path).st_size if present else 0
+                    entry["annexed"].append([key_size, present])
+                    continue
+            try:
+                stat = dir_entry.stat(follow_symlinks=False)
+            except FileNotFoundError:  # pragma: no cover
+                continue
+            entry["bytes"] += stat.st_size
+            entry["stats"][dir_entry.name] = [stat.st_size, stat.st_mtime_ns]
+    return entry
+
+
+def _is_cached_entry_valid(path, cached_entry, mtime):
+    """Return True if the cached entry of a directory is valid (see :py:func:`_scan_directory`)."""
+    if cached_entry is None or cached_entry["mtime"] != mtime or "stats" not in cached_entry:
+        return False
+    for name, (size, file_mtime) in cached_entry["stats"].items():
+        try:
+            stat = os.stat(os.path.join(path, name), follow_symlinks=False)
+        except FileNotFoundError:
+            return False
+        if stat.st_size != size or stat.st_mtime_ns != file_mtime:
+            return False
+    return True
+
+
+def _add_directory_sizes(size_info, category, entry):
+    """Add the sizes of the files of a directory entry to the `size_info` dictionary."""
+    size_info[f"{category}Bytes"] += entry["bytes"]
+    size_info["FileCount"] += entry["files"]
+    for key_size, present in entry["annexed"]:
+        size_info[f"{category}Bytes"] += key_size
+        size_info["AnnexedBytes"] += key_size
+        if present:
+            size_info["AnnexPresentBytes"] += key_size
+        else:
+            size_info["AnnexAbsentBytes"] += key_size
+
+
+def get_annex_key_size(key):
+    """Return the size in bytes encoded in a git-annex key, or None if not encoded.
+
+    Parameters
+    ----------
+    key : str
+        git-annex key (e.g. `MD5E-s1234--0123456789abcdef.nii.gz`).
+
+    Returns
+    -------
+    int or None
+        Size of the annexed content.
+    """
+    match = ANNEX_KEY_SIZE_REGEX.search(key.split("--", 1)[0])
+    return int(match.group(1)) if match else None
+
+
+def format_size(num_bytes):
+    """Return a human-readable size in the format used by `du -h` (e.g. "4.0K", "12M").
+
+    Parameters
+    ----------
+    num_bytes : int
+        Size in bytes.
+
+    Returns
+    -------
+    str
+        Human-readable size.
+    """
+    units = ["", "K", "M", "G", "T", "P"]
+    size = float(num_bytes)
+    unit_idx = 0
+    while size >= 1024 and unit_idx < len(units) - 1:
+        size /= 1024
+        unit_idx += 1
+    if unit_idx == 0:
+        return f"{num_bytes}"
+    if size < 10 and math.ceil(size * 10) < 100:
+        return f"{math.ceil(size * 10) / 10:.1f}{units[unit_idx]}"
+    return f"{math.ceil(size)}{units[unit_idx]}"
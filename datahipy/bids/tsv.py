@@ -0,0 +1,218 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Utility functions to read and write BIDS tabular (TSV) files without pandas."""
+
+import os
+import re
+import math
+
+# Value of missing data in BIDS TSV files
+NA_VALUE = "n/a"
+
+# Regular expression matching an integer value
+INTEGER_REGEX = re.compile(r"^[+-]?[0-9]+$")
+
+
+def convert_tsv_value(value, na_value=None):
+    """Convert a value read from a TSV file to an int, a float, or keep it as a string.
+
+    Parameters
+    ----------
+    value : str
+        Value read from a TSV file.
+
+    na_value : object
+        Value returned for missing data (`n/a` or empty value).
+        If `NA_VALUE`, missing data is kept as is.
+
+    Returns
+    -------
+    int or float or str or None
+        Converted value.
+    """
+    if value == NA_VALUE or value == "":
+        return na_value if na_value is not NA_VALUE else value
+    if INTEGER_REGEX.match(value):
+        return int(value)
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    # Keep values like "nan" or "inf" as strings so that they remain valid JSON
+    return number if math.isfinite(number) else value
+
+
+def read_tsv_header(tsv_file):
+    """Return the column names of a TSV file (an empty list if the file is empty).
+
+    Parameters
+    ----------
+    tsv_file : str
+        Path to the TSV file.
+
+    Returns
+    -------
+    columns : list of str
+        Column names.
+    """
+    with open(tsv_file, "r", newline="") as f:
+        header = f.readline().rstrip("\r\n")
+    return header.split("\t") if header else []
+
+
+def iter_tsv_rows(tsv_file, convert=True, na_value=None):
+    """Yield the rows of a TSV file as dictionaries, reading the file line by line.
+
+    Parameters
+    ----------
+    tsv_file : str
+        Path to the TSV file.
+
+    convert : bool
+        If True, numerical values are converted to int or float
+        (see :py:func:`convert_tsv_value`). Otherwise, all values are strings.
+
+    na_value : object
+        Value of missing data (`n/a` or empty value) if `convert` is True.
+        If `NA_VALUE`, missing data is kept as is.
+
+    Yields
+    ------
+    row : dict
+        Dictionary mapping the column names to the values of a row.
+        Missing trailing values are considered missing data.
+    """
+    with open(tsv_file, "r", newline="") as f:
+        header = f.readline().rstrip("\r\n")
+        if not header:
+            return
+        columns = header.split("\t")
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            values = line.split("\t")
+            values += [NA_VALUE] * (len(columns) - len(values))
+            if convert:
+                values = [convert_tsv_value(value, na_value=na_value) for value in values]
+            yield dict(zip(columns, values))
+
+
+def format_tsv_value(value):
+    """Format a value to be written in a TSV file, missing data being written as `n/a`."""
+    if value is None or value == "":
+        return NA_VALUE
+    if isinstance(value, float) and math.isnan(value):
+        return NA_VALUE
+    return str(value)
+
+
+def write_tsv(tsv_file, columns, rows):
+    """Write rows in a TSV file.
+
+    Parameters
+    ----------
+    tsv_file : str
+        Path to the TSV file.
+
+    columns : list of str
+        Column names.
+
+    rows : iterable of dict
+        Rows to write. Missing values are written as `n/a`.
+    """
+    with open(tsv_file, "w", newline="") as f:
+        f.write("\t".join(columns) + "\n")
+        for row in rows:
+            f.write("\t".join(format_tsv_value(row.get(column)) for column in columns) + "\n")
+
+
+def append_tsv_rows(tsv_file, rows):
+    """Append rows to a TSV file.
+
+    If the rows have columns that are not present in the file, the file is
+    rewritten with the new columns added at the end, the existing rows having
+    missing data (`n/a`) for them. Otherwise, the rows are simply appended.
+
+    Parameters
+    ----------
+    tsv_file : str
+        Path to the TSV file.
+
+    rows : list of dict
+        Rows to append. Missing values are written as `n/a`.
+    """
+    if not rows:
+        return
+    columns = read_tsv_header(tsv_file)
+    new_columns = []
+    for row in rows:
+        new_columns += [c for c in row if c not in columns and c not in new_columns]
+    if new_columns:
+        # Rewrite the file with the new columns through a temporary file
+        tmp_file = f"{tsv_file}.{os.getpid()}.tmp"
+        existing_rows = iter_tsv_rows(tsv_file, convert=False)
+        write_tsv(tmp_file, columns + new_columns, _chain_rows(existing_rows, rows))
+        os.replace(tmp_file, tsv_file)
+        return
+    with open(tsv_file, "rb") as f:
+        # Check if the last line ends with a newline
+        f.seek(0, os.SEEK_END)
+        needs_newline = False
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    with open(tsv_file, "a", newline="") as f:
+        if needs_newline:
+            f.write("\n")
+        for row in rows:
+            f.write("\t".join(format_tsv_value(row.get(column)) for column in columns) + "\n")
+
+
+def _chain_rows(*iterables):
+    """Yield the rows of several iterables in order."""
+    for rows in iterables:
+        yield from rows
+
+
+def get_participants_tsv_summary(participants_tsv):
+    """Read a participants.tsv file in one pass and summarize its content.
+
+    Parameters
+    ----------
+    participants_tsv : str
+        Path to the participants.tsv file.
+
+    Returns
+    -------
+    summary : dict
+        Dictionary with the minimal and maximal ages (`AgeMin` and `AgeMax`,
+        None if no `age` column), the number of participants (`ParticipantsCount`),
+        the unique groups in order of appearance (`ParticipantsGroups`, `[None]`
+        if no `group` column), and the rows (`Participants`). Missing data is
+        kept as `n/a` and ignored in the age range (`n/a` if all ages are missing).
+    """
+    columns = read_tsv_header(participants_tsv)
+    age_min = age_max = None
+    groups = {}
+    participants = []
+    for row in iter_tsv_rows(participants_tsv, na_value=NA_VALUE):
+        participants.append(row)
+        age = row.get("age")
+        if isinstance(age, (int, float)):
+            age_min = age if age_min is None else min(age_min, age)
+            age_max = age if age_max is None else max(age_max, age)
+        if "group" in row:
+            groups.setdefault(row["group"], None)
+    if "age" in columns:
+        # Format the age range, n/a if all ages are missing
+        age_min = NA_VALUE if age_min is None else f"{age_min}"
+        age_max = NA_VALUE if age_max is None else f"{age_max}"
+    return {
+        "AgeMin": age_min,
+        "AgeMax": age_max,
+        "ParticipantsCount": len(participants),
+        "ParticipantsGroups": list(groups) if "group" in columns else [None],
+        "Participants": participants,
+    }
@@ -3,13 +3,42 @@
 
 """Functions for validating BIDS datasets."""
 
+import os
 import json
+import shutil
+import tempfile
 import subprocess
 from os import path as op
 from datahipy.bids.const import BIDS_VERSION
+from datahipy.utils.cache import (
+    get_toplevel_fingerprints,
+    load_cache_entry,
+    save_cache_entry,
+)
 
+# Name of the cache namespace used to store bids-validator outputs
+VALIDATOR_CACHE_NAMESPACE = "validator"
 
-def validate_bids_dataset(container_dataset_path, *args):
+# Options passed to the bids-validator when summarizing a dataset
+VALIDATOR_OPTIONS = [
+    "--ignoreWarnings",
+    "--ignoreSubjectConsistency",
+    # "-s",
+    # bids_schema_version,
+]
+
+# Top-level directories not validated by the bids-validator
+VALIDATOR_IGNORED_DIRS = ["code", "derivatives", "sourcedata"]
+
+# Environment variable that can be used to set the maximal duration
+# (in seconds) of a bids-validator run
+VALIDATOR_TIMEOUT_ENV = "DATAHIPY_VALIDATOR_TIMEOUT"
+
+# Severity levels of the issues reported by the bids-validator
+VALIDATOR_ISSUE_LEVELS = ["errors", "warnings", "ignored"]
+
+
+def validate_bids_dataset(container_dataset_path, *args, timeout=None):
     """Validate a BIDS dataset using the BIDS Validator.
 
     Parameters
@@ -25,13 +54,19 @@ def validate_bids_dataset(container_dataset_path, *args):
         is present for all other subjects (`["--ignoreSubjectConsistency"]`)
         or to use a specific BIDS schema (`["-s", "v1.6.0"]`)
 
+    timeout : float
+        Maximal duration of the validation in seconds. If None, the value of the
+        `DATAHIPY_VALIDATOR_TIMEOUT` environment variable is used if set,
+        otherwise the validation is not limited in time.
+
     Returns
     -------
     output : dict
-        Output of the bids-validator as a dictionary.
+        Output of the bids-validator as a dictionary. If the validation timed out,
+        its issues only contain an error describing the timeout.
 
     return_code : int
-        Return code of the bids-validator.
+        Return code of the bids-validator, or None if the validation timed out.
     """
     # Create the bids-validator command to run
     command = ["bids-validator", container_dataset_path] + list(args)
@@ -40,12 +75,30 @@ def validate_bids_dataset(container_dataset_path, *args):
         command.append("--json")
     # Run the command to validate the dataset
     print(f'Execute cmd: {" ".join(command)}')
-    output = subprocess.run(command, capture_output=True)
+    if timeout is None and os.environ.get(VALIDATOR_TIMEOUT_ENV):
+        timeout = float(os.environ[VALIDATOR_TIMEOUT_ENV])
+    try:
+        output = subprocess.run(command, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print(f"WARNING: bids-validator timed out after {timeout}s on {container_dataset_path}")
+        return create_timeout_validator_output(container_dataset_path, timeout), None
     print(f"Output: {output}")
     # Return the JSON string output as a dictionary and the return code
     return json.loads(output.stdout.decode()), output.returncode
 
 
+def create_timeout_validator_output(container_dataset_path, timeout):
+    """Return a bids-validator output reporting that the validation timed out as an error."""
+    issue = {
+        "key": "VALIDATOR_TIMEOUT",
+        "code": "VALIDATOR_TIMEOUT",
+        "severity": "error",
+        "reason": f"bids-validator timed out after {timeout}s on {container_dataset_path}",
+        "files": [],
+    }
+    return {"issues": {"errors": [issue], "warnings": [], "ignored": []}}
+
+
 def add_bidsignore_validation_rule(bids_dir, rule):
     """Create/update a `.bidsignore` file to ignore specific files by the BIDS Validator.
 
@@ -70,9 +123,16 @@ def add_bidsignore_validation_rule(bids_dir, rule):
                 f.write(f"{rule}\n")
 
 
-def get_bids_validator_output_info(bids_dir, bids_schema_version=None):
+def get_bids_validator_output_info(bids_dir, bids_schema_version=None, use_cache=True):
     """Run the bids-validator on the dataset with the specified schema version and the option to ignore subject consistency.
 
+    The issues reported by the bids-validator are cached with the fingerprint of each
+    top-level file and directory of the dataset (see
+    :py:func:`datahipy.utils.cache.get_toplevel_fingerprints`). If nothing validated
+    by the bids-validator changed, the cached issues are reused. If only a few subjects
+    changed, the bids-validator is run only on these subjects and the top-level files,
+    and the new issues of these subjects are merged into the cached ones.
+
     Parameters
     ----------
     bids_dir : str
@@ -82,6 +142,9 @@ def get_bids_validator_output_info(bids_dir, bids_schema_version=None):
         BIDS schema version to use for the validation.
         (e.g. "v1.7.0")
 
+    use_cache : bool
+        If False, the whole dataset is validated and the cached issues are not reused.
+
     Returns
     -------
     bids_validator_output_info : dict
@@ -91,25 +154,277 @@ def get_bids_validator_output_info(bids_dir, bids_schema_version=None):
     # If no bids_schema_version is specified, use the default BIDS_VERSION
     if not bids_schema_version:
         bids_schema_version = BIDS_VERSION
-    # Initialize the dictionary to store the bids-validator output
-    bids_validator_output_info = {}
-    # Run the bids-validator on the dataset with the specified schema version and
-    # the option to ignore subject consistency
-    validator_opts = [
-        "--ignoreWarnings",
-        "--ignoreSubjectConsistency",
-        # "-s",
-        # bids_schema_version,
-    ]
-    validator_output, validator_returncode = validate_bids_dataset(
-        bids_dir, *validator_opts
+    # The cached issues are only valid for the same validation settings
+    cache_key = json.dumps({"schema": bids_schema_version, "options": VALIDATOR_OPTIONS})
+    fingerprints = get_validated_fingerprints(bids_dir)
+    participants_columns = get_participants_columns(bids_dir)
+    cached = (
+        load_cache_entry(VALIDATOR_CACHE_NAMESPACE, bids_dir, cache_key)
+        if use_cache
+        else None
+    )
+    changed_subjects = (
+        get_changed_subjects(cached, fingerprints, participants_columns)
+        if cached is not None
+        else None
     )
+    if changed_subjects is None:
+        # Run the bids-validator on the whole dataset with the specified schema version
+        # and the option to ignore subject consistency
+        validator_output, returncode = validate_bids_dataset(bids_dir, *VALIDATOR_OPTIONS)
+        issues = {level: validator_output["issues"][level] for level in VALIDATOR_ISSUE_LEVELS}
+    elif not changed_subjects:
+        print(f"> Reuse cached bids-validator output of dataset {bids_dir}")
+        issues = cached["issues"]
+        returncode = cached["returncode"]
+    else:
+        print(f"> Run bids-validator only for the changed subjects: {changed_subjects}")
+        issues, returncode = validate_bids_subjects(
+            bids_dir, changed_subjects, cached["issues"]
+        )
+    # Do not cache the output of a validation that timed out
+    if use_cache and returncode is not None:
+        save_cache_entry(
+            VALIDATOR_CACHE_NAMESPACE,
+            bids_dir,
+            cache_key,
+            {
+                "fingerprints": fingerprints,
+                "participants_columns": participants_columns,
+                "issues": issues,
+                "returncode": returncode,
+            },
+        )
     # Extract validator output to the bids_validator_output_info dictionary
+    bids_validator_output_info = {}
     bids_validator_output_info["BIDSSchemaVersion"] = bids_schema_version
-    bids_validator_output_info["BIDSErrors"] = validator_output["issues"]["errors"]
-    bids_validator_output_info["BIDSWarnings"] = validator_output["issues"]["warnings"]
-    bids_validator_output_info["BIDSIgnored"] = validator_output["issues"]["ignored"]
-    bids_validator_output_info["BIDSValid"] = validator_returncode == 0
+    bids_validator_output_info["BIDSErrors"] = issues["errors"]
+    bids_validator_output_info["BIDSWarnings"] = issues["warnings"]
+    bids_validator_output_info["BIDSIgnored"] = issues["ignored"]
+    bids_validator_output_info["BIDSValid"] = returncode == 0
     # Return the bids-validator output dictionary to be integrated
     # in the dataset content to be indexed
     return bids_validator_output_info
+
+
+def get_validated_fingerprints(bids_dir):
+    """Return the fingerprints of the top-level entries of a dataset checked by the bids-validator.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    Returns
+    -------
+    fingerprints : dict
+        Dictionary mapping the names of the validated top-level entries to their fingerprint.
+    """
+    return {
+        name: fingerprint
+        for name, fingerprint in get_toplevel_fingerprints(bids_dir).items()
+        if name not in VALIDATOR_IGNORED_DIRS
+        and (not name.startswith(".") or name == ".bidsignore")
+        and op.exists(op.join(bids_dir, name))
+    }
+
+
+def get_participants_columns(bids_dir):
+    """Return the columns of the `participants.tsv` file of a dataset (empty if missing)."""
+    try:
+        with open(op.join(bids_dir, "participants.tsv"), "r") as f:
+            return f.readline().rstrip("\n").split("\t")
+    except OSError:
+        return []
+
+
+def get_changed_subjects(cached, fingerprints, participants_columns):
+    """Return the subjects that changed since the cached validation.
+
+    Parameters
+    ----------
+    cached : dict
+        Cached validation with the `fingerprints`, `participants_columns` and `issues`.
+
+    fingerprints : dict
+        Current fingerprints of the validated top-level entries of the dataset.
+
+    participants_columns : list of str
+        Current columns of the `participants.tsv` file.
+
+    Returns
+    -------
+    list of str or None
+        Sorted list of the modified subject directories, or None if the whole dataset
+        has to be validated again, i.e. if a top-level file (including `participants.tsv`
+        and `dataset_description.json`) changed, if a subject was added or removed,
+        or if more than half of the subjects changed. Dataset-level issues (e.g. a
+        mismatch between `participants.tsv` and the subject directories) can only
+        change in these cases, and they are not reported by a partial validation.
+    """
+    if cached.get("returncode") is None:
+        # Cache entry without the return code of the bids-validator
+        return None
+    previous = cached["fingerprints"]
+    changed = {
+        name
+        for name in set(previous) | set(fingerprints)
+        if previous.get(name) != fingerprints.get(name)
+    }
+    changed_subjects = sorted(
+        name
+        for name in changed
+        if name.startswith("sub-") and name in previous and name in fingerprints
+    )
+    other_changes = changed - set(changed_subjects)
+    if other_changes or cached["participants_columns"] != participants_columns:
+        return None
+    subjects = {name for name in fingerprints if name.startswith("sub-")}
+    if len(changed_subjects) > max(1, len(subjects) // 2):
+        return None
+    return changed_subjects
+
+
+def validate_bids_subjects(bids_dir, subjects, cached_issues):
+    """Run the bids-validator on a subset of subjects and merge their issues into the cached ones.
+
+    The bids-validator is run on a temporary view of the dataset made of symbolic
+    links to its top-level files and to the files of the given subjects.
+    The `participants.tsv` file of the view only keeps the rows of these subjects.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    subjects : list of str
+        Modified subject directories (e.g. "sub-01") to validate,
+        whose cached issues are replaced.
+
+    cached_issues : dict
+        Issues of the previous validation of the whole dataset by severity level.
+
+    Returns
+    -------
+    issues : dict
+        Merged issues by severity level.
+
+    return_code : int
+        1 if errors remain in the merged issues, 0 otherwise, as the bids-validator
+        exits with a non-zero code if errors are found. The return code of the
+        bids-validator on the view is not used as it also reflects the errors of
+        the view itself. None if the validation timed out.
+    """
+    view_dir = tempfile.mkdtemp(prefix="datahipy_validation_")
+    try:
+        create_validation_view(bids_dir, view_dir, subjects)
+        validator_output, returncode = validate_bids_dataset(view_dir, *VALIDATOR_OPTIONS)
+    finally:
+        shutil.rmtree(view_dir, ignore_errors=True)
+    if returncode is None:
+        # Report the timeout without merging the issues of the other subjects
+        return {
+            level: validator_output["issues"][level] for level in VALIDATOR_ISSUE_LEVELS
+        }, None
+    new_issues = {level: validator_output["issues"][level] for level in VALIDATOR_ISSUE_LEVELS}
+    # Point the issues to the files of the dataset instead of the view
+    for issue in sum(new_issues.values(), []):
+        for file_entry in issue.get("files") or []:
+            file_info = (file_entry or {}).get("file") or {}
+            if file_info.get("path", "").startswith(view_dir):
+                file_info["path"] = bids_dir + file_info["path"][len(view_dir):]
+    issues = {
+        level: merge_validator_issues(cached_issues[level], new_issues[level], subjects)
+        for level in VALIDATOR_ISSUE_LEVELS
+    }
+    return issues, 1 if issues["errors"] else 0
+
+
+def create_validation_view(bids_dir, view_dir, subjects):
+    """Create a view of a dataset restricted to its top-level files and to a list of subjects.
+
+    Parameters
+    ----------
+    bids_dir : str
+        Path to the BIDS dataset.
+
+    view_dir : str
+        Path to the (empty) directory where the view is created.
+
+    subjects : list of str
+        Subject directories (e.g. "sub-01") to include in the view.
+    """
+    for name in os.listdir(bids_dir):
+        source = op.join(bids_dir, name)
+        if op.isdir(source):
+            continue
+        if name == "participants.tsv":
+            with open(source, "r") as f_in, open(op.join(view_dir, name), "w") as f_out:
+                f_out.write(f_in.readline())
+                for line in f_in:
+                    if line.split("\t", 1)[0].strip() in subjects:
+                        f_out.write(line)
+        else:
+            os.symlink(source, op.join(view_dir, name))
+    for subject in subjects:
+        for root, _, files in os.walk(op.join(bids_dir, subject)):
+            view_root = op.join(view_dir, op.relpath(root, bids_dir))
+            os.makedirs(view_root, exist_ok=True)
+            for filename in files:
+                os.symlink(op.join(root, filename), op.join(view_root, filename))
+
+
+def merge_validator_issues(cached_issues, new_issues, subjects):
+    """Replace the issues of some subjects in a list of bids-validator issues.
+
+    File-level occurrences of the cached issues located in the subject directories
+    are replaced by the ones of the new issues. Dataset-level issues (without files)
+    and occurrences in top-level files are only taken from the cached issues, as the
+    new ones were computed on a partial view of the dataset. New occurrences are
+    added to the file-level issue of the same code if any, and never to a
+    dataset-level issue.
+
+    Parameters
+    ----------
+    cached_issues : list of dict
+        Issues of the previous validation of the whole dataset.
+
+    new_issues : list of dict
+        Issues of the validation of the subjects.
+
+    subjects : list of str
+        Subject directories (e.g. "sub-01") whose issues are replaced.
+
+    Returns
+    -------
+    issues : list of dict
+        Merged issues.
+    """
+
+    def in_subjects(file_entry):
+        relative_path = ((file_entry or {}).get("file") or {}).get("relativePath", "")
+        return relative_path.lstrip("/").split("/", 1)[0] in subjects
+
+    merged = []
+    merged_by_code = {}
+    for issue in cached_issues:
+        issue = dict(issue)
+        if issue.get("files"):
+            issue["files"] = [f for f in issue["files"] if not in_subjects(f)]
+            if not issue["files"]:
+                continue
+        merged.append(issue)
+        if issue.get("files"):
+            merged_by_code[(issue.get("code"), issue.get("key"))] = issue
+    for issue in new_issues:
+        files = [f for f in (issue.get("files") or []) if in_subjects(f)]
+        if not files:
+            continue
+        code = (issue.get("code"), issue.get("key"))
+        if code in merged_by_code:
+            merged_by_code[code]["files"] = merged_by_code[code]["files"] + files
+        else:
+            issue = dict(issue, files=files)
+            merged.append(issue)
+            merged_by_code[code] = issue
+    return merged
@@ -6,7 +6,6 @@
 import os
 from datetime import date
 from packaging import version
-import datalad.api
 from datahipy.bids.const import BIDS_VERSION
 
 
@@ -89,6 +88,9 @@ def update_bids_changes(bids_dir, changes_tag_entry):
 
 def manage_bids_dataset_with_datalad(bids_dir):
     """Create a Datalad dataset out of an existing BIDS dataset not Datalad-managed yet."""
+    # Import here to not slow down the commands that do not need Datalad
+    import datalad.api
+
     print(f"Initializing Datalad dataset at {bids_dir}...")
     # Initialize the BIDS dataset as a Datalad-managed dataset
     create_params = {
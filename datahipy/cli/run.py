@@ -3,15 +3,20 @@
 
 """Command line interface for datahipy."""
 
+import os
+import sys
+import json
+import time
+import shutil
 import argparse
+import tempfile
+from sre_constants import SUCCESS
 from datahipy import __version__, __release_date__
-from datahipy.bids.dataset import get_all_datasets_content, dataset_publish, dataset_clone
-from datahipy.handlers.dataset import DatasetHandler
-from datahipy.handlers.participants import ParticipantHandler
-from datahipy.handlers.project import create_project, import_subject, import_document
-from datahipy.utils.versioning import (
-    create_tag, get_tags, checkout_tag, release_version, set_git_user_info_global
-)
+from datahipy.bids.const import DATASETS_OUTPUT_FORMATS
+
+# Environment variable that can be used to specify the address of a datahipy
+# server to which commands are forwarded (see `datahipy serve --help`)
+SERVER_ENV = "DATAHIPY_SERVER"
 
 VALID_COMMANDS = [
     "dataset.create",
@@ -35,6 +40,7 @@ VALID_COMMANDS = [
     "project.get_tags",
     "project.checkout_tag",
     "project.release_version",
+    "batch",
 ]
 
 
@@ -60,6 +66,56 @@ def get_parser():
         help="Git user email to use for Datalad ops",
         default=None
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute dataset summaries instead of reusing the cached ones",
+    )
+    parser.add_argument(
+        "--output_format",
+        choices=DATASETS_OUTPUT_FORMATS,
+        default="json",
+        help=(
+            "Format of the output file of the datasets.get command: a JSON list "
+            "written at the end (json) or one JSON record per line written as soon "
+            "as each dataset is processed (ndjson)"
+        ),
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=None,
+        help="Number of worker processes used by the datasets.get command",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Maximal duration in seconds of the processing of each dataset by datasets.get",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=0,
+        help="Number of times datasets.get retries a dataset that could not be processed",
+    )
+    parser.add_argument(
+        "--server",
+        help=(
+            "Address of a running datahipy server to which the command is forwarded "
+            "(e.g. unix:///run/datahipy.sock or http://127.0.0.1:8765). "
+            f"Default to the value of the {SERVER_ENV} environment variable."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--no-fallback",
+        action="store_true",
+        help=(
+            "Fail if the datahipy server given by --server is not available "
+            "instead of running the command in the current process"
+        ),
+    )
     parser.add_argument(
         "-v",
         "--version",
@@ -71,76 +127,352 @@ def get_parser():
     return parser
 
 
-def main():
-    """Run the command line interface."""
-    # Create parser object
-    parser = get_parser()
+def run_command(
+    command,
+    input_data=None,
+    output_file=None,
+    dataset_path="/output",
+    input_path="/input",
+    use_cache=True,
+    output_format="json",
+    num_workers=None,
+    timeout=None,
+    retries=0,
+    handlers=None,
+):
+    """Run a datahipy command.
 
-    # Parse arguments
-    cmd_args = parser.parse_args()
-    command = cmd_args.command
-    input_data = cmd_args.input_data
-    output_file = cmd_args.output_file
-    dataset_path = cmd_args.dataset_path
-    input_path = cmd_args.input_path
-    git_user_name = cmd_args.git_user_name
-    git_user_email = cmd_args.git_user_email
-
-    # Initialize dataset and participant handler objects
-    dhdl = DatasetHandler(dataset_path=dataset_path)
-    phdl = ParticipantHandler(dataset_path=dataset_path, input_path=input_path)
+    Parameters
+    ----------
+    command : str
+        Command to run (one of `VALID_COMMANDS`).
 
-    # Set global git user info for Datalad operations
-    set_git_user_info_global(name=git_user_name, email=git_user_email)
+    input_data : str
+        Path to the input JSON data of the command.
+
+    output_file : str
+        Path to the output file of the command, if any.
+
+    dataset_path : str
+        Path to the dataset.
+
+    input_path : str
+        Path to the input data.
+
+    use_cache : bool
+        If False, do not reuse the cached dataset summaries.
 
+    output_format : str
+        Format of the output file of the `datasets.get` command ("json" or "ndjson").
+
+    num_workers : int
+        Number of worker processes used by the `datasets.get` command.
+
+    timeout : float
+        Maximal duration in seconds of the processing of each dataset
+        by the `datasets.get` command.
+
+    retries : int
+        Number of times the `datasets.get` command retries a failed dataset.
+
+    handlers : dict
+        Cache of the dataset and participant handler objects, used to share
+        them between the commands of a batch.
+    """
+    if handlers is None:
+        handlers = {}
+    # Modules are imported only when needed as importing PyBIDS, Datalad,
+    # BIDS Manager or pandas takes most of the time of the lightest commands
     # Dataset commands
-    if command == "dataset.create":
-        return dhdl.dataset_create(input_data=input_data)
-    if command == "dataset.get":
-        dhdl.dataset_get_content(input_data=input_data, output_file=output_file)
-    if command == "dataset.create_tag":
+    if command in ["dataset.create", "dataset.get"]:
+        from datahipy.handlers.dataset import DatasetHandler
+
+        dhdl = handlers.get(("dataset", dataset_path))
+        if dhdl is None:
+            dhdl = handlers[("dataset", dataset_path)] = DatasetHandler(
+                dataset_path=dataset_path
+            )
+        if command == "dataset.create":
+            return dhdl.dataset_create(input_data=input_data)
+        return dhdl.dataset_get_content(
+            input_data=input_data, output_file=output_file, use_cache=use_cache
+        )
+    if command in ["datasets.get", "dataset.publish", "dataset.clone"]:
+        from datahipy.bids.dataset import (
+            get_all_datasets_content, dataset_publish, dataset_clone
+        )
+
+        if command == "datasets.get":
+            return get_all_datasets_content(
+                input_data=input_data,
+                output_file=output_file,
+                use_cache=use_cache,
+                output_format=output_format,
+                num_workers=num_workers,
+                timeout=timeout,
+                retries=retries,
+            )
+        if command == "dataset.publish":
+            return dataset_publish(input_data=input_data, output_file=output_file)
+        return dataset_clone(input_data=input_data, output_file=output_file)
+    # Dataset / project versioning commands
+    if command in ["dataset.create_tag", "project.create_tag"]:
+        from datahipy.utils.versioning import create_tag
+
         return create_tag(input_data=input_data)
-    if command == "dataset.get_tags":
+    if command in ["dataset.get_tags", "project.get_tags"]:
+        from datahipy.utils.versioning import get_tags
+
         return get_tags(input_data=input_data, output_file=output_file)
-    if command == "dataset.checkout_tag":
+    if command in ["dataset.checkout_tag", "project.checkout_tag"]:
+        from datahipy.utils.versioning import checkout_tag
+
         return checkout_tag(input_data=input_data)
-    if command == "datasets.get":
-        return get_all_datasets_content(
-            input_data=input_data,
-            output_file=output_file,
-        )
-    if command == "dataset.release_version":
+    if command in ["dataset.release_version", "project.release_version"]:
+        from datahipy.utils.versioning import release_version
+
         return release_version(input_data=input_data, output_file=output_file)
-    if command == "dataset.publish":
-        return dataset_publish(input_data=input_data, output_file=output_file)
-    if command == "dataset.clone":
-        return dataset_clone(input_data=input_data, output_file=output_file)
     # Dataset subject / participant-level commands
-    if command == "sub.import":
-        return phdl.sub_import(input_data=input_data)
-    if command == "sub.edit.clinical":
-        return phdl.sub_edit_clinical(input_data=input_data)
-    if command == "sub.get":
-        return phdl.sub_get(input_data=input_data, output_file=output_file)
-    if command == "sub.delete":
-        return phdl.sub_delete(input_data=input_data)
-    if command == "sub.delete.file":
-        return phdl.sub_delete_file(input_data=input_data)
+    if command.startswith("sub."):
+        from datahipy.handlers.participants import ParticipantHandler
+
+        phdl = handlers.get(("participant", dataset_path, input_path))
+        if phdl is None:
+            phdl = handlers[("participant", dataset_path, input_path)] = ParticipantHandler(
+                dataset_path=dataset_path, input_path=input_path
+            )
+        if command == "sub.import":
+            return phdl.sub_import(input_data=input_data)
+        if command == "sub.edit.clinical":
+            return phdl.sub_edit_clinical(input_data=input_data)
+        if command == "sub.get":
+            return phdl.sub_get(input_data=input_data, output_file=output_file)
+        if command == "sub.delete":
+            return phdl.sub_delete(input_data=input_data)
+        if command == "sub.delete.file":
+            return phdl.sub_delete_file(input_data=input_data)
     # Project commands
     if command == "project.create":
+        from datahipy.handlers.project import create_project
+
         create_project(input_data=input_data, output_file=output_file)
     if command == "project.sub.import":
+        from datahipy.handlers.project import import_subject
+
         import_subject(input_data=input_data, output_file=output_file)
     if command == "project.doc.import":
+        from datahipy.handlers.project import import_document
+
         import_document(input_data=input_data)
-    if command == "project.create_tag":
-        return create_tag(input_data=input_data)
-    if command == "project.get_tags":
-        return get_tags(input_data=input_data, output_file=output_file)
-    if command == "project.checkout_tag":
-        return checkout_tag(input_data=input_data)
-    if command == "project.release_version":
-        return release_version(input_data=input_data, output_file=output_file)
+    # Batch of commands
+    if command == "batch":
+        run_batch(
+            input_data=input_data,
+            output_file=output_file,
+            dataset_path=dataset_path,
+            input_path=input_path,
+            use_cache=use_cache,
+        )
+
+
+def load_batch_operations(input_data):
+    """Load the list of operations of a `batch` command.
+
+    Parameters
+    ----------
+    input_data : str
+        Path to the input JSON data of the `batch` command, either a list of
+        operations or a dictionary with the list of operations under the
+        `operations` key, in the format::
+
+            [
+                {
+                    "command": "sub.edit.clinical",
+                    # Path to the input JSON data or input data itself
+                    "input_data": {"subject": "carole", "clinical": {"age": "25"}},
+                    # Optional
+                    "output_file": "/path/to/output_file.json",
+                    "dataset_path": "/path/to/dataset",
+                    "input_path": "/path/to/input",
+                },
+                ...
+            ]
+
+    Returns
+    -------
+    operations : list of dict
+        List of operations.
+    """
+    with open(input_data, "r") as f:
+        operations = json.load(f)
+    if isinstance(operations, dict):
+        operations = operations["operations"]
+    return operations
+
+
+def run_batch(
+    input_data,
+    output_file=None,
+    dataset_path="/output",
+    input_path="/input",
+    use_cache=True,
+):
+    """Run a batch of datahipy commands in the current process.
+
+    The commands share the same handler objects and the Datalad saves they make
+    are coalesced into a single commit per dataset made at the end of the batch
+    (see :py:func:`datahipy.utils.saving.coalesce_saves`). Saves creating a version
+    tag are made immediately. A failing command does not stop the batch.
+
+    Parameters
+    ----------
+    input_data : str
+        Path to the input JSON data with the list of operations
+        (see :py:func:`load_batch_operations`).
+
+    output_file : str
+        Path to the output JSON file with the result of each operation in the format::
+
+            [
+                {
+                    "command": "dataset.get",
+                    "success": true,
+                    "elapsed": 1.2,
+                    # Content of the output file of the operation if no
+                    # output_file was specified, or path to the output file
+                    "output": {...},
+                    "output_file": "/path/to/output_file.json",
+                    # Only if the operation failed
+                    "error": {"type": "ValueError", "message": "..."},
+                },
+                ...
+            ]
+
+    dataset_path : str
+        Default path to the dataset of the operations.
+
+    input_path : str
+        Default path to the input data of the operations.
+
+    use_cache : bool
+        If False, do not reuse the cached dataset summaries.
+    """
+    from datahipy.utils.saving import coalesce_saves
+
+    operations = load_batch_operations(input_data)
+    handlers = {}
+    results = []
+    # Temporary directory to store the inline input data and the outputs of the operations
+    tmp_dir = tempfile.mkdtemp(prefix="datahipy_batch_")
+    try:
+        with coalesce_saves():
+            for idx, operation in enumerate(operations):
+                print(f"> Run batch operation {idx + 1}/{len(operations)}: {operation['command']}")
+                result = {"command": operation["command"], "success": False}
+                # Write inline input data to a temporary file
+                op_input_data = operation.get("input_data")
+                if isinstance(op_input_data, (dict, list)):
+                    op_input_file = os.path.join(tmp_dir, f"input_{idx}.json")
+                    with open(op_input_file, "w") as f:
+                        json.dump(op_input_data, f)
+                    op_input_data = op_input_file
+                op_output_file = operation.get("output_file")
+                if op_output_file:
+                    result["output_file"] = op_output_file
+                else:
+                    op_output_file = os.path.join(tmp_dir, f"output_{idx}.json")
+                start = time.perf_counter()
+                try:
+                    if operation["command"] not in VALID_COMMANDS or (
+                        operation["command"] == "batch"
+                    ):
+                        raise ValueError(
+                            f"Invalid batch operation command {operation['command']}"
+                        )
+                    run_command(
+                        operation["command"],
+                        input_data=op_input_data,
+                        output_file=op_output_file,
+                        dataset_path=operation.get("dataset_path", dataset_path),
+                        input_path=operation.get("input_path", input_path),
+                        use_cache=use_cache,
+                        handlers=handlers,
+                    )
+                    result["success"] = True
+                except Exception as e:
+                    print(f"WARNING: Batch operation {idx + 1} failed: {e}")
+                    result["error"] = {"type": type(e).__name__, "message": str(e)}
+                result["elapsed"] = time.perf_counter() - start
+                # Add the content of the temporary output file to the result
+                if "output_file" not in result and os.path.exists(op_output_file):
+                    with open(op_output_file, "r") as f:
+                        result["output"] = json.load(f)
+                results.append(result)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if output_file:
+        with open(output_file, "w") as f:
+            json.dump(results, f, indent=4)
+    print(SUCCESS)
+
+
+def main():
+    """Run the command line interface."""
+    # Run the long-running server mode (`datahipy serve ...`)
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from datahipy.cli.server import serve_main
+
+        return serve_main(sys.argv[2:])
+
+    # Create parser object
+    parser = get_parser()
+
+    # Parse arguments
+    cmd_args = parser.parse_args()
+    command_params = {
+        "command": cmd_args.command,
+        "input_data": cmd_args.input_data,
+        "output_file": cmd_args.output_file,
+        "dataset_path": cmd_args.dataset_path,
+        "input_path": cmd_args.input_path,
+        "use_cache": not cmd_args.no_cache,
+        "output_format": cmd_args.output_format,
+        "num_workers": cmd_args.num_workers,
+        "timeout": cmd_args.timeout,
+        "retries": cmd_args.retries,
+    }
+
+    # Forward the command to a running datahipy server if one is specified
+    server_address = cmd_args.server or os.environ.get(SERVER_ENV)
+    if server_address and cmd_args.command:
+        from datahipy.cli.server import send_command, CommandError, ServerUnavailableError
+
+        try:
+            send_command(
+                server_address,
+                git_user_name=cmd_args.git_user_name,
+                git_user_email=cmd_args.git_user_email,
+                **command_params,
+            )
+            return None
+        except CommandError as e:
+            print(f"ERROR: {e}")
+            return 1
+        except ServerUnavailableError as e:
+            if cmd_args.no_fallback:
+                print(f"ERROR: {e}")
+                return 1
+            print(f"WARNING: {e}. Running the command in the current process...")
+
+    # Set global git user info for Datalad operations
+    from datahipy.utils.versioning import set_git_user_info_global
+
+    set_git_user_info_global(
+        name=cmd_args.git_user_name, email=cmd_args.git_user_email
+    )
+
+    # The exit status is 0 if the command succeeds, the outputs being written to files
+    run_command(**command_params)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,572 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Long-running datahipy server exposing the commands of the CLI over JSON-RPC.
+
+The server keeps the Python modules (Datalad, PyBIDS, BIDS Manager, ...) imported
+and any warm state in memory so that each command does not pay for the start-up
+of a new process. It accepts JSON-RPC 2.0 requests whose method is one of the
+commands of :py:data:`datahipy.cli.run.VALID_COMMANDS` and whose parameters are
+the arguments of :py:func:`datahipy.cli.run.run_command`, e.g.::
+
+    {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "dataset.get",
+        "params": {
+            "input_data": "/path/to/input_data.json",
+            "output_file": "/path/to/output.json",
+            "dataset_path": "/path/to/dataset"
+        }
+    }
+
+Requests are sent either over a Unix socket (one JSON request per line) or via
+HTTP POST requests to a local HTTP server.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import importlib
+import threading
+import traceback
+import socketserver
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from sre_constants import SUCCESS
+from urllib.error import URLError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from datahipy.cli.run import VALID_COMMANDS, run_command
+from datahipy.utils.versioning import set_git_user_info_global
+
+# Modules imported when the server starts so that commands do not pay their
+# import time (they are imported lazily by `datahipy.cli.run.run_command`)
+SERVER_PRELOADED_MODULES = [
+    "datahipy.bids.dataset",
+    "datahipy.handlers.dataset",
+    "datahipy.handlers.participants",
+    "datahipy.handlers.project",
+    "datahipy.utils.versioning",
+]
+
+# Commands relying on BIDS Manager, which keeps state in class attributes
+# (e.g. `BidsDataset.dirname`), and that cannot run concurrently
+BIDS_MANAGER_COMMANDS = [
+    "dataset.create",
+    "sub.import",
+    "sub.edit.clinical",
+    "sub.delete",
+    "sub.delete.file",
+    # May contain any of the commands above
+    "batch",
+]
+
+# Keys of the input JSON data of a command pointing to the dataset(s) it targets
+DATASET_PATH_KEYS = [
+    "path",
+    "sourceDatasetPath",
+    "targetDatasetPath",
+    "targetProjectAbsPath",
+]
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+COMMAND_ERROR = -32000
+
+
+class ServerUnavailableError(ConnectionError):
+    """Raised when the datahipy server cannot be reached."""
+
+
+class CommandError(RuntimeError):
+    """Raised by the client when a command failed on the datahipy server."""
+
+
+class GitIdentity:
+    """Git identity of the commands run by the server.
+
+    The identity of a command is set with the `GIT_AUTHOR_*` and `GIT_COMMITTER_*`
+    environment variables, inherited by the git processes spawned by Datalad,
+    instead of the global git configuration. As the environment is shared by the
+    threads of the server, commands with the same identity run concurrently while
+    commands with different identities wait for each other.
+    """
+
+    ENV_VARS = [
+        "GIT_AUTHOR_NAME",
+        "GIT_AUTHOR_EMAIL",
+        "GIT_COMMITTER_NAME",
+        "GIT_COMMITTER_EMAIL",
+    ]
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._identity = None
+        self._count = 0
+        self._saved_env = {}
+
+    @contextmanager
+    def use(self, name=None, email=None):
+        """Context manager running a command with the given git identity.
+
+        Parameters
+        ----------
+        name : str
+            Git user name. If None, the git configuration of the server is used.
+
+        email : str
+            Git user email. If None and `name` is specified, `<name>@hip.ch` is used.
+        """
+        if name and not email:
+            email = f"{name}@hip.ch"
+        identity = (name, email)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._count == 0 or self._identity == identity
+            )
+            if self._count == 0:
+                self._identity = identity
+                self._saved_env = {var: os.environ.get(var) for var in self.ENV_VARS}
+                for var in self.ENV_VARS:
+                    value = name if var.endswith("_NAME") else email
+                    if value:
+                        os.environ[var] = value
+                    else:
+                        os.environ.pop(var, None)
+            self._count += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._count -= 1
+                if self._count == 0:
+                    # Restore the environment of the server
+                    for var, value in self._saved_env.items():
+                        if value is None:
+                            os.environ.pop(var, None)
+                        else:
+                            os.environ[var] = value
+                    self._condition.notify_all()
+
+
+class CommandExecutor:
+    """Class to run datahipy commands concurrently with per-dataset locking."""
+
+    def __init__(self, max_workers=None):
+        from datahipy.bids.dataset import NUM_THREADS
+
+        self._slots = threading.BoundedSemaphore(max_workers or NUM_THREADS)
+        self._dataset_locks = {}
+        self._dataset_locks_lock = threading.Lock()
+        self._bids_manager_lock = threading.Lock()
+        self._git_identity = GitIdentity()
+
+    def handle_request(self, request):
+        """Process a JSON-RPC request and return the JSON-RPC response.
+
+        Parameters
+        ----------
+        request : str or bytes
+            JSON-RPC request.
+
+        Returns
+        -------
+        response : dict
+            JSON-RPC response.
+        """
+        try:
+            request = json.loads(request)
+        except ValueError as e:
+            return self.make_error_response(None, PARSE_ERROR, f"Parse error: {e}")
+        if not isinstance(request, dict) or "method" not in request:
+            return self.make_error_response(None, INVALID_REQUEST, "Invalid request")
+        request_id = request.get("id")
+        command = request["method"]
+        params = request.get("params") or {}
+        if command not in VALID_COMMANDS:
+            return self.make_error_response(
+                request_id, METHOD_NOT_FOUND, f"Unknown command: {command}"
+            )
+        try:
+            result = self.run(command, params)
+        except Exception as e:
+            traceback.print_exc()
+            return self.make_error_response(
+                request_id, COMMAND_ERROR, f"{type(e).__name__}: {e}",
+                data=traceback.format_exc(),
+            )
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def run(self, command, params):
+        """Run a command once a worker slot and the locks of its datasets are acquired.
+
+        Parameters
+        ----------
+        command : str
+            Command to run.
+
+        params : dict
+            Arguments of :py:func:`datahipy.cli.run.run_command`
+            and optionally `git_user_name` / `git_user_email`.
+
+        Returns
+        -------
+        result : dict
+            Summary of the command execution.
+        """
+        params = dict(params)
+        git_user_name = params.pop("git_user_name", None)
+        git_user_email = params.pop("git_user_email", None)
+        locks = []
+        if command in BIDS_MANAGER_COMMANDS:
+            locks.append(self._bids_manager_lock)
+        locks += [
+            self.get_dataset_lock(key)
+            for key in get_command_lock_keys(command, params)
+        ]
+        # The git identity is acquired first so that a command holding a dataset lock
+        # never waits for the identity of another command
+        with self._git_identity.use(name=git_user_name, email=git_user_email), self._slots:
+            for lock in locks:
+                lock.acquire()
+            try:
+                print(f"> Run command {command} with {params}...")
+                start = time.perf_counter()
+                run_command(command, **params)
+                elapsed = time.perf_counter() - start
+            finally:
+                for lock in reversed(locks):
+                    lock.release()
+        print(f"> Command {command} completed in {elapsed:.2f}s")
+        return {
+            "command": command,
+            "output_file": params.get("output_file"),
+            "elapsed": elapsed,
+        }
+
+    def get_dataset_lock(self, key):
+        """Return the lock associated with a dataset, created if it does not exist."""
+        with self._dataset_locks_lock:
+            return self._dataset_locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def make_error_response(request_id, code, message, data=None):
+        """Return a JSON-RPC error response."""
+        error = {"code": code, "message": message}
+        if data is not None:
+            error["data"] = data
+        return {"jsonrpc": "2.0", "id": request_id, "error": error}
+
+
+def get_command_lock_keys(command, params):
+    """Return the sorted list of dataset lock keys of a command.
+
+    The keys are the real paths of the datasets targeted by the command. The nested
+    BIDS dataset of a Collaborative Project (`inputs/bids-dataset`) shares the key
+    of its project as they are saved together.
+
+    Parameters
+    ----------
+    command : str
+        Command to run.
+
+    params : dict
+        Arguments of :py:func:`datahipy.cli.run.run_command`.
+
+    Returns
+    -------
+    list of str
+        Lock keys sorted to always acquire locks in the same order.
+    """
+    # Bulk indexing of datasets only reads them
+    if command == "datasets.get":
+        return []
+    if command == "batch":
+        from datahipy.cli.run import load_batch_operations
+
+        keys = set()
+        for operation in load_batch_operations(params["input_data"]):
+            op_params = {
+                "dataset_path": operation.get(
+                    "dataset_path", params.get("dataset_path", "/output")
+                ),
+                "input_data": operation.get("input_data"),
+            }
+            keys.update(get_command_lock_keys(operation["command"], op_params))
+        return sorted(keys)
+    paths = []
+    if command.startswith("sub.") or command in ["dataset.create", "dataset.get"]:
+        paths.append(params.get("dataset_path", "/output"))
+    elif params.get("input_data"):
+        input_content = params["input_data"]
+        # Input data can be given inline by the operations of a batch
+        if not isinstance(input_content, dict):
+            with open(input_content, "r") as f:
+                input_content = json.load(f)
+        paths += [input_content[key] for key in DATASET_PATH_KEYS if key in input_content]
+    keys = set()
+    for path in paths:
+        key = os.path.realpath(path)
+        if os.path.basename(key) == "bids-dataset" and (
+            os.path.basename(os.path.dirname(key)) == "inputs"
+        ):
+            key = os.path.dirname(os.path.dirname(key))
+        keys.add(key)
+    return sorted(keys)
+
+
+class UnixSocketRequestHandler(socketserver.StreamRequestHandler):
+    """Handle newline-delimited JSON-RPC requests received over a Unix socket."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.executor.handle_request(line)
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+class HTTPRequestHandler(BaseHTTPRequestHandler):
+    """Handle JSON-RPC requests received via HTTP POST requests."""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        response = self.server.executor.handle_request(self.rfile.read(length))
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ThreadingUnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server handling each connection in a new thread."""
+
+    daemon_threads = True
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(socket_path=None, host="127.0.0.1", port=None, max_workers=None):
+    """Serve the datahipy commands until interrupted (`SIGINT` or `SIGTERM`).
+
+    The Unix socket is removed when the server stops.
+
+    Parameters
+    ----------
+    socket_path : str
+        Path to the Unix socket to listen on.
+
+    host : str
+        Host of the HTTP server.
+
+    port : int
+        Port of the HTTP server. If None, the HTTP server is not started.
+
+    max_workers : int
+        Maximal number of commands run concurrently.
+    """
+    preload_modules()
+    executor = CommandExecutor(max_workers=max_workers)
+    servers = create_servers(socket_path=socket_path, host=host, port=port)
+    # Stop the server on SIGTERM as on SIGINT so that the Unix socket is removed
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    threads = []
+    for server in servers:
+        server.executor = executor
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        threads.append(thread)
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        print("Stopping datahipy server...")
+    finally:
+        close_servers(servers, socket_path=socket_path)
+
+
+def preload_modules():
+    """Import the modules used by the commands and preload them in the forkserver.
+
+    Processes created by the commands (e.g. `datasets.get`) are started from
+    a dedicated server process as forking a multi-threaded process is unsafe.
+    """
+    try:
+        multiprocessing.set_start_method("forkserver")
+        multiprocessing.set_forkserver_preload(SERVER_PRELOADED_MODULES)
+    except (RuntimeError, ValueError):  # pragma: no cover
+        pass
+    for module in SERVER_PRELOADED_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:  # pragma: no cover
+            print(f"WARNING: Could not preload module {module}: {e}")
+
+
+def create_servers(socket_path=None, host="127.0.0.1", port=None):
+    """Create the Unix socket and HTTP servers (see :py:func:`serve`).
+
+    A stale Unix socket left at `socket_path` is replaced.
+
+    Returns
+    -------
+    servers : list of socketserver.BaseServer
+        Servers listening for requests, not serving them yet.
+    """
+    servers = []
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        servers.append(ThreadingUnixStreamServer(socket_path, UnixSocketRequestHandler))
+        print(f"datahipy server listening on unix://{socket_path}")
+    if port:
+        http_server = ThreadingHTTPServer((host, port), HTTPRequestHandler)
+        http_server.daemon_threads = True
+        servers.append(http_server)
+        print(f"datahipy server listening on http://{host}:{port}")
+    return servers
+
+
+def close_servers(servers, socket_path=None):
+    """Stop and close the servers of :py:func:`create_servers` and remove the Unix socket."""
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    if socket_path and os.path.exists(socket_path):
+        os.remove(socket_path)
+
+
+def send_command(server_address, command, **params):
+    """Forward a command to a running datahipy server and wait for its completion.
+
+    Parameters
+    ----------
+    server_address : str
+        Address of the server, either a Unix socket (`unix:///path/to/socket`)
+        or an HTTP URL (`http://127.0.0.1:8765`).
+
+    command : str
+        Command to run.
+
+    params : dict
+        Arguments of :py:func:`datahipy.cli.run.run_command`
+        and optionally `git_user_name` / `git_user_email`.
+
+    Returns
+    -------
+    result : dict
+        Summary of the command execution returned by the server.
+    """
+    # Paths are resolved by the server process so make them absolute
+    for key in ["input_data", "output_file", "dataset_path", "input_path"]:
+        if params.get(key):
+            params[key] = os.path.abspath(params[key])
+    request = json.dumps(
+        {"jsonrpc": "2.0", "id": 1, "method": command, "params": params}
+    ).encode()
+    url = urlparse(server_address)
+    try:
+        if url.scheme in ["http", "https"]:
+            http_request = Request(
+                server_address,
+                data=request,
+                headers={"Content-Type": "application/json"},
+            )
+            with urlopen(http_request) as f:
+                response = f.read()
+        else:
+            socket_path = url.path if url.scheme == "unix" else server_address
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(socket_path)
+                sock.sendall(request + b"\n")
+                with sock.makefile("rb") as f:
+                    response = f.readline()
+    except (OSError, URLError) as e:
+        raise ServerUnavailableError(
+            f"datahipy server at {server_address} is not available ({e})"
+        )
+    if not response:
+        raise ServerUnavailableError(
+            f"datahipy server at {server_address} closed the connection"
+        )
+    response = json.loads(response)
+    if "error" in response:
+        raise CommandError(
+            f'Command {command} failed on datahipy server: {response["error"]["message"]}'
+            f'\n{response["error"].get("data", "")}'
+        )
+    print(SUCCESS)
+    return response["result"]
+
+
+def get_serve_parser():
+    """Get parser object for the `datahipy serve` command line interface."""
+    parser = argparse.ArgumentParser(
+        prog="datahipy serve",
+        description="Run a long-running datahipy server accepting the commands "
+        "of the DataHIPy command line interface over JSON-RPC.",
+    )
+    parser.add_argument("--socket", help="Path to the Unix socket to listen on")
+    parser.add_argument(
+        "--host", help="Host of the HTTP server", default="127.0.0.1"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        help="Port of the HTTP server (not started if not specified)",
+        default=None,
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        help="Maximal number of commands run concurrently",
+        default=None,
+    )
+    parser.add_argument(
+        "--git_user_name",
+        help="Git user name to use for Datalad ops",
+        default=None
+    )
+    parser.add_argument(
+        "--git_user_email",
+        help="Git user email to use for Datalad ops",
+        default=None
+    )
+    return parser
+
+
+def serve_main(args=None):
+    """Run the `datahipy serve` command line interface."""
+    parser = get_serve_parser()
+    cmd_args = parser.parse_args(args)
+    if not cmd_args.socket and not cmd_args.port:
+        parser.error("at least one of --socket or --port is required")
+    # Set global git user info for Datalad operations
+    set_git_user_info_global(
+        name=cmd_args.git_user_name, email=cmd_args.git_user_email
+    )
+    serve(
+        socket_path=cmd_args.socket,
+        host=cmd_args.host,
+        port=cmd_args.port,
+        max_workers=cmd_args.max_workers,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(serve_main())
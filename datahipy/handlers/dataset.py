@@ -5,7 +5,6 @@
 
 import os
 import json
-import re
 from sre_constants import SUCCESS
 
 import datalad.api
@@ -25,6 +24,8 @@ from datahipy.bids.dataset import (
     create_initial_bids_changes,
     create_initial_bids_readme,
 )
+from datahipy.bids.run import RunIndex
+from datahipy.utils.saving import save_dataset
 
 
 class DatasetHandler:
@@ -70,7 +71,7 @@ class DatasetHandler:
                 "recursive": True,
                 # "version_tag": "0.0.0",  # Uncomment if you wish to create here a tag for the initial state
             }
-            datalad.api.save(**save_params)
+            save_dataset(**save_params)
         # Load the created BIDS dataset in BIDS Manager (creates companion files)
         ds_obj = BidsDataset(ds_path)
         if ds_obj:
@@ -81,14 +82,16 @@ class DatasetHandler:
         if os.path.isdir(ds_path):
             print(SUCCESS)
 
-    def dataset_get_content(self, input_data=None, output_file=None):
+    def dataset_get_content(self, input_data=None, output_file=None, use_cache=True):
         """Extract dataset information indexed by the HIP platform."""
         # Load the input_data json in a dict
         input_data = self.load_input_data(input_data)
 
         # Create a dictionary storing the dataset information
         # indexed by the HIP platform
-        dataset_desc = get_bidsdataset_content(bids_dir=self.dataset_path)
+        dataset_desc = get_bidsdataset_content(
+            bids_dir=self.dataset_path, use_cache=use_cache
+        )
 
         # Dump the dataset_desc dict in a .json file
         if output_file:
@@ -126,39 +129,36 @@ class DatasetHandler:
                 "dataset": BidsDataset.dirname,
                 "message": "Overwrite the converters in the BIDS Manager requirements.json file",
             }
-            datalad.api.save(**save_params)
+            save_dataset(**save_params)
 
     @staticmethod
     def get_run(root_dir: str, bids_entities: dict, bids_modality: str):
-        """Parse the BIDS dataset to get the max run for a set of BIDS entities."""
-        # Generate regexp from entities
-        regexp_list = list()
-        for bids_key, bids_value in bids_entities.items():
-            if bids_value:
-                regexp_list.append(f"{bids_key}-{bids_value}")
-        regexp_list.append("run-[0-9]{1,3}")
-        regexp_list.append(bids_modality)
-        regexp_filename = "_".join(regexp_list)
-        # Get run number parsing BIDS
-        runs = list()
-        for path, directories, files in os.walk(root_dir):
-            for file in files:
-                if re.search(regexp_filename, file):
-                    matched_run = re.search("run-([0-9]{1,3})", file)
-                    runs.append(int(matched_run.group(1)))
-        runs = sorted(runs)
-        if runs:
-            return max(runs)
-        else:
-            return 0
+        """Parse the BIDS dataset to get the max run for a set of BIDS entities.
+
+        To get the runs of several sets of entities, create a single
+        :py:class:`datahipy.bids.run.RunIndex` instead.
+        """
+        return RunIndex(root_dir).get_max_run(bids_entities, bids_modality)
 
     @staticmethod
     def add_keys_requirements(ds_obj=None, clin_keys=None):
-        """Update the requirements.json with new keys."""
+        """Update the requirements.json with new keys.
+
+        The requirements.json is only written if at least one key is added.
+
+        Returns
+        -------
+        added_keys : list of str
+            List of the keys added to the requirements.json.
+        """
+        added_keys = list()
         for clin_key in clin_keys:
             if clin_key not in ds_obj.requirements["Requirements"]["Subject"]["keys"]:
                 ds_obj.requirements["Requirements"]["Subject"]["keys"][clin_key] = str()
-        ds_obj.requirements.save_as_json()
+                added_keys.append(clin_key)
+        if added_keys:
+            ds_obj.requirements.save_as_json()
+        return added_keys
 
     @staticmethod
     def load_input_data(input_data):
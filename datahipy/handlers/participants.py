@@ -5,12 +5,10 @@
 
 import os
 import json
-import shutil
-from datetime import datetime
+import uuid
+import tempfile
 from sre_constants import SUCCESS
 
-import datalad.api
-
 # BIDS Manager Python package has to be accessible.
 try:
     from bids_manager.ins_bids_class import (
@@ -25,9 +23,28 @@ except ImportError:  # pragma: no cover
     print("WARNING: BIDS Manager Python package is not accessible.")
 
 from datahipy.handlers.dataset import DatasetHandler
-from datahipy.bids.participant import get_subject_bidsfile_info
+from datahipy.bids.participant import (
+    get_subject_bidsfile_info,
+    iter_subjects_bidsfile_info,
+)
+from datahipy.bids.run import RunIndex
 from datahipy.bids.bids_manager import post_import_bids_refinement
 from datahipy.bids.version import manage_bids_dataset_with_datalad
+from datahipy.utils.saving import save_modified_paths
+from datahipy.utils.staging import get_scratch_dir, stage_files, staging_dir
+
+# Files and directories, relative to the dataset, written by BIDS Manager
+# when subjects are imported, edited or deleted (besides the subject directories)
+PARTICIPANTS_PATHS = [
+    "participants.tsv",
+    "participants.json",
+    "dataset_description.json",
+    ".bidsignore",
+    os.path.join("code", "requirements.json"),
+    os.path.join("sourcedata", "source_data_trace.tsv"),
+    os.path.join("derivatives", "log"),
+    os.path.join("derivatives", "parsing"),
+]
 
 
 class ParticipantHandler:
@@ -56,34 +73,57 @@ class ParticipantHandler:
             for key in subject:
                 if key != "sub" and key not in clin_keys:
                     clin_keys.append(key)
-        DatasetHandler.add_keys_requirements(ds_obj=ds_obj, clin_keys=clin_keys)
-        ds_obj.parse_bids()
-        # Create the Data2Import object needed by BIDS_Manager to import the data
-        data2import = self.create_data2import(ds_obj=ds_obj, input_data=input_data)
-        # Saving the data2import now it is populated. Note: subjects without data to import are ignored
-        data2import.save_as_json()
-        # Importation of the data into the BIDS dataset using BIDS Manager
-        ds_obj.make_upload_issues(data2import, force_verif=True)
-        # Create a /sourcedata + source_data_trace.tsv
-        ds_obj.import_data(
-            data2import=data2import, keep_sourcedata=True, keep_file_trace=True
+        added_keys = DatasetHandler.add_keys_requirements(
+            ds_obj=ds_obj, clin_keys=clin_keys
         )
-        # Refresh
-        ds_obj.parse_bids()
+        # Re-parse the dataset only if the participants.tsv has new columns
+        if added_keys:
+            ds_obj.parse_bids()
+        # Subjects and sessions with files to import, the only ones to refine after import
+        touched_subjects = sorted({file["subject"] for file in input_data["files"]})
+        touched_sessions = sorted(
+            {
+                file["entities"]["ses"]
+                for file in input_data["files"]
+                if file["entities"].get("ses")
+            }
+        )
+        # Use a unique importation dir removed at the end of the import
+        with staging_dir(prefix="BIDS_import_") as import_path:
+            # Create the Data2Import object needed by BIDS_Manager to import the data
+            data2import = self.create_data2import(
+                ds_obj=ds_obj, input_data=input_data, import_path=import_path
+            )
+            # Saving the data2import now it is populated.
+            # Note: subjects without data to import are ignored
+            data2import.save_as_json()
+            # Importation of the data into the BIDS dataset using BIDS Manager
+            ds_obj.make_upload_issues(data2import, force_verif=True)
+            # Create a /sourcedata + source_data_trace.tsv
+            ds_obj.import_data(
+                data2import=data2import, keep_sourcedata=True, keep_file_trace=True
+            )
         # Post-importation BIDS Manager output refinements
-        # to make BIDS Validator happy
-        post_import_bids_refinement(ds_obj.dirname)
-        # Save dataset state with Datalad
-        save_params = {
-            "dataset": ds_obj.dirname,
-            "message": f'Add files for subject(s): {input_data["subjects"]}',
-            "recursive": True,
-        }
-        datalad.api.save(**save_params)
+        # to make BIDS Validator happy. The BidsDataset object is not used
+        # anymore so it is not refreshed, and only the touched subjects and sessions are walked.
+        post_import_bids_refinement(
+            ds_obj.dirname, subjects=touched_subjects, sessions=touched_sessions
+        )
+        # Save dataset state with Datalad, restricted to the modified paths
+        save_modified_paths(
+            dataset=ds_obj.dirname,
+            message=f'Add files for subject(s): {input_data["subjects"]}',
+            recursive=True,
+            paths=self.get_touched_paths(touched_subjects),
+        )
         print(SUCCESS)
 
     def sub_delete(self, input_data=None):
-        """Delete a subject from an already existing BIDS dataset."""
+        """Delete a subject or a list of subjects from an already existing BIDS dataset.
+
+        All the subjects are removed from a single parsed BIDS dataset object
+        and saved in a single commit.
+        """
         # Check if the dataset is managed by Datalad based on
         # the presence of the .datalad directory. If not, create it.
         # Otherwise, this would fail when trying to save the
@@ -92,23 +132,34 @@ class ParticipantHandler:
            manage_bids_dataset_with_datalad(self.dataset_path)
         # Load the input_data json in a dict
         input_data = self.load_input_data(input_data)
+        subjects = input_data["subject"]
+        if isinstance(subjects, str):
+            subjects = [subjects]
         # Load the targeted BIDS dataset in BIDS Manager
         ds_obj = BidsDataset(self.dataset_path)
-        # Find the subject dict
-        sub_dict = self.find_subject_dict(ds_obj=ds_obj, subject=input_data["subject"])
-        # Delete the subject from the BIDS dataset
+        # Find the subject dicts before removing any subject
+        subject_index = self.index_subjects(ds_obj=ds_obj)
+        sub_dicts = [
+            self.find_subject_dict(subject=subject, subject_index=subject_index)
+            for subject in subjects
+        ]
+        # Delete the subjects from the BIDS dataset
         # Will remove from /raw, /source, participants.tsv, source_data_trace.tsv
-        # but not from derivatives
-        ds_obj.remove(sub_dict, with_issues=True, in_deriv=None)
-        # Refresh
-        ds_obj.parse_bids()
-        # Save dataset state with Datalad
-        save_params = {
-            "dataset": ds_obj.dirname,
-            "message": f'Remove files for subject {input_data["subject"]}',
-            "recursive": True,
-        }
-        datalad.api.save(**save_params)
+        # but not from derivatives. The BidsDataset object is not used
+        # anymore so it is not refreshed.
+        for sub_dict in sub_dicts:
+            ds_obj.remove(sub_dict, with_issues=True, in_deriv=None)
+        # Save dataset state with Datalad, restricted to the modified paths
+        if len(subjects) == 1:
+            save_msg = f"Remove files for subject {subjects[0]}"
+        else:
+            save_msg = f"Remove files for subjects {subjects}"
+        save_modified_paths(
+            dataset=ds_obj.dirname,
+            message=save_msg,
+            recursive=True,
+            paths=self.get_touched_paths(subjects),
+        )
         print(SUCCESS)
 
     def sub_delete_file(self, input_data=None):
@@ -124,8 +175,11 @@ class ParticipantHandler:
         # Load the targeted BIDS dataset in BIDS Manager
         ds_obj = BidsDataset(self.dataset_path)
         subjects = list()
+        subject_index = self.index_subjects(ds_obj=ds_obj)
         for file in input_data["files"]:
-            sub_dict = self.find_subject_dict(ds_obj=ds_obj, subject=file["subject"])
+            sub_dict = self.find_subject_dict(
+                subject=file["subject"], subject_index=subject_index
+            )
             for file_dict in sub_dict[file["modality"]]:
                 if file["fullpath"] == file_dict["fileLoc"]:
                     # Delete the file from the BIDS dataset:
@@ -135,24 +189,56 @@ class ParticipantHandler:
                     print("{} was deleted.".format(file["fullpath"]))
                     if file["subject"] not in subjects:
                         subjects.append(file["subject"])
-        # Save dataset state with Datalad
-        save_params = {
-            "dataset": ds_obj.dirname,
-            "message": f"Remove files for subjects {subjects}",
-            "recursive": True,
-        }
-        datalad.api.save(**save_params)
+        # Save dataset state with Datalad, restricted to the modified paths
+        save_modified_paths(
+            dataset=ds_obj.dirname,
+            message=f"Remove files for subjects {subjects}",
+            recursive=True,
+            paths=self.get_touched_paths(subjects),
+        )
         print(SUCCESS)
 
     def sub_get(self, input_data=None, output_file=None):
-        """Get info of a subject."""
+        """Get info of a subject or of a list of subjects.
+
+        If `"sub"` is a subject label, the output is the list of the files of the
+        subject. If it is a list of subject labels or `"all"`, the dataset is indexed
+        once and the output is an object mapping each subject label to the list of its
+        files, written to the output file subject by subject.
+
+        If `"channels_format": "parquet"` is set in the input data, the channels
+        of the EEG, MEG and iEEG files are written as Parquet files in a
+        `<output_file>_channels` directory instead of being included in the output.
+        """
         # Load the input_data json in a dict
         input_data = self.load_input_data(input_data)
-        sub_info = get_subject_bidsfile_info(
-            bids_dir=self.dataset_path, subject=input_data["sub"]
+        channels_dir = None
+        if input_data.get("channels_format") == "parquet" and output_file:
+            channels_dir = (
+                os.path.splitext(os.path.abspath(output_file))[0] + "_channels"
+            )
+        subjects = input_data["sub"]
+        if isinstance(subjects, str) and subjects != "all":
+            sub_info = get_subject_bidsfile_info(
+                bids_dir=self.dataset_path,
+                channels_dir=channels_dir,
+                subject=subjects,
+            )
+            if output_file:
+                self.dump_output_file(output_data=sub_info, output_file=output_file)
+            print(SUCCESS)
+            return
+        subjects_info = iter_subjects_bidsfile_info(
+            bids_dir=self.dataset_path,
+            subjects=None if subjects == "all" else list(subjects),
+            channels_dir=channels_dir,
         )
         if output_file:
-            self.dump_output_file(output_data=sub_info, output_file=output_file)
+            self.dump_output_stream(output_items=subjects_info, output_file=output_file)
+        else:
+            # Consume the generator to extract the information anyway
+            for _ in subjects_info:
+                pass
         print(SUCCESS)
 
     def sub_edit_clinical(self, input_data=None):
@@ -184,11 +270,16 @@ class ParticipantHandler:
             ds_obj.parse_bids()  # To update the participants.tsv with the new columns
             ds_obj["ParticipantsTSV"].update_subject(input_data["subject"], sub_info)
             ds_obj["ParticipantsTSV"].write_file()
-            # Save dataset state with Datalad
+            # Save dataset state with Datalad, restricted to the modified paths
             save_msg = (
                 f'Update participants.tsv file for subject {input_data["subject"]}'
             )
-            datalad.api.save(dataset=ds_obj.dirname, message=save_msg, recursive=True)
+            save_modified_paths(
+                dataset=ds_obj.dirname,
+                message=save_msg,
+                recursive=True,
+                paths=self.get_touched_paths([]),
+            )
         print(SUCCESS)
 
     @staticmethod
@@ -204,24 +295,52 @@ class ParticipantHandler:
             json.dump(output_data, f, indent=4)
 
     @staticmethod
-    def find_subject_dict(ds_obj=None, subject=None):
-        """Find the subject dict in the parsed BIDS dataset object."""
-        matched_sub = [
-            sub_idx
-            for sub_idx, sub_dict in enumerate(ds_obj["Subject"])
-            if sub_dict["sub"] == subject
-        ]
+    def dump_output_stream(output_items=None, output_file=None):
+        """Dump (key, value) items as a JSON object in a file, item by item as they come."""
+        with open(output_file, "w") as f:
+            f.write("{")
+            for idx, (key, value) in enumerate(output_items):
+                f.write(",\n" if idx else "\n")
+                f.write(f"    {json.dumps(key)}: {json.dumps(value, indent=4)}")
+                f.flush()
+            f.write("\n}\n")
+
+    @staticmethod
+    def get_touched_paths(subjects):
+        """Return the paths, relative to the dataset, that an operation on subjects may write."""
+        paths = list(PARTICIPANTS_PATHS)
+        for subject in subjects:
+            paths += [f"sub-{subject}", os.path.join("sourcedata", f"sub-{subject}")]
+        return paths
+
+    @staticmethod
+    def index_subjects(ds_obj=None):
+        """Index the subject dicts of the parsed BIDS dataset object by subject label."""
+        subject_index = dict()
+        for sub_dict in ds_obj["Subject"]:
+            subject_index.setdefault(sub_dict["sub"], []).append(sub_dict)
+        return subject_index
+
+    @staticmethod
+    def find_subject_dict(ds_obj=None, subject=None, subject_index=None):
+        """Find the subject dict in the parsed BIDS dataset object.
+
+        The `subject_index` returned by :py:meth:`index_subjects` can be passed
+        to avoid indexing the subjects of the dataset object at each call.
+        """
+        if subject_index is None:
+            subject_index = ParticipantHandler.index_subjects(ds_obj=ds_obj)
+        matched_sub = subject_index.get(subject, [])
         if not matched_sub:
             raise IndexError("Could not find the subject in the BIDS dataset.")  # pragma: no cover
         elif len(matched_sub) > 1:
             raise IndexError(
                 "Several subjects with the same ID found in the BIDS dataset."  # pragma: no cover
             )
-        sub_dict = ds_obj["Subject"][matched_sub[0]]
-        return sub_dict
+        return matched_sub[0]
 
     @staticmethod
-    def create_data2import(ds_obj=None, input_data=None):
+    def create_data2import(ds_obj=None, input_data=None, import_path=None):
         """Create a data2import object.
 
         This object will be used to import data in the BIDS dataset.
@@ -234,17 +353,20 @@ class ParticipantHandler:
         input_data : dict
             The input_data dictionary containing the data to import in the BIDS dataset.
 
+        import_path : str
+            Empty importation dir in which the files to import are staged.
+            If None, a new unique importation dir is created in the scratch directory
+            (see :py:func:`datahipy.utils.staging.get_scratch_dir`), which
+            has to be removed by the caller.
+
         Returns
         -------
         data2import : BIDS Manager Data2Import object
             The BIDS Manager object representing the data to import in the BIDS dataset.
         """
         # Init importation directory
-        import_path = os.path.join("/tmp", "BIDS_import")
-        if os.path.isdir(import_path):
-            shutil.rmtree(import_path)
-        if not os.path.isdir(import_path):
-            os.makedirs(import_path)
+        if import_path is None:
+            import_path = tempfile.mkdtemp(prefix="BIDS_import_", dir=get_scratch_dir())
         # Init a BIDS Manager data2import dict
         requirements_path = os.path.join(ds_obj.dirname, "code", "requirements.json")
         data2import = Data2Import(
@@ -263,19 +385,20 @@ class ParticipantHandler:
                 new_sub[bids_key] = bids_value
             data2import["Subject"].append(new_sub)
             sub_idx[subject["sub"]] = idx
-        # Variable to track the RUN number of files to import
-        runs = dict()
+        # Index of the RUN numbers of the files of each subject, updated with the files to import
+        run_indexes = dict()
+        # List of (source, staged) file paths to stage all at once
+        files_to_stage = list()
         # Populate the data2import with the files found in the data_to_import dict
         for file in input_data["files"]:
             # Copy the targeted file in a unique importation dir
             file_name = os.path.basename(file["path"])
             file_path = file["path"]
-            token_dir = str(datetime.timestamp(datetime.now())).replace(".", "")
+            token_dir = uuid.uuid4().hex
             output_file_path = os.path.join(
                 os.path.join(import_path, "temp_bids"), token_dir, file_name
             )
-            os.makedirs(os.path.dirname(output_file_path))
-            shutil.copyfile(file_path, output_file_path)
+            files_to_stage.append((file_path, output_file_path))
             # Determine the BIDS data type to use and init a BIDS Manager modality dict
             bids_dtype = None
             bids_dtype_dict = dict()
@@ -296,16 +419,16 @@ class ParticipantHandler:
             bids_dtype_dict["modality"] = file["modality"]
             bids_dtype_dict["fileLoc"] = os.path.join("temp_bids", token_dir, file_name)
             # Determine RUN
-            bids_values = tuple(file["entities"].values())
-            if bids_values not in runs:
-                runs[bids_values] = DatasetHandler.get_run(
-                    os.path.join(ds_obj.dirname, "sub-" + file["subject"]),
-                    file["entities"],
-                    file["modality"],
+            if file["subject"] not in run_indexes:
+                run_indexes[file["subject"]] = RunIndex(
+                    os.path.join(ds_obj.dirname, "sub-" + file["subject"])
                 )
-            runs[bids_values] += 1
-            bids_dtype_dict["run"] = runs[bids_values]
+            bids_dtype_dict["run"] = run_indexes[file["subject"]].assign_run(
+                file["entities"], file["modality"]
+            )
             data2import["Subject"][sub_idx[file["entities"]["sub"]]][bids_dtype].append(
                 bids_dtype_dict
             )
+        # Link or copy in parallel the files to import in the importation dir
+        stage_files(files_to_stage)
         return data2import
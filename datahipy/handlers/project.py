@@ -6,14 +6,13 @@
 import os
 import shutil
 import json
-import pandas as pd
 from pathlib import Path
 from sre_constants import SUCCESS
 
 import datalad.api
 
-from datahipy.bids.dataset import create_empty_bids_dataset
-from datahipy.bids.dataset import get_bidsdataset_content
+from datahipy.bids.tsv import append_tsv_rows, iter_tsv_rows
+from datahipy.utils.saving import save_dataset
 
 
 PROJECT_FOLDERS = [
@@ -91,6 +90,9 @@ def create_project(input_data: str, output_file: str):
     output_file : str
         Path to output file that will contain the JSON summary of the BIDS dataset of the project.
     """
+    # Import here to not slow down the commands that do not need PyBIDS
+    from datahipy.bids.dataset import create_empty_bids_dataset, get_bidsdataset_content
+
     # Load input data
     with open(input_data, "r") as f:
         input_data = json.load(f)
@@ -119,7 +121,7 @@ def create_project(input_data: str, output_file: str):
         "message": "Initial dataset state of collaborative project",
         "recursive": True,  # Do save the nested Datalad-BIDS dataset
     }
-    datalad.api.save(**save_params)
+    save_dataset(**save_params)
     print(SUCCESS)
 
 
@@ -167,6 +169,9 @@ def import_subject(input_data: str, output_file: str):
     output_file : str
         Path to output file that will contain the JSON summary of the BIDS dataset of the project.
     """
+    # Import here to not slow down the commands that do not need PyBIDS
+    from datahipy.bids.dataset import get_bidsdataset_content
+
     # Load input data
     with open(input_data, "r") as f:
         input_data = json.load(f)
@@ -209,7 +214,7 @@ def import_subject(input_data: str, output_file: str):
         json.dump(dataset_content, f, indent=4)
     # Save dataset state with Datalad
     save_msg = f'Import subject {input_data["participantId"]} from {input_data["sourceDatasetPath"]}'
-    datalad.api.save(
+    save_dataset(
         dataset=input_data["targetDatasetPath"], message=save_msg, recursive=True
     )
     print(SUCCESS)
@@ -231,21 +236,15 @@ def transfer_subject_participants_tsv_row(
     target_participants_tsv : str
         Path to the participants.tsv file of the target BIDS dataset.
     """
-    # Extract subject line from participants.tsv file of source dataset as dataframe
-    source_participants_df = pd.read_csv(source_participant_tsv, sep="\t")
-    source_subject_df = source_participants_df[
-        source_participants_df["participant_id"] == participant_id
+    # Extract subject row from participants.tsv file of source dataset
+    source_subject_rows = [
+        row
+        for row in iter_tsv_rows(source_participant_tsv, convert=False)
+        if row.get("participant_id") == participant_id
     ]
-    # Extract participants.tsv file of target dataset as dataframe
-    target_participants_df = pd.read_csv(target_participants_tsv, sep="\t")
-    # Append subject row dataframe to target dataframe
-    target_participants_df = pd.concat(
-        [target_participants_df, source_subject_df], join="outer"
-    )
-    # Replace any NaN values with 'n/a' following BIDS convention
-    target_participants_df = target_participants_df.fillna("n/a")
-    # Write updated participants.tsv file of target dataset
-    target_participants_df.to_csv(target_participants_tsv, sep="\t", index=False)
+    # Append subject row to participants.tsv file of target dataset.
+    # Missing values are written as 'n/a' following BIDS convention
+    append_tsv_rows(target_participants_tsv, source_subject_rows)
 
 
 def import_document(input_data: str):
@@ -295,5 +294,5 @@ def import_document(input_data: str):
         "message": f'Import document {input_data["sourceDocumentAbsPath"]} from HIP Center space',
         "recursive": True,
     }
-    datalad.api.save(**save_params)
+    save_dataset(**save_params)
     print(SUCCESS)
@@ -0,0 +1,456 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Utility functions to manage the on-disk cache of datahipy."""
+
+import os
+import json
+import hashlib
+import tempfile
+import shutil
+import subprocess
+
+from datahipy.info import __version__
+
+# Environment variable that can be used to change the location of the cache
+CACHE_DIR_ENV = "DATAHIPY_CACHE_DIR"
+# Environment variable that can be used to change the maximal size (in bytes)
+# of each cache namespace
+CACHE_MAX_SIZE_ENV = "DATAHIPY_CACHE_MAX_SIZE"
+# Default maximal size of each cache namespace (256 MB)
+DEFAULT_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+
+def get_cache_dir(namespace=None):
+    """Return the root directory of the datahipy cache, created if it does not exist.
+
+    The location can be set with the `DATAHIPY_CACHE_DIR` environment variable.
+    It defaults to `$XDG_CACHE_HOME/datahipy` or `~/.cache/datahipy`.
+
+    Parameters
+    ----------
+    namespace : str
+        Optional name of a sub-directory of the cache (e.g. "summaries").
+
+    Returns
+    -------
+    cache_dir : str
+        Path to the cache directory.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        cache_dir = os.path.join(
+            os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+            "datahipy",
+        )
+    if namespace:
+        cache_dir = os.path.join(cache_dir, namespace)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_cache_entry_path(namespace, path, name=None, suffix=".json"):
+    """Return the path of the file storing the cache entry of a dataset.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the cache namespace (e.g. "summaries").
+
+    path : str
+        Path to the dataset the entry is related to.
+
+    name : str
+        Optional name distinguishing several entries of the same dataset.
+
+    suffix : str
+        Suffix of the entry file. Use an empty string for directory entries.
+
+    Returns
+    -------
+    str
+        Path to the file (or directory) of the cache entry.
+    """
+    key = os.path.abspath(path)
+    if name:
+        key += f"\0{name}"
+    key = hashlib.sha1(key.encode()).hexdigest()
+    return os.path.join(get_cache_dir(namespace), f"{key}{suffix}")
+
+
+def load_cache_entry(namespace, path, fingerprint):
+    """Load the data cached for a dataset if it is still valid.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the cache namespace (e.g. "summaries").
+
+    path : str
+        Path to the dataset the entry is related to.
+
+    fingerprint : str
+        Current fingerprint of the dataset
+        (see :py:func:`get_dataset_fingerprint`).
+
+    Returns
+    -------
+    data : dict or list or None
+        Cached data, or None if there is no entry or if the entry is stale.
+    """
+    entry = _read_cache_entry(namespace, path)
+    if entry is None or entry.get("fingerprint") != fingerprint:
+        return None
+    # Update the modification time used for least-recently-used eviction
+    try:
+        os.utime(get_cache_entry_path(namespace, path))
+    except OSError:  # pragma: no cover
+        pass
+    return entry["data"]
+
+
+def peek_cache_entry(namespace, path):
+    """Load the data cached for a dataset even if the dataset changed since.
+
+    This is meant for estimates (e.g. of the cost of processing a dataset)
+    for which slightly outdated data is good enough.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the cache namespace (e.g. "summaries").
+
+    path : str
+        Path to the dataset the entry is related to.
+
+    Returns
+    -------
+    data : dict or list or None
+        Cached data, or None if there is no entry.
+    """
+    entry = _read_cache_entry(namespace, path)
+    return entry["data"] if entry is not None else None
+
+
+def _read_cache_entry(namespace, path):
+    """Return the cache entry of a dataset written by the same datahipy version, or None."""
+    try:
+        with open(get_cache_entry_path(namespace, path), "r") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("version") != __version__:
+        return None
+    return entry
+
+
+def save_cache_entry(namespace, path, fingerprint, data):
+    """Save the data of a dataset in the cache and evict old entries if needed.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the cache namespace (e.g. "summaries").
+
+    path : str
+        Path to the dataset the entry is related to.
+
+    fingerprint : str
+        Fingerprint of the dataset the data was computed from.
+
+    data : dict or list
+        JSON-serializable data to cache.
+    """
+    entry_path = get_cache_entry_path(namespace, path)
+    entry = {
+        "path": os.path.abspath(path),
+        "version": __version__,
+        "fingerprint": fingerprint,
+        "data": data,
+    }
+    # Write to a temporary file first and rename it so that concurrent
+    # processes never read a partially written entry
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, entry_path)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"WARNING: Could not write cache entry {entry_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict_cache(namespace)
+
+
+def invalidate_cache_entry(namespace, path):
+    """Remove the cache entry of a dataset.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the cache namespace (e.g. "summaries").
+
+    path : str
+        Path to the dataset the entry is related to.
+    """
+    try:
+        os.remove(get_cache_entry_path(namespace, path))
+    except FileNotFoundError:
+        pass
+
+
+def evict_cache(namespace, max_size=None):
+    """Remove the least recently used entries of a cache namespace until it fits in `max_size`.
+
+    Parameters
+    ----------
+    namespace : str
+        Name of the cache namespace (e.g. "summaries").
+
+    max_size : int
+        Maximal size in bytes of the cache namespace. If None, the value of the
+        `DATAHIPY_CACHE_MAX_SIZE` environment variable is used if set,
+        otherwise `DEFAULT_CACHE_MAX_SIZE`.
+    """
+    if max_size is None:
+        max_size = int(os.environ.get(CACHE_MAX_SIZE_ENV, DEFAULT_CACHE_MAX_SIZE))
+    entries = []
+    total_size = 0
+    with os.scandir(get_cache_dir(namespace)) as it:
+        for entry in it:
+            entry_info = _get_cache_entry_info(entry)
+            if entry_info is not None:
+                entries.append(entry_info)
+                total_size += entry_info[1]
+    # Remove the oldest entries first
+    for _, size, entry_path in sorted(entries):
+        if total_size <= max_size:
+            break
+        try:
+            if os.path.isdir(entry_path):
+                shutil.rmtree(entry_path)
+            else:
+                os.remove(entry_path)
+        except FileNotFoundError:  # pragma: no cover
+            pass
+        total_size -= size
+
+
+def _get_cache_entry_info(entry):
+    """Return the (modification time, size, path) of an entry of a cache namespace.
+
+    None is returned for the temporary files and directories being written
+    and for the entries removed in the meantime.
+    """
+    if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+        return None
+    try:
+        stat = entry.stat()
+        size = _get_directory_size(entry.path) if entry.is_dir() else stat.st_size
+    except FileNotFoundError:  # pragma: no cover
+        return None
+    return stat.st_mtime, size, entry.path
+
+
+def _get_directory_size(path):
+    """Return the total size in bytes of the files of a directory."""
+    size = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                size += os.lstat(os.path.join(root, filename)).st_size
+            except FileNotFoundError:  # pragma: no cover
+                pass
+    return size
+
+
+def run_git(path, *args):
+    """Run a git command in a directory and return its standard output.
+
+    Parameters
+    ----------
+    path : str
+        Path to the directory in which the git command is run.
+
+    args : list
+        Arguments passed to git.
+
+    Returns
+    -------
+    str or None
+        Decoded standard output of the command, or None if it failed.
+    """
+    try:
+        output = subprocess.run(
+            ["git", "-C", path] + list(args), capture_output=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.decode("utf-8", errors="surrogateescape")
+
+
+def get_dataset_fingerprint(path):
+    """Return a fingerprint of the state of a dataset.
+
+    For a dataset managed by git/Datalad, the fingerprint combines the HEAD commit
+    with the paths, sizes, and modification times of the files reported as changed
+    by `git status`, so that uncommitted modifications are taken into account.
+    It also includes the `git-annex` branch, which records the annexed contents
+    present locally and changes when contents are fetched or dropped.
+    Otherwise, it falls back to the paths, sizes, and modification times of all files.
+
+    Parameters
+    ----------
+    path : str
+        Path to the dataset.
+
+    Returns
+    -------
+    fingerprint : str
+        Hexadecimal digest representing the state of the dataset.
+    """
+    path = os.path.abspath(path)
+    digest = hashlib.sha1()
+    # The pattern of --branches matches the git-annex branch only (without the
+    # bracket, "/*" would be appended to it), which is not printed if missing
+    git_info = run_git(path, "rev-parse", "--show-toplevel", "HEAD", "--branches=git-anne[x]")
+    git_status = (
+        run_git(path, "status", "--porcelain", "-z", "--untracked-files=all", "--", ".")
+        if git_info is not None
+        else None
+    )
+    if git_status is not None:
+        repo_root, *refs = git_info.splitlines()
+        for ref in refs:
+            digest.update(ref.encode())
+        # Porcelain paths are relative to the root of the repository.
+        # Renamed entries are followed by their original path.
+        items = iter(git_status.split("\0"))
+        for item in items:
+            if not item:
+                continue
+            digest.update(item.encode("utf-8", errors="surrogateescape"))
+            digest.update(_get_stat_signature(os.path.join(repo_root, item[3:])))
+            if "R" in item[:2] or "C" in item[:2]:
+                digest.update(next(items, "").encode("utf-8", errors="surrogateescape"))
+    else:
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != ".git")
+            for filename in sorted(files):
+                file_path = os.path.join(root, filename)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update(_get_stat_signature(file_path))
+    return digest.hexdigest()
+
+
+def get_toplevel_fingerprints(path):
+    """Return a fingerprint for each top-level entry of a dataset.
+
+    For a dataset managed by git/Datalad, the fingerprint of an entry is based on its
+    git object hash at HEAD (the tree hash for a directory), updated with the paths,
+    sizes, and modification times of its files reported as changed by `git status`.
+    Unlike :py:func:`get_dataset_fingerprint`, it does not change when a new commit
+    leaves an entry untouched. Otherwise, it falls back to the paths, sizes, and
+    modification times of the files of each entry.
+
+    Parameters
+    ----------
+    path : str
+        Path to the dataset.
+
+    Returns
+    -------
+    fingerprints : dict
+        Dictionary mapping the names of the top-level entries to their fingerprint.
+    """
+    path = os.path.abspath(path)
+    git_info = run_git(path, "rev-parse", "--show-prefix", "HEAD")
+    git_tree = run_git(path, "ls-tree", "-z", "HEAD") if git_info is not None else None
+    git_status = (
+        run_git(path, "status", "--porcelain", "-z", "--untracked-files=all", "--", ".")
+        if git_tree is not None
+        else None
+    )
+    if git_status is not None:
+        # Porcelain paths are relative to the root of the repository
+        prefix = git_info.splitlines()[0]
+        digests = _get_git_toplevel_digests(path, prefix, git_tree, git_status)
+    else:
+        digests = _get_stat_toplevel_digests(path)
+    return {name: digest.hexdigest() for name, digest in digests.items()}
+
+
+def _get_git_toplevel_digests(path, prefix, git_tree, git_status):
+    """Return the digests of the top-level entries of a dataset from its git tree and status.
+
+    Parameters
+    ----------
+    path : str
+        Absolute path to the dataset.
+
+    prefix : str
+        Path of the dataset relative to the root of its repository (see `--show-prefix`).
+
+    git_tree : str
+        Output of `git ls-tree -z HEAD` in the dataset.
+
+    git_status : str
+        Output of `git status --porcelain -z` restricted to the dataset.
+
+    Returns
+    -------
+    digests : dict
+        Dictionary mapping the names of the top-level entries to their digest.
+    """
+    digests = {}
+    for item in git_tree.split("\0"):
+        if not item:
+            continue
+        meta, name = item.split("\t", 1)
+        digests[name] = hashlib.sha1(meta.split()[2].encode())
+    items = iter(git_status.split("\0"))
+    for item in items:
+        if not item:
+            continue
+        changed_paths = [item[3:]]
+        # Renamed entries are followed by their original path
+        if "R" in item[:2] or "C" in item[:2]:
+            changed_paths.append(next(items, ""))
+        for changed_path in changed_paths:
+            if changed_path.startswith(prefix):
+                changed_path = changed_path[len(prefix):]
+            name = changed_path.split("/", 1)[0]
+            digest = digests.setdefault(name, hashlib.sha1())
+            digest.update(item.encode("utf-8", errors="surrogateescape"))
+            digest.update(_get_stat_signature(os.path.join(path, changed_path)))
+    return digests
+
+
+def _get_stat_toplevel_digests(path):
+    """Return the digests of the top-level entries of a directory from the stats of their files."""
+    digests = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name == ".git":
+                continue
+            digest = digests.setdefault(entry.name, hashlib.sha1())
+            digest.update(_get_stat_signature(entry.path))
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            for root, dirs, files in os.walk(entry.path):
+                dirs.sort()
+                for filename in sorted(files):
+                    file_path = os.path.join(root, filename)
+                    digest.update(os.path.relpath(file_path, path).encode())
+                    digest.update(_get_stat_signature(file_path))
+    return digests
+
+
+def _get_stat_signature(path):
+    """Return the size and modification time of a path as bytes (empty if missing)."""
+    try:
+        stat = os.lstat(path)
+    except OSError:
+        return b""
+    return f"{stat.st_size}:{stat.st_mtime_ns}".encode()
@@ -0,0 +1,393 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Methods to save the state of datasets managed by Datalad."""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from datahipy.utils.cache import run_git
+
+# Saves deferred by `coalesce_saves` in the current thread
+_PENDING_SAVES = threading.local()
+
+# Default number of parallel jobs used by Datalad to save the subdatasets of a dataset
+SAVE_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def save_dataset(dataset, message=None, recursive=False, path=None, version_tag=None, **kwargs):
+    """Save the state of a dataset with `datalad.api.save`.
+
+    Inside a :py:func:`coalesce_saves` context, the save is deferred and merged
+    with the other saves of the same dataset into a single commit made at the
+    end of the context. Saves creating a version tag (or with extra arguments)
+    are never deferred: the pending saves of the dataset are merged into them
+    so that the tag includes all changes.
+
+    Parameters
+    ----------
+    dataset : str
+        Path to the dataset to save.
+
+    message : str
+        Commit message.
+
+    recursive : bool
+        If True, also save the subdatasets.
+
+    path : str or list of str
+        Path(s) to save in the dataset. If None, the whole dataset is saved.
+
+    version_tag : str
+        Tag to create on the commit.
+
+    kwargs : dict
+        Other arguments passed to `datalad.api.save`.
+    """
+    pending = getattr(_PENDING_SAVES, "saves", None)
+    if pending is not None and version_tag is None and not kwargs:
+        key = os.path.abspath(str(dataset))
+        save = pending.setdefault(key, {"messages": [], "recursive": False, "path": []})
+        if message:
+            save["messages"].append(message)
+        save["recursive"] = save["recursive"] or recursive
+        if path is None or save["path"] is None:
+            save["path"] = None
+        else:
+            save["path"] += [str(p) for p in (path if isinstance(path, list) else [path])]
+        return
+    if pending:
+        # Include the deferred saves of the dataset (and of its subdatasets
+        # if recursive) in this save and list their messages in its message
+        key = os.path.abspath(str(dataset))
+        merged = [
+            pending.pop(other)
+            for other in list(pending)
+            if other == key or (recursive and other.startswith(key + os.sep))
+        ]
+        messages = sum((save["messages"] for save in merged), [])
+        if messages:
+            message = "\n\n".join(
+                [message or ""] + ["\n".join(f"- {m}" for m in messages)]
+            ).strip()
+        if merged and path is not None:
+            path = None
+    _save_dataset_now(dataset, message, recursive, path, version_tag, **kwargs)
+
+
+def _save_dataset_now(dataset, message, recursive, path, version_tag, **kwargs):
+    """Save a dataset without deferring (see :py:func:`save_dataset`)."""
+    if recursive and path is None:
+        save_dataset_recursively(dataset, message=message, version_tag=version_tag, **kwargs)
+        return
+    # Import here to not slow down the commands that do not save datasets
+    import datalad.api
+
+    save_params = {"dataset": dataset, "message": message, "recursive": recursive}
+    if path is not None:
+        save_params["path"] = path
+    if version_tag is not None:
+        save_params["version_tag"] = version_tag
+    datalad.api.save(**save_params, **kwargs)
+
+
+def get_modified_paths(dataset, paths=None):
+    """Return the paths of a dataset reported as modified, deleted or untracked by `git status`.
+
+    Parameters
+    ----------
+    dataset : str
+        Path to the dataset.
+
+    paths : list of str
+        Paths (absolute or relative to the dataset) to restrict the status to.
+        If None, the status of the whole dataset is computed.
+
+    Returns
+    -------
+    paths : list of str or None
+        Sorted absolute paths (untracked directories are reported as a whole),
+        or None if the status could not be computed or if the dataset is not
+        the root of a git repository.
+    """
+    dataset = os.path.abspath(str(dataset))
+    # The dataset has to be the root of its repository as the paths are relative to it
+    toplevel = run_git(dataset, "rev-parse", "--show-toplevel")
+    if toplevel is None or os.path.realpath(toplevel.strip()) != os.path.realpath(dataset):
+        return None
+    pathspecs = ["--"] + [
+        os.path.relpath(os.path.join(dataset, str(path)), dataset) for path in paths or []
+    ]
+    output = run_git(
+        dataset,
+        "status",
+        "--porcelain",
+        "-z",
+        "--no-renames",
+        "--untracked-files=normal",
+        *pathspecs,
+    )
+    if output is None:
+        return None
+    # Each entry is "XY path" with paths relative to the dataset root
+    return sorted(
+        {
+            os.path.join(dataset, entry[3:].rstrip("/"))
+            for entry in output.split("\0")
+            if len(entry) > 3
+        }
+    )
+
+
+def save_modified_paths(dataset, message=None, recursive=False, paths=None):
+    """Save only the modified paths of a dataset with :py:func:`save_dataset`.
+
+    The modified paths are listed with a native `git status`, which is much faster
+    than the status computed by Datalad on the whole dataset when no path is given.
+    The status is restricted to the paths an operation may write (e.g. the subject
+    directories, the participants files and the logs of BIDS Manager), so that
+    unrelated modifications of the dataset are not committed with the operation.
+    If the status cannot be computed, the whole dataset is saved.
+    If nothing is modified, nothing is saved.
+
+    Parameters
+    ----------
+    dataset : str
+        Path to the dataset to save.
+
+    message : str
+        Commit message.
+
+    recursive : bool
+        If True, also save the modified subdatasets.
+
+    paths : list of str
+        Paths (absolute or relative to the dataset) to restrict the save to,
+        which may be directories or not exist. If None, all modified paths are saved.
+    """
+    paths = get_modified_paths(dataset, paths=paths)
+    if paths is None:
+        print(f"WARNING: Could not get the status of dataset {dataset}. Saving it entirely...")
+        save_dataset(dataset=dataset, message=message, recursive=recursive)
+        return
+    if not paths:
+        print(f"> Nothing to save in dataset {dataset}")
+        return
+    save_dataset(dataset=dataset, message=message, recursive=recursive, path=paths)
+
+
+def flush_pending_saves():
+    """Make the saves deferred by :py:func:`coalesce_saves` in the current thread.
+
+    Each dataset is saved once with a commit message listing the messages of the
+    deferred saves. Nested datasets are saved before the datasets containing them.
+    """
+    pending = getattr(_PENDING_SAVES, "saves", None)
+    if not pending:
+        return
+    saves = sorted(pending.items(), key=lambda item: len(item[0]), reverse=True)
+    pending.clear()
+    for dataset, save in saves:
+        messages = save["messages"]
+        if len(messages) > 1:
+            message = f"Batch of {len(messages)} operations:\n\n" + "\n".join(
+                f"- {message}" for message in messages
+            )
+        else:
+            message = messages[0] if messages else None
+        print(f"Save dataset {dataset} ({len(messages)} coalesced operations)...")
+        _save_dataset_now(
+            dataset,
+            message,
+            save["recursive"],
+            sorted(set(save["path"])) if save["path"] is not None else None,
+            None,
+        )
+
+
+def list_subdatasets(dataset):
+    """Return the installed subdatasets of a dataset, recursively.
+
+    The subdatasets are read from the `.gitmodules` files, which is much
+    cheaper than querying Datalad.
+
+    Parameters
+    ----------
+    dataset : str
+        Path to the dataset.
+
+    Returns
+    -------
+    subdatasets : list of str
+        Absolute paths to the installed subdatasets, parents before their children.
+    """
+    subdatasets = []
+    parents = [os.path.abspath(str(dataset))]
+    while parents:
+        parent = parents.pop(0)
+        if not os.path.exists(os.path.join(parent, ".gitmodules")):
+            continue
+        output = run_git(
+            parent, "config", "--file", ".gitmodules", "--get-regexp", r"^submodule\..*\.path$"
+        )
+        for line in (output or "").splitlines():
+            subdataset = os.path.join(parent, line.split(" ", 1)[1])
+            # Skip the subdatasets that are not installed
+            if os.path.exists(os.path.join(subdataset, ".git")):
+                subdatasets.append(subdataset)
+                parents.append(subdataset)
+    return subdatasets
+
+
+def is_dataset_dirty(dataset):
+    """Return True if a dataset has modified or untracked files (or if its status is unknown).
+
+    Parameters
+    ----------
+    dataset : str
+        Path to the dataset.
+
+    Returns
+    -------
+    bool
+        True if the dataset needs to be saved.
+    """
+    output = run_git(dataset, "status", "--porcelain", "--untracked-files=normal")
+    return output is None or output.strip() != ""
+
+
+def tag_dataset(dataset, tag):
+    """Create a tag on the HEAD commit of a dataset with a native `git tag`.
+
+    Parameters
+    ----------
+    dataset : str
+        Path to the dataset.
+
+    tag : str
+        Name of the tag.
+
+    Returns
+    -------
+    bool
+        True if the tag was created or already exists on the HEAD commit.
+    """
+    if run_git(dataset, "tag", tag) is not None:
+        return True
+    # The tag may already have been created on HEAD (e.g. by Datalad)
+    tagged = run_git(dataset, "rev-parse", "--verify", "-q", f"refs/tags/{tag}^{{commit}}")
+    head = run_git(dataset, "rev-parse", "--verify", "-q", "HEAD")
+    return tagged is not None and head is not None and tagged.strip() == head.strip()
+
+
+def save_dataset_recursively(dataset, message=None, version_tag=None, jobs=None, **kwargs):
+    """Save a dataset and its modified subdatasets, the subdatasets being saved in parallel.
+
+    Datalad is not thread-safe, so the subdatasets are saved by a single recursive
+    `datalad.api.save` call with `jobs` parallel jobs, which saves the subdatasets
+    before the datasets containing them. If all subdatasets are clean, which is
+    checked with a cheap `git status`, only the dataset itself is saved.
+    As the saves run in parallel, the result of each dataset is reported with the
+    time since the previous result and the time since the start of the save.
+    When a version tag is created, the subdatasets not reported by the save
+    are tagged as well.
+
+    Parameters
+    ----------
+    dataset : str
+        Path to the dataset to save.
+
+    message : str
+        Commit message.
+
+    version_tag : str
+        Tag to create on the dataset and all its installed subdatasets.
+
+    jobs : int
+        Number of parallel jobs used by Datalad to save the subdatasets.
+        Default to `SAVE_MAX_WORKERS`.
+
+    kwargs : dict
+        Other arguments passed to `datalad.api.save`.
+    """
+    # Import here to not slow down the commands that do not save datasets
+    import datalad.api
+
+    dataset = os.path.abspath(str(dataset))
+    dirty_subdatasets, clean_subdatasets = split_subdatasets_by_status(dataset)
+    save_params = dict(kwargs, message=message, return_type="generator")
+    if version_tag is not None:
+        save_params["version_tag"] = version_tag
+    if dirty_subdatasets:
+        save_params["recursive"] = True
+        save_params["jobs"] = jobs or SAVE_MAX_WORKERS
+    saved_datasets = set()
+    start = previous = time.perf_counter()
+    for result in datalad.api.save(dataset=dataset, **save_params):
+        if result.get("action") == "save" and result.get("type") == "dataset":
+            saved_datasets.add(os.path.abspath(result["path"]))
+            now = time.perf_counter()
+            print(
+                f"> Save dataset {result['path']}: {result.get('status')} "
+                f"(+{now - previous:.2f}s since the previous result, "
+                f"{now - start:.2f}s since the start of the save)"
+            )
+            previous = now
+    print(
+        f"> Saved dataset {dataset} and {len(dirty_subdatasets)} modified subdataset(s) "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    # Tag the subdatasets that were not touched (and thus not tagged) by the save
+    if version_tag is not None:
+        for subdataset in clean_subdatasets:
+            if subdataset not in saved_datasets and not tag_dataset(subdataset, version_tag):
+                print(f"WARNING: Could not create tag {version_tag} in {subdataset}")
+
+
+def split_subdatasets_by_status(dataset):
+    """Return the installed subdatasets of a dataset that need to be saved and the clean ones.
+
+    Parameters
+    ----------
+    dataset : str
+        Path to the dataset.
+
+    Returns
+    -------
+    dirty_subdatasets : list of str
+        Absolute paths to the subdatasets with modified or untracked files.
+
+    clean_subdatasets : list of str
+        Absolute paths to the other subdatasets.
+    """
+    dirty_subdatasets, clean_subdatasets = [], []
+    for subdataset in list_subdatasets(dataset):
+        if is_dataset_dirty(subdataset):
+            dirty_subdatasets.append(subdataset)
+        else:
+            clean_subdatasets.append(subdataset)
+            print(f"> Skip saving clean subdataset {subdataset}")
+    return dirty_subdatasets, clean_subdatasets
+
+
+@contextmanager
+def coalesce_saves():
+    """Context manager deferring the saves of :py:func:`save_dataset` to its end.
+
+    All saves of a dataset made in the context result in a single commit.
+    Nested contexts are merged with the outermost one. Deferred saves are made
+    even if an exception is raised, so that completed operations are recorded.
+    """
+    if getattr(_PENDING_SAVES, "saves", None) is not None:
+        yield
+        return
+    _PENDING_SAVES.saves = {}
+    try:
+        yield
+    finally:
+        try:
+            flush_pending_saves()
+        finally:
+            _PENDING_SAVES.saves = None
@@ -0,0 +1,292 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Utility functions to run independent tasks in a fault-isolated pool of worker processes."""
+
+import os
+import sys
+import time
+import heapq
+import signal
+import functools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Default number of tasks run by a worker process before it is replaced
+# (only supported with Python 3.11+)
+DEFAULT_MAX_TASKS_PER_CHILD = 10
+
+# Default delay in seconds before the first retry of a failed task.
+# The delay is doubled after each attempt.
+DEFAULT_RETRY_BACKOFF = 1.0
+
+# Default delay in seconds after the timeout of a task before its worker process
+# is killed by the parent, in case the task did not stop on the timeout signal
+# (e.g. if it catches it or is blocked in C code)
+DEFAULT_TIMEOUT_GRACE = 5.0
+
+
+class TaskTimeoutError(BaseException):
+    """Raised in a worker process when a task exceeds its timeout.
+
+    Like `KeyboardInterrupt`, it does not derive from `Exception` (`TimeoutError`
+    being an `OSError`) so that it is not caught by the error handling of the task.
+    """
+
+
+def _raise_task_timeout(signum, frame):
+    raise TaskTimeoutError("Task timed out")
+
+
+def _run_task(func, args, timeout):
+    """Run a task in a worker process and interrupt it after `timeout` seconds.
+
+    The timeout relies on a `SIGALRM` timer, which interrupts pending system calls
+    (e.g. waiting for the bids-validator) so that a hung task does not block
+    its worker forever.
+    """
+    if not timeout or not hasattr(signal, "setitimer"):
+        return func(*args)
+    previous_handler = signal.signal(signal.SIGALRM, _raise_task_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _create_executor(max_workers, max_tasks_per_child):
+    """Create a process pool whose workers are recycled if supported."""
+    if max_tasks_per_child and sys.version_info >= (3, 11):
+        return ProcessPoolExecutor(
+            max_workers=max_workers, max_tasks_per_child=max_tasks_per_child
+        )
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+
+def _shutdown_executor(executor, futures):
+    """Shut down a process pool without waiting, cancelling the futures not started yet.
+
+    The futures are cancelled one by one as `cancel_futures` of
+    `Executor.shutdown` is only available from Python 3.9.
+    """
+    for future in futures:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+
+def _terminate_executor(executor, futures):
+    """Kill the worker processes of a process pool and shut it down.
+
+    This is used when a task overran its deadline without stopping on the
+    timeout signal, as its worker would otherwise never be released.
+    """
+    # The processes are not exposed by the public API of ProcessPoolExecutor
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    _shutdown_executor(executor, futures)
+    for process in processes:
+        if process.is_alive():
+            process.kill()
+
+
+def make_error_record(exception, attempts):
+    """Return a JSON-serializable description of the failure of a task.
+
+    Parameters
+    ----------
+    exception : Exception
+        Exception raised by the last attempt of the task.
+
+    attempts : int
+        Number of attempts made to run the task.
+
+    Returns
+    -------
+    dict
+        Dictionary with the `type` and `message` of the exception and
+        the number of `attempts`.
+    """
+    return {
+        "type": type(exception).__name__,
+        "message": str(exception),
+        "attempts": attempts,
+    }
+
+
+def _retry_or_fail(pending, args_list, retries, backoff, index, attempt, exception):
+    """Schedule the retry of a failed task, or return its error if it has no retry left."""
+    if attempt < retries:
+        print(
+            f"WARNING: Task {args_list[index]} failed ({exception}). "
+            f"Retrying ({attempt + 1}/{retries})..."
+        )
+        heapq.heappush(pending, (time.monotonic() + backoff * 2**attempt, index, attempt + 1))
+        return None
+    return index, None, make_error_record(exception, attempt + 1)
+
+
+def _submit_ready_tasks(executor, func, args_list, pending, running, max_workers, timeout, grace):
+    """Submit the tasks that are ready to run, without queuing more tasks than workers.
+
+    Only the running tasks are thus affected if a worker dies.
+    """
+    now = time.monotonic()
+    while pending and pending[0][0] <= now and len(running) < max_workers:
+        _, index, attempt = heapq.heappop(pending)
+        future = executor.submit(_run_task, func, args_list[index], timeout)
+        deadline = now + timeout + grace if timeout else None
+        running[future] = (index, attempt, deadline)
+
+
+def _get_wait_timeout(pending, running, max_workers):
+    """Return the delay until the next retry can be submitted or the earliest deadline."""
+    wake_times = [deadline for _, _, deadline in running.values() if deadline is not None]
+    if pending and len(running) < max_workers:
+        wake_times.append(pending[0][0])
+    return max(0, min(wake_times) - time.monotonic()) if wake_times else None
+
+
+def _is_overdue(task):
+    """Return True if a running (index, attempt, deadline) task overran its deadline."""
+    return task[2] is not None and task[2] <= time.monotonic()
+
+
+def _collect_results(done, running, handle_failure):
+    """Yield the results of the completed tasks and return True if the pool is broken."""
+    broken = False
+    for future in done:
+        index, attempt, _ = running.pop(future)
+        try:
+            result = future.result()
+        except (Exception, TaskTimeoutError) as e:
+            broken = broken or isinstance(e, BrokenProcessPool)
+            failure = handle_failure(index, attempt, e)
+            if failure:
+                yield failure
+            continue
+        yield index, result, None
+    return broken
+
+
+def _kill_overdue_tasks(executor, pending, running, handle_failure):
+    """Kill the pool running tasks that did not stop on the timeout signal.
+
+    The overdue tasks count as failed attempts and the other running tasks
+    are resubmitted without counting an attempt.
+    """
+    print("WARNING: A task overran its deadline. Restarting the pool...")
+    overdue = [future for future, task in running.items() if _is_overdue(task)]
+    _terminate_executor(executor, running)
+    for future, (index, attempt, _) in list(running.items()):
+        if future in overdue:
+            failure = handle_failure(
+                index, attempt, TaskTimeoutError("Task overran its deadline")
+            )
+            if failure:
+                yield failure
+        else:
+            heapq.heappush(pending, (time.monotonic(), index, attempt))
+    running.clear()
+
+
+def _restart_broken_pool(executor, running, handle_failure):
+    """Shut down a broken pool, the tasks that were running in it counting as failed attempts."""
+    print("WARNING: A worker process died unexpectedly. Restarting the pool...")
+    _shutdown_executor(executor, running)
+    for index, attempt, _ in list(running.values()):
+        failure = handle_failure(index, attempt, BrokenProcessPool("Worker process died"))
+        if failure:
+            yield failure
+    running.clear()
+
+
+def run_tasks(
+    func,
+    args_list,
+    max_workers=None,
+    timeout=None,
+    retries=0,
+    backoff=DEFAULT_RETRY_BACKOFF,
+    max_tasks_per_child=DEFAULT_MAX_TASKS_PER_CHILD,
+    grace=DEFAULT_TIMEOUT_GRACE,
+):
+    """Run a function on a list of arguments in a pool of worker processes.
+
+    A failing task does not abort the other ones: it is retried with an exponential
+    backoff and then reported as an error. Each task can be bounded in time, and
+    workers are replaced after `max_tasks_per_child` tasks to bound their memory
+    usage. If a worker dies (e.g. killed by the OOM killer), the pool is recreated
+    and all the tasks that were running in it count as failed attempts.
+    If a task does not stop on its timeout signal, the pool is killed once the
+    task overruns its deadline by `grace` seconds: the task counts as a failed
+    attempt and the other tasks that were running are resubmitted.
+
+    Parameters
+    ----------
+    func : callable
+        Picklable function to run in the worker processes.
+
+    args_list : list of tuple
+        Arguments of each task.
+
+    max_workers : int
+        Maximal number of worker processes.
+
+    timeout : float
+        Maximal duration of each attempt of a task in seconds (no limit if None).
+
+    retries : int
+        Number of times a failed task is retried.
+
+    backoff : float
+        Delay in seconds before the first retry of a task, doubled after each attempt.
+
+    max_tasks_per_child : int
+        Number of tasks run by a worker process before it is replaced
+        (ignored before Python 3.11).
+
+    grace : float
+        Delay in seconds after the timeout of a task before its worker is killed.
+
+    Yields
+    ------
+    index : int
+        Index of the task in `args_list`.
+
+    result : object
+        Return value of the task, or None if it failed.
+
+    error : dict or None
+        Error record of the task (see :py:func:`make_error_record`),
+        or None if it succeeded.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    # Heap of (time at which the task can be submitted, index, attempt)
+    pending = [(0, index, 0) for index in range(len(args_list))]
+    # Running tasks by future: (index, attempt, deadline)
+    running = {}
+    executor = None
+    handle_failure = functools.partial(_retry_or_fail, pending, args_list, retries, backoff)
+    try:
+        while pending or running:
+            if executor is None:
+                executor = _create_executor(max_workers, max_tasks_per_child)
+            _submit_ready_tasks(
+                executor, func, args_list, pending, running, max_workers, timeout, grace
+            )
+            wait_timeout = _get_wait_timeout(pending, running, max_workers)
+            if not running:
+                time.sleep(wait_timeout)
+                continue
+            done, _ = wait(running, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+            broken = yield from _collect_results(done, running, handle_failure)
+            if any(_is_overdue(task) for task in running.values()):
+                yield from _kill_overdue_tasks(executor, pending, running, handle_failure)
+                executor = None
+            elif broken:
+                yield from _restart_broken_pool(executor, running, handle_failure)
+                executor = None
+    finally:
+        if executor is not None:
+            _shutdown_executor(executor, running)
@@ -0,0 +1,213 @@
+# Copyright (C) 2022-2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Utility functions to stage files to import with as little I/O as possible."""
+
+import os
+import time
+import errno
+import shutil
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# Environment variable that can be used to set the directory in which staging
+# directories are created (e.g. a tmpfs mount). Default to the system temporary directory.
+SCRATCH_DIR_ENV = "DATAHIPY_SCRATCH_DIR"
+
+# ioctl request to clone a file on copy-on-write filesystems (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# Size in bytes of the chunks copied in parallel when a file cannot be linked
+STAGING_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Default number of threads used to copy chunks
+STAGING_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+# Available staging methods
+STAGING_METHODS = ["reflink", "hardlink", "copy"]
+
+# Staging methods tried in order by default. Hard links are excluded as the staged
+# file would share its inode with the source file of the user: any in-place
+# modification of the staged file (e.g. by the importer or git-annex) would also
+# modify the source file.
+DEFAULT_STAGING_METHODS = ["reflink", "copy"]
+
+
+def get_scratch_dir():
+    """Return the directory in which staging directories are created.
+
+    The directory is created if it does not exist.
+    """
+    scratch_dir = os.environ.get(SCRATCH_DIR_ENV) or tempfile.gettempdir()
+    os.makedirs(scratch_dir, exist_ok=True)
+    return scratch_dir
+
+
+@contextmanager
+def staging_dir(prefix="datahipy_staging_"):
+    """Context manager creating a unique staging directory removed at its end.
+
+    The directory is created in the directory returned by :py:func:`get_scratch_dir`
+    so that concurrent commands never share a staging directory.
+
+    Parameters
+    ----------
+    prefix : str
+        Prefix of the name of the staging directory.
+
+    Yields
+    ------
+    str
+        Path to the staging directory.
+    """
+    path = tempfile.mkdtemp(prefix=prefix, dir=get_scratch_dir())
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def stage_files(file_pairs, methods=None, max_workers=None, chunk_size=STAGING_CHUNK_SIZE):
+    """Stage files by reflinking, hard-linking, or copying them in parallel.
+
+    For each file, the staging methods are tried in order. A reflink (copy-on-write
+    clone) is independent of the source file. A hard link, only tried if requested
+    and if the source and the target are on the same filesystem, shares its content
+    with the source file: it must only be used if the staged file is never modified
+    in place (e.g. only copied by the importer). Otherwise, the file is copied in
+    chunks with `os.copy_file_range` (or `os.pread`/`os.pwrite` if not supported),
+    the chunks of all files being copied in parallel.
+
+    Parameters
+    ----------
+    file_pairs : list of tuple
+        List of (source path, target path). Parent directories of the targets are
+        created if needed.
+
+    methods : list of str
+        Staging methods to try among `STAGING_METHODS`, in order.
+        Default to `DEFAULT_STAGING_METHODS` (reflink, then copy).
+
+    max_workers : int
+        Number of threads used to copy the chunks. Default to `STAGING_MAX_WORKERS`.
+
+    chunk_size : int
+        Size in bytes of the chunks copied in parallel.
+
+    Returns
+    -------
+    records : list of dict
+        Record of the staging of each file with its `source`, `target`, `method`,
+        `bytes`, `seconds`, and `throughput` (bytes per second).
+    """
+    methods = methods or DEFAULT_STAGING_METHODS
+    records = []
+    chunks = []
+    for source, target in file_pairs:
+        # Resolve symbolic links (e.g. annexed files) to stage their content
+        source = os.path.realpath(source)
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        size = os.stat(source).st_size
+        record = {"source": source, "target": target, "bytes": size}
+        start = time.perf_counter()
+        if "reflink" in methods and _reflink(source, target):
+            record["method"] = "reflink"
+        elif "hardlink" in methods and _hardlink(source, target):
+            record["method"] = "hardlink"
+        elif "copy" in methods:
+            record["method"] = "copy"
+            # Create the target with its final size so that chunks can be written in any order
+            with open(target, "wb") as f:
+                f.truncate(size)
+            chunks += [
+                (record, offset, min(chunk_size, size - offset))
+                for offset in range(0, size, chunk_size)
+            ]
+        else:
+            raise OSError(f"Could not stage {source} with methods {methods}")
+        record["seconds"] = time.perf_counter() - start
+        records.append(record)
+    # Copy the chunks of all files in parallel. The staging time of a copied file
+    # spans from the start of its first chunk to the end of its last chunk.
+    if chunks:
+        copy_times = {}
+        with ThreadPoolExecutor(max_workers=max_workers or STAGING_MAX_WORKERS) as executor:
+            for record, start, end in executor.map(lambda chunk: _copy_chunk(*chunk), chunks):
+                first_start, last_end = copy_times.get(id(record), (start, end))
+                copy_times[id(record)] = (min(first_start, start), max(last_end, end))
+        for record in records:
+            if id(record) in copy_times:
+                start, end = copy_times[id(record)]
+                record["seconds"] += end - start
+    for record in records:
+        record["throughput"] = record["bytes"] / record["seconds"] if record["seconds"] else 0
+        print(
+            f"Staged {record['source']} -> {record['target']} ({record['method']}, "
+            f"{record['bytes'] / 1e6:.1f} MB in {record['seconds']:.3f}s, "
+            f"{record['throughput'] / 1e6:.1f} MB/s)"
+        )
+    return records
+
+
+def _reflink(source, target):
+    """Clone a file with the FICLONE ioctl and return True if supported."""
+    if fcntl is None:  # pragma: no cover
+        return False
+    with open(source, "rb") as f_src, open(target, "wb") as f_dst:
+        try:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(target)
+    return False
+
+
+def _hardlink(source, target):
+    """Hard-link a file and return True if possible (e.g. same filesystem)."""
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+        return True
+    except OSError as e:
+        if e.errno in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            return False
+        raise
+
+
+def _copy_chunk(record, offset, length):
+    """Copy a chunk of a file.
+
+    Return the record of the file and the start and end times of the copy.
+    """
+    start = time.perf_counter()
+    src_fd = os.open(record["source"], os.O_RDONLY)
+    try:
+        dst_fd = os.open(record["target"], os.O_WRONLY)
+        try:
+            copied = 0
+            while copied < length:
+                position = offset + copied
+                try:
+                    n = os.copy_file_range(
+                        src_fd, dst_fd, length - copied, position, position
+                    )
+                except (AttributeError, OSError):
+                    # Not supported by the platform or across these filesystems
+                    data = os.pread(src_fd, min(length - copied, 1024 * 1024), position)
+                    n = os.pwrite(dst_fd, data, position)
+                if n == 0:
+                    break
+                copied += n
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return record, start, time.perf_counter()
@@ -4,16 +4,27 @@
 """Methods supporting versioning of BIDS and Collaborative project datasets."""
 
 import os
+import re
 import json
+import time
+import threading
+from contextlib import contextmanager
 from sre_constants import SUCCESS
 
-import datalad
-from datalad.support.gitrepo import GitRepo
-
 from datahipy.bids.version import create_bids_changes_tag_entry, update_bids_changes
+from datahipy.utils.cache import run_git
+from datahipy.utils.saving import save_dataset
 
 TAG_EXCEPTIONS = ["master", "main", "HEAD"]
 
+# Regular expression matching a version tag in the format X.Y.Z
+VERSION_TAG_REGEX = re.compile(r"^([0-9]+)\.([0-9]+)\.([0-9]+)$")
+
+# Tags of the repositories read by the current process, indexed by git directory,
+# with the signature of the refs they were read from
+_TAGS_MEMO = {}
+_TAGS_MEMO_LOCK = threading.Lock()
+
 
 def set_git_user_info_global(name=None, email=None):
     """Set Git user name and email.
@@ -107,9 +118,7 @@ def create_tag(input_data):
             "Please use the format X.Y.Z, where X, Y, and Z are integers."
         )
     # Check if the tag already exists
-    if input_data["tag"] in [
-        tag_dict["name"] for tag_dict in GitRepo(input_data["path"]).get_tags()
-    ]:
+    if input_data["tag"] in list_tags(input_data["path"]):
         raise ValueError(
             f"Impossible to create tag {input_data['tag']}. "
             f"Tag {input_data['tag']} already exists."
@@ -135,12 +144,14 @@ def create_tag(input_data):
         "version_tag": input_data["tag"],
         "recursive": True,
     }
-    datalad.api.save(**save_params)
+    save_dataset(**save_params)
     print(SUCCESS)
 
 
 def get_tags(input_data, output_file):
-    """Get the list of tags of a dataset managed by Git/Datalad via subprocess.
+    """Get the list of tags of a dataset managed by Git/Datalad.
+
+    The tags are sorted with :py:func:`sort_tags`.
 
     Parameters
     ----------
@@ -164,7 +175,7 @@ def get_tags(input_data, output_file):
     # Load input data
     with open(input_data, "r") as f:
         input_data = json.load(f)
-    tags = [tag_dict["name"] for tag_dict in GitRepo(input_data["path"]).get_tags()]
+    tags = sort_tags(list_tags(input_data["path"]))
     # Save the tags to a JSON file
     dict_tags = {
         "path": input_data["path"],
@@ -192,6 +203,9 @@ def checkout_tag(input_data):
                 "tag": "1.0.0",
             }
     """
+    # Import here to not slow down the startup of the CLI
+    from datalad.support.gitrepo import GitRepo
+
     # Load input data
     with open(input_data, "r") as f:
         input_data = json.load(f)
@@ -221,6 +235,8 @@ def checkout_tag(input_data):
 def get_latest_tag(path):
     """Get the latest tag of a dataset managed by Git/Datalad.
 
+    Tags that are not in the format X.Y.Z are ignored.
+
     Parameters
     ----------
     path : str
@@ -229,13 +245,150 @@ def get_latest_tag(path):
     Returns
     -------
     str
-        The latest tag of the dataset.
+        The latest tag of the dataset ("0.0.0" if there is none).
     """
-    tags = [tag_dict["name"] for tag_dict in GitRepo(path).get_tags()]
-    tags.sort(key=lambda s: list(map(int, s.split("."))), reverse=True)
+    tags = [tag for tag in list_tags(path) if VERSION_TAG_REGEX.match(tag)]
     if len(tags) == 0:
         return "0.0.0"
-    return tags[0]
+    return sort_tags(tags)[-1]
+
+
+def sort_tags(tags):
+    """Sort version tags (X.Y.Z) by increasing version, followed by the other tags by name.
+
+    Parameters
+    ----------
+    tags : list of str
+        List of tags.
+
+    Returns
+    -------
+    list of str
+        Sorted list of tags.
+    """
+
+    def sort_key(tag):
+        match = VERSION_TAG_REGEX.match(tag)
+        if match:
+            return (0, tuple(int(n) for n in match.groups()), tag)
+        return (1, (), tag)
+
+    return sorted(tags, key=sort_key)
+
+
+def list_tags(path):
+    """Return the tags of a dataset managed by Git/Datalad.
+
+    The tags are read directly from the `packed-refs` file and the `refs/tags/`
+    directory of the repository, falling back to `git tag` if they cannot be read.
+    They are kept in memory until the refs of the repository are modified.
+
+    Parameters
+    ----------
+    path : str
+        Path to the dataset.
+
+    Returns
+    -------
+    list of str
+        Unsorted list of tags.
+    """
+    git_dir = get_git_dir(path)
+    if git_dir is None:
+        return _list_tags_with_git(path)
+    signature = _get_refs_signature(git_dir)
+    with _TAGS_MEMO_LOCK:
+        if git_dir in _TAGS_MEMO and _TAGS_MEMO[git_dir][0] == signature:
+            return list(_TAGS_MEMO[git_dir][1])
+    try:
+        tags = _read_tags_from_refs(git_dir)
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"WARNING: Could not read the tags from {git_dir}: {e}")
+        return _list_tags_with_git(path)
+    with _TAGS_MEMO_LOCK:
+        _TAGS_MEMO[git_dir] = (signature, tags)
+    return list(tags)
+
+
+def get_git_dir(path):
+    """Return the directory storing the refs of the git repository of a dataset, or None.
+
+    Repositories whose `.git` is a file pointing to another directory (e.g. submodules)
+    and linked worktrees (whose refs are in a common directory) are supported.
+
+    Parameters
+    ----------
+    path : str
+        Path to the dataset.
+
+    Returns
+    -------
+    str or None
+        Path to the git directory, or None if it cannot be found.
+    """
+    git_dir = os.path.join(os.path.abspath(path), ".git")
+    if os.path.isfile(git_dir):
+        try:
+            with open(git_dir, "r") as f:
+                content = f.read().strip()
+        except OSError:
+            return None
+        if not content.startswith("gitdir:"):
+            return None
+        git_dir = os.path.join(os.path.abspath(path), content[len("gitdir:"):].strip())
+    if not os.path.isdir(git_dir):
+        return None
+    # Refs of a linked worktree are stored in the common directory
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        try:
+            with open(commondir_file, "r") as f:
+                git_dir = os.path.join(git_dir, f.read().strip())
+        except OSError:
+            return None
+    return os.path.normpath(git_dir)
+
+
+def _get_refs_signature(git_dir):
+    """Return the modification times and sizes of the files and directories storing the tags."""
+    signature = []
+    paths = [os.path.join(git_dir, "packed-refs")]
+    for root, dirs, _ in os.walk(os.path.join(git_dir, "refs", "tags")):
+        paths.append(root)
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        except OSError:
+            signature.append((path, None))
+    return tuple(signature)
+
+
+def _read_tags_from_refs(git_dir):
+    """Return the tags listed in the packed-refs file and the refs/tags directory."""
+    tags = set()
+    packed_refs = os.path.join(git_dir, "packed-refs")
+    if os.path.isfile(packed_refs):
+        with open(packed_refs, "r") as f:
+            for line in f:
+                # Skip comments and peeled tag lines ("^<sha>")
+                if line.startswith(("#", "^")):
+                    continue
+                parts = line.split()
+                if len(parts) == 2 and parts[1].startswith("refs/tags/"):
+                    tags.add(parts[1][len("refs/tags/"):])
+    tags_dir = os.path.join(git_dir, "refs", "tags")
+    for root, _, files in os.walk(tags_dir):
+        for filename in files:
+            tag = os.path.relpath(os.path.join(root, filename), tags_dir)
+            tags.add(tag.replace(os.sep, "/"))
+    return sorted(tags)
+
+
+def _list_tags_with_git(path):
+    """Return the tags of a repository listed by `git tag`."""
+    output = run_git(path, "tag", "--list")
+    return output.split() if output else []
 
 
 def increment_tag(tag, level):
@@ -298,38 +451,57 @@ def release_version(input_data, output_file):
         generated by :py:func:`datahipy.bids.dataset.get_bidsdataset_content`.
     """
     # Import here to avoid circular imports
-    from datahipy.bids.dataset import get_bidsdataset_content
+    from datahipy.bids.dataset import get_bidsdataset_state, get_updated_bidsdataset_content
     # Load input data
     with open(input_data, "r") as f:
         input_data = json.load(f)
     print(f"Release version for dataset {input_data['path']}...")
-    # Get the latest tag of the dataset
-    latest_tag = get_latest_tag(input_data["path"])
-    # Increment the latest tag by the specified level
-    new_tag = increment_tag(latest_tag, input_data["level"])
-    # Create a tag on the dataset
-    create_tag(
-        input_data={
-            "path": input_data["path"],
-            "type": input_data["type"],
-            "tag": new_tag,
-            "changes_list": input_data["changes_list"],
-        }
-    )
     # Get the BIDS directory of the dataset if it is
-    # a project dataset or a BIDS dataset itself 
-    bids_dir  = (
+    # a project dataset or a BIDS dataset itself
+    bids_dir = (
         input_data["path"]
         if input_data["type"] == "bids"
-        else os.path.join(
-            input_data["path"], "inputs", "bids-dataset"
-        )
+        else os.path.join(input_data["path"], "inputs", "bids-dataset")
     )
+    timings = {}
+    # Record the state of the dataset before the release
+    # to reuse its summary if only CHANGES is modified
+    with _timed_stage(timings, "state"):
+        state = get_bidsdataset_state(bids_dir)
+        # Get the latest tag of the dataset
+        latest_tag = get_latest_tag(input_data["path"])
+        # Increment the latest tag by the specified level
+        new_tag = increment_tag(latest_tag, input_data["level"])
+    # Create a tag on the dataset
+    with _timed_stage(timings, "tag"):
+        create_tag(
+            input_data={
+                "path": input_data["path"],
+                "type": input_data["type"],
+                "tag": new_tag,
+                "changes_list": input_data["changes_list"],
+            }
+        )
     # Generate the dataset summary dictionary
-    dataset_summary = get_bidsdataset_content(
-        bids_dir=bids_dir
-    )
+    with _timed_stage(timings, "summary"):
+        dataset_summary = get_updated_bidsdataset_content(bids_dir, state)
     # Save the dataset summary to a JSON file
-    with open(output_file, "w") as f:
-        json.dump(dataset_summary, f, indent=4)
+    with _timed_stage(timings, "output"):
+        with open(output_file, "w") as f:
+            json.dump(dataset_summary, f, indent=4)
+    print(
+        "Release timings: "
+        + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    )
     print(SUCCESS)
+
+
+@contextmanager
+def _timed_stage(timings, stage):
+    """Context manager recording the duration in seconds of a stage in the `timings` dictionary."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+        print(f"> Stage {stage} done in {timings[stage]:.2f}s")
@@ -0,0 +1,104 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Test the reuse of the PyBIDS layout databases persisted in the datahipy cache."""
+
+from __future__ import absolute_import
+import os
+import json
+from collections import OrderedDict
+import pytest
+
+from datahipy.bids import dataset
+from datahipy.bids.dataset import LAYOUT_CACHE_NAMESPACE, create_bids_layout
+from datahipy.utils.cache import get_cache_dir
+
+
+def write_dataset(bids_dir, subjects):
+    """Write a minimal BIDS dataset with a T1w image per subject."""
+    os.makedirs(bids_dir, exist_ok=True)
+    with open(os.path.join(bids_dir, "dataset_description.json"), "w") as f:
+        json.dump({"Name": "Layout cache", "BIDSVersion": "1.8.0"}, f)
+    for subject in subjects:
+        write_subject_file(bids_dir, subject, "T1w")
+
+
+def write_subject_file(bids_dir, subject, suffix):
+    """Write an anatomical image of a subject."""
+    anat_dir = os.path.join(bids_dir, f"sub-{subject}", "anat")
+    os.makedirs(anat_dir, exist_ok=True)
+    with open(os.path.join(anat_dir, f"sub-{subject}_{suffix}.nii.gz"), "w") as f:
+        f.write(f"{subject} {suffix}")
+
+
+def create_layout_from_cache(bids_dir, capsys, **kwargs):
+    """Create a layout without reusing the layouts of the process.
+
+    Returns the layout and True if the dataset was (re-)indexed.
+    """
+    dataset._LAYOUTS.clear()
+    capsys.readouterr()
+    layout = create_bids_layout(bids_dir, **kwargs)
+    return layout, "> Index dataset" in capsys.readouterr().out
+
+
+@pytest.fixture
+def empty_layouts(monkeypatch, cache_path):
+    # Isolate the layouts of the process from the other tests
+    monkeypatch.setattr(dataset, "_LAYOUTS", OrderedDict())
+
+
+@pytest.mark.order(after="test_run_help.py::test_run_help")
+def test_create_bids_layout_cached(tmp_path, capsys, empty_layouts):
+    bids_dir = str(tmp_path / "LAYOUT_CACHE_DS")
+    write_dataset(bids_dir, ["01", "02"])
+    # Index the dataset in a new database
+    layout, indexed = create_layout_from_cache(bids_dir, capsys)
+    assert indexed
+    assert layout.get_subjects() == ["01", "02"]
+    # Check that the layout is reused by the process
+    assert create_bids_layout(bids_dir) is layout
+    # Check that the database is reused while the dataset is unchanged
+    layout, indexed = create_layout_from_cache(bids_dir, capsys)
+    assert not indexed
+    assert layout.get_subjects() == ["01", "02"]
+    # Check that the database is refreshed after a subject is modified
+    write_subject_file(bids_dir, "02", "T2w")
+    layout, indexed = create_layout_from_cache(bids_dir, capsys)
+    assert indexed
+    assert len(layout.get(subject="02", suffix="T2w")) == 1
+
+
+@pytest.mark.order(after="test_create_bids_layout_cached")
+def test_create_bids_layout_subjects(tmp_path, capsys, empty_layouts):
+    bids_dir = str(tmp_path / "LAYOUT_CACHE_DS")
+    write_dataset(bids_dir, ["01", "02"])
+    # Index only one subject in the database of its scope
+    layout, indexed = create_layout_from_cache(bids_dir, capsys, subjects=["sub-01"])
+    assert indexed
+    assert layout.get_subjects() == ["01"]
+    layout, indexed = create_layout_from_cache(bids_dir, capsys)
+    assert indexed
+    assert layout.get_subjects() == ["01", "02"]
+    # Check that a change of another subject does not refresh the database of the scope
+    write_subject_file(bids_dir, "02", "T2w")
+    layout, indexed = create_layout_from_cache(bids_dir, capsys, subjects=["01"])
+    assert not indexed
+    assert layout.get_subjects() == ["01"]
+    # Check that a change of the subject refreshes it
+    write_subject_file(bids_dir, "01", "T2w")
+    layout, indexed = create_layout_from_cache(bids_dir, capsys, subjects=["01"])
+    assert indexed
+    assert len(layout.get(subject="01", suffix="T2w")) == 1
+
+
+@pytest.mark.order(after="test_create_bids_layout_subjects")
+def test_create_bids_layout_no_cache(tmp_path, capsys, empty_layouts):
+    bids_dir = str(tmp_path / "LAYOUT_NO_CACHE_DS")
+    write_dataset(bids_dir, ["01"])
+    databases = sorted(os.listdir(get_cache_dir(LAYOUT_CACHE_NAMESPACE)))
+    layout = create_bids_layout(bids_dir, use_cache=False)
+    assert layout.get_subjects() == ["01"]
+    # Check that no database was written and that the layout is not reused
+    assert sorted(os.listdir(get_cache_dir(LAYOUT_CACHE_NAMESPACE))) == databases
+    assert create_bids_layout(bids_dir, use_cache=False) is not layout
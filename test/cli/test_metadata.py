@@ -0,0 +1,59 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Test that the resolution of JSON sidecars of datahipy matches the one of PyBIDS."""
+
+from __future__ import absolute_import
+import os
+import json
+import shutil
+import pytest
+
+from datahipy.bids.dataset import create_bids_layout
+from datahipy.bids.metadata import SidecarResolver
+
+# Suffixes for which top-level sidecars inherited by all the files are created
+INHERITED_SUFFIXES = ["eeg", "ieeg"]
+
+
+def add_inherited_sidecars(bids_dir, layout):
+    """Add top-level JSON sidecars for each task of the EEG/iEEG recordings of a dataset.
+
+    Each sidecar defines a key only found at the top level, and a key overridden
+    by the sidecars of the recordings if they define it.
+    """
+    sidecars = []
+    for suffix in INHERITED_SUFFIXES:
+        for task in layout.get_tasks(suffix=suffix):
+            sidecar_path = os.path.join(bids_dir, f"task-{task}_{suffix}.json")
+            with open(sidecar_path, "w") as f:
+                json.dump({"InheritedKey": suffix, "PowerLineFrequency": -1}, f)
+            sidecars.append(sidecar_path)
+    return sidecars
+
+
+@pytest.mark.order(after="test_run_sub.py::test_run_sub_get")
+def test_sidecar_resolver_matches_pybids(dataset_path, tmp_path):
+    # Work on a copy of the dataset so that it is not modified
+    bids_dir = str(tmp_path / "SIDECARS_DS")
+    shutil.copytree(
+        dataset_path, bids_dir, symlinks=True, ignore=shutil.ignore_patterns(".git", ".datalad")
+    )
+    layout = create_bids_layout(bids_dir, use_cache=False)
+    sidecars = add_inherited_sidecars(bids_dir, layout)
+    # Check that the dataset has recordings inheriting the top-level sidecars
+    assert sidecars
+    layout = create_bids_layout(bids_dir, use_cache=False)
+    resolver = SidecarResolver(bids_dir)
+    data_files = [
+        bids_file.path
+        for bids_file in layout.get(subject=layout.get_subjects())
+        if not bids_file.path.endswith(".json")
+    ]
+    assert data_files
+    inherited = 0
+    for path in data_files:
+        metadata = resolver.get_metadata(path)
+        assert metadata == layout.get_metadata(path), path
+        inherited += "InheritedKey" in metadata
+    assert inherited
@@ -0,0 +1,75 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Test the datahipy CLI "batch" command."""
+
+from __future__ import absolute_import
+import os
+import json
+import subprocess
+import pytest
+
+
+def get_commit_count(path):
+    """Return the number of commits of a git repository."""
+    return int(
+        subprocess.run(
+            ["git", "-C", path, "rev-list", "--count", "HEAD"],
+            capture_output=True,
+            check=True,
+        ).stdout.decode()
+    )
+
+
+@pytest.mark.script_launch_mode("subprocess")
+@pytest.mark.order(after="test_run_sub.py::test_run_sub_edit_clinical")
+def test_run_batch(script_runner, dataset_path, io_path):
+    # Create input data with several operations
+    input_data = [
+        {
+            "command": "sub.edit.clinical",
+            "input_data": {"subject": "carole", "clinical": {"age": "31"}},
+        },
+        {
+            "command": "sub.edit.clinical",
+            "input_data": {"subject": "carole", "clinical": {"hospital": "CHUV"}},
+        },
+        {
+            "command": "dataset.get",
+            "input_data": {},
+        },
+        {
+            "command": "sub.unknown",
+            "input_data": {},
+        },
+    ]
+    # Create JSON file path for input data
+    input_file = os.path.join(io_path, "batch.json")
+    # Write input data to file
+    with open(input_file, "w") as f:
+        json.dump(input_data, f, indent=4)
+    # Output file path
+    output_file = os.path.join(io_path, "batch_output.json")
+    commit_count = get_commit_count(dataset_path)
+    # Run datahipy batch command
+    ret = script_runner.run(
+        "datahipy",
+        "--command",
+        "batch",
+        "--input_data",
+        input_file,
+        "--output_file",
+        output_file,
+        "--dataset_path",
+        dataset_path,
+    )
+    # Check that the command ran successfully
+    assert ret.success
+    # Check the result of each operation
+    with open(output_file, "r") as f:
+        output_data = json.load(f)
+    assert [result["success"] for result in output_data] == [True, True, True, False]
+    assert output_data[2]["output"]["Name"] == "My New BIDS dataset"
+    assert output_data[3]["error"]["type"] == "ValueError"
+    # Check that the saves of the operations were made in a single commit
+    assert get_commit_count(dataset_path) == commit_count + 1
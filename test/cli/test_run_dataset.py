@@ -169,10 +169,52 @@ def test_run_dataset_get(script_runner, dataset_path, io_path):
     assert ret.success
     # Check that the output file was created
     assert os.path.exists(output_file)
+    # Check that the dataset size is reported in bytes
+    with open(output_file, "r") as f:
+        output_data = json.load(f)
+    assert output_data["SizeInfo"]["TotalBytes"] > 0
+    assert output_data["SizeInfo"]["TotalBytes"] == (
+        output_data["SizeInfo"]["RawBytes"]
+        + output_data["SizeInfo"]["SourcedataBytes"]
+        + output_data["SizeInfo"]["DerivativesBytes"]
+    )
 
 
 @pytest.mark.script_launch_mode("subprocess")
 @pytest.mark.order(after="test_run_dataset_get")
+def test_run_dataset_get_cached(script_runner, dataset_path, io_path, cache_path):
+    # Input data created by test_run_dataset_get
+    input_file = os.path.join(io_path, "get_dataset.json")
+    # Load the output of test_run_dataset_get to compare with
+    with open(os.path.join(io_path, "get_dataset_output.json"), "r") as f:
+        expected_output_data = json.load(f)
+    # Check that the summary computed by test_run_dataset_get was cached
+    assert os.listdir(os.path.join(cache_path, "summaries"))
+    # Run datahipy dataset.get command with and without the cache
+    for extra_args in [[], ["--no-cache"]]:
+        output_file = os.path.join(io_path, "get_dataset_cached_output.json")
+        ret = script_runner.run(
+            "datahipy",
+            "--command",
+            "dataset.get",
+            "--input_data",
+            input_file,
+            "--output_file",
+            output_file,
+            "--dataset_path",
+            dataset_path,
+            *extra_args,
+        )
+        # Check that the command ran successfully
+        assert ret.success
+        # Check that the summary is the same as the one computed without cache
+        with open(output_file, "r") as f:
+            output_data = json.load(f)
+        assert output_data == expected_output_data
+
+
+@pytest.mark.script_launch_mode("subprocess")
+@pytest.mark.order(after="test_run_dataset_get_cached")
 def test_run_datasets_get(script_runner, dataset_path, io_path):
     # Create input data
     input_data = {
@@ -201,6 +243,78 @@ def test_run_datasets_get(script_runner, dataset_path, io_path):
 
 @pytest.mark.script_launch_mode("subprocess")
 @pytest.mark.order(after="test_run_datasets_get")
+def test_run_datasets_get_ndjson(script_runner, dataset_path, io_path):
+    # Create JSON file path for input data created by test_run_datasets_get
+    input_file = os.path.join(io_path, "get_datasets.json")
+    # Output file path
+    output_file = os.path.join(io_path, "get_datasets_output.ndjson")
+    # Run datahipy datasets.get command with streamed output
+    ret = script_runner.run(
+        "datahipy",
+        "--command",
+        "datasets.get",
+        "--input_data",
+        input_file,
+        "--output_file",
+        output_file,
+        "--output_format",
+        "ndjson",
+    )
+    # Check that the command ran successfully
+    assert ret.success
+    # Check that there is one record per dataset
+    with open(output_file, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 2
+    for record in records:
+        assert record["path"] == dataset_path
+        assert "BIDSValid" in record["summary"]
+
+
+@pytest.mark.script_launch_mode("subprocess")
+@pytest.mark.order(after="test_run_datasets_get_ndjson")
+def test_run_datasets_get_with_error(script_runner, dataset_path, io_path):
+    # Create input data with a dataset that does not exist
+    missing_dataset_path = os.path.join(os.path.dirname(dataset_path), "MISSING_DS")
+    input_data = {
+        "owner": "hipadmin",
+        "datasets": [{"path": missing_dataset_path}, {"path": dataset_path}],
+    }
+    # Create JSON file path for input data
+    input_file = os.path.join(io_path, "get_datasets_with_error.json")
+    # Write input data to file
+    with open(input_file, "w") as f:
+        json.dump(input_data, f, indent=4)
+    # Output file path
+    output_file = os.path.join(io_path, "get_datasets_with_error_output.json")
+    # Run datahipy datasets.get command
+    ret = script_runner.run(
+        "datahipy",
+        "--command",
+        "datasets.get",
+        "--input_data",
+        input_file,
+        "--output_file",
+        output_file,
+        "--num_workers",
+        "2",
+        "--timeout",
+        "600",
+        "--retries",
+        "1",
+    )
+    # Check that the command ran successfully despite the missing dataset
+    assert ret.success
+    # Check that the missing dataset is reported by an error record
+    with open(output_file, "r") as f:
+        output_data = json.load(f)
+    assert output_data[0]["path"] == missing_dataset_path
+    assert output_data[0]["error"]["attempts"] == 2
+    assert "BIDSValid" in output_data[1]
+
+
+@pytest.mark.script_launch_mode("subprocess")
+@pytest.mark.order(after="test_run_datasets_get_with_error")
 def test_run_dataset_publish(script_runner, dataset_path, public_dataset_path, io_path):
     # Create input data
     input_data = {
@@ -257,7 +371,7 @@ def test_run_dataset_clone(script_runner, public_dataset_path, cloned_dataset_pa
 
 
 @pytest.mark.script_launch_mode("subprocess")
-@pytest.mark.order(after="test_run_sub.py::test_run_sub_delete")
+@pytest.mark.order(after="test_run_sub.py::test_run_sub_delete_multiple")
 def test_run_dataset_release_version(script_runner, dataset_path, io_path):
     # Create input data
     input_data = {
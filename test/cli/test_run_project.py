@@ -199,6 +199,21 @@ def test_run_project_create_tag(script_runner, project_path, io_path):
     assert "1.0.0" in [
         tag_dict["name"] for tag_dict in tag_dicts
     ]
+    # Check that the nested BIDS dataset, modified by the update of its CHANGES
+    # file, was committed and tagged as well as the project
+    bids_path = os.path.join(project_path, "inputs", "bids-dataset")
+    for path in [project_path, bids_path]:
+        repo = GitRepo(path)
+        assert not repo.call_git(["status", "--porcelain"]).strip()
+        assert repo.call_git(["rev-parse", "1.0.0^{commit}"]) == repo.call_git(
+            ["rev-parse", "HEAD"]
+        )
+    assert "CHANGES" in GitRepo(bids_path).call_git(
+        ["show", "--name-only", "--format=", "HEAD"]
+    )
+    assert "inputs/bids-dataset" in GitRepo(project_path).call_git(
+        ["show", "--name-only", "--format=", "HEAD"]
+    )
 
 
 @pytest.mark.script_launch_mode("subprocess")
@@ -0,0 +1,95 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Test the datahipy CLI "serve" mode and the forwarding of commands to it."""
+
+from __future__ import absolute_import
+import os
+import time
+import json
+import subprocess
+import pytest
+
+
+@pytest.fixture
+def server_socket(io_path):
+    socket_path = os.path.join(io_path, "datahipy.sock")
+    log_path = os.path.join(io_path, "datahipy_server.log")
+    # Start a datahipy server listening on a Unix socket
+    with open(log_path, "w") as log:
+        server = subprocess.Popen(
+            ["datahipy", "serve", "--socket", socket_path],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=dict(os.environ, PYTHONUNBUFFERED="1"),
+        )
+    # Wait for the server to be ready
+    for _ in range(300):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.1)
+    assert server.poll() is None and os.path.exists(socket_path)
+    yield socket_path, log_path
+    # Check that the server removes its socket when terminated
+    server.terminate()
+    server.wait(timeout=30)
+    assert not os.path.exists(socket_path)
+
+
+@pytest.mark.script_launch_mode("subprocess")
+@pytest.mark.order(after="test_run_dataset.py::test_run_dataset_get_tags")
+def test_run_server_dataset_get_tags(script_runner, server_socket, dataset_path, io_path):
+    socket_path, log_path = server_socket
+    # Create input data
+    input_data = {
+        "path": dataset_path,
+    }
+    # Create JSON file path for input data
+    input_file = os.path.join(io_path, "server_dataset_get_tags.json")
+    # Write input data to file
+    with open(input_file, "w") as f:
+        json.dump(input_data, f, indent=4)
+    # Output file path
+    output_file = os.path.join(io_path, "server_dataset_get_tags_output.json")
+    # Run datahipy dataset.get_tags command forwarded to the server
+    ret = script_runner.run(
+        "datahipy",
+        "--server",
+        f"unix://{socket_path}",
+        "--no-fallback",
+        "--command",
+        "dataset.get_tags",
+        "--input_data",
+        input_file,
+        "--output_file",
+        output_file,
+    )
+    # Check that the command ran successfully
+    assert ret.success
+    # Check that the output file was created by the server
+    with open(output_file, "r") as f:
+        output_data = json.load(f)
+    assert "1.0.0" in output_data["tags"]
+    with open(log_path, "r") as f:
+        assert "> Command dataset.get_tags completed" in f.read()
+
+
+@pytest.mark.script_launch_mode("subprocess")
+@pytest.mark.order(after="test_run_server_dataset_get_tags")
+def test_run_server_unavailable(script_runner, io_path):
+    # Check that the command fails without running locally if the server is not available
+    output_file = os.path.join(io_path, "server_unavailable_output.json")
+    ret = script_runner.run(
+        "datahipy",
+        "--server",
+        f"unix://{os.path.join(io_path, 'missing.sock')}",
+        "--no-fallback",
+        "--command",
+        "dataset.get_tags",
+        "--input_data",
+        os.path.join(io_path, "server_dataset_get_tags.json"),
+        "--output_file",
+        output_file,
+    )
+    assert not ret.success
+    assert not os.path.exists(output_file)
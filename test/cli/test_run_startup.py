@@ -0,0 +1,106 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Test that the light datahipy CLI commands start fast."""
+
+from __future__ import absolute_import
+import os
+import sys
+import json
+import time
+import subprocess
+import pytest
+
+# Modules that the light commands must not import
+HEAVY_MODULES = ["bids", "bids_manager", "pandas"]
+
+# Maximal time in seconds to import the CLI entry point
+MAX_CLI_IMPORT_TIME = 1.0
+
+# Script running the CLI and writing the list of imported modules to a file
+RUN_CLI_SCRIPT = """
+import sys, json, atexit
+modules_file = sys.argv.pop(1)
+atexit.register(lambda: json.dump(sorted(sys.modules), open(modules_file, "w")))
+from datahipy.cli.run import main
+main()
+"""
+
+
+def run_cli_and_get_modules(io_path, *args):
+    """Run the datahipy CLI in a new process and return its imported top-level packages."""
+    modules_file = os.path.join(io_path, "startup_imported_modules.json")
+    ret = subprocess.run(
+        [sys.executable, "-c", RUN_CLI_SCRIPT, modules_file] + list(args),
+        capture_output=True,
+    )
+    assert ret.returncode == 0, ret.stderr.decode()
+    with open(modules_file, "r") as f:
+        return {module.split(".")[0] for module in json.load(f)}
+
+
+@pytest.mark.order(after="test_run_help.py::test_run_help")
+def test_run_startup_import_time():
+    # Measure the time to import the CLI entry point in a new process
+    ret = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import time; start = time.perf_counter(); import datahipy.cli.run; "
+            "print(time.perf_counter() - start)",
+        ],
+        capture_output=True,
+        check=True,
+    )
+    assert float(ret.stdout.decode().strip()) < MAX_CLI_IMPORT_TIME
+
+
+@pytest.mark.order(after="test_run_dataset.py::test_run_dataset_get_tags")
+def test_run_startup_dataset_get_tags(io_path):
+    # Input data created by test_run_dataset_get_tags
+    input_file = os.path.join(io_path, "dataset_get_tags.json")
+    output_file = os.path.join(io_path, "startup_dataset_get_tags_output.json")
+    start = time.perf_counter()
+    modules = run_cli_and_get_modules(
+        io_path,
+        "--command",
+        "dataset.get_tags",
+        "--input_data",
+        input_file,
+        "--output_file",
+        output_file,
+    )
+    print(f"dataset.get_tags ran in {time.perf_counter() - start:.2f}s")
+    assert not modules.intersection(HEAVY_MODULES)
+
+
+@pytest.mark.order(after="test_run_dataset.py::test_run_dataset_checkout_tag")
+def test_run_startup_dataset_checkout_tag(dataset_path, io_path):
+    # Create input data to checkout the current HEAD
+    input_data = {
+        "path": dataset_path,
+        "tag": "HEAD",
+    }
+    # Create JSON file path for input data
+    input_file = os.path.join(io_path, "startup_dataset_checkout_tag.json")
+    # Write input data to file
+    with open(input_file, "w") as f:
+        json.dump(input_data, f, indent=4)
+    start = time.perf_counter()
+    modules = run_cli_and_get_modules(
+        io_path, "--command", "dataset.checkout_tag", "--input_data", input_file
+    )
+    print(f"dataset.checkout_tag ran in {time.perf_counter() - start:.2f}s")
+    assert not modules.intersection(HEAVY_MODULES)
+
+
+@pytest.mark.order(after="test_run_project.py::test_run_project_doc_import")
+def test_run_startup_project_doc_import(io_path):
+    # Input data created by test_run_project_doc_import
+    input_file = os.path.join(io_path, "import_project_doc.json")
+    start = time.perf_counter()
+    modules = run_cli_and_get_modules(
+        io_path, "--command", "project.doc.import", "--input_data", input_file
+    )
+    print(f"project.doc.import ran in {time.perf_counter() - start:.2f}s")
+    assert not modules.intersection(HEAVY_MODULES)
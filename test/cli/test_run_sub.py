@@ -7,10 +7,31 @@ from __future__ import absolute_import
 import os
 import pytest
 import json
+import subprocess
 import datalad
 from datalad.support.gitrepo import GitRepo
 
 
+def get_git_status(dataset_path):
+    """Return the output of `git status --porcelain` in a dataset."""
+    return subprocess.run(
+        ["git", "-C", dataset_path, "status", "--porcelain"],
+        capture_output=True,
+        check=True,
+    ).stdout.decode()
+
+
+def get_num_commits(dataset_path):
+    """Return the number of commits of the current branch of a dataset."""
+    return int(
+        subprocess.run(
+            ["git", "-C", dataset_path, "rev-list", "--count", "HEAD"],
+            capture_output=True,
+            check=True,
+        ).stdout.decode()
+    )
+
+
 @pytest.mark.script_launch_mode("subprocess")
 @pytest.mark.order(after="test_run_dataset.py::test_run_dataset_create_init_tag")
 def test_run_sub_import(script_runner, input_path, dataset_path, io_path):
@@ -105,6 +126,8 @@ def test_run_sub_import(script_runner, input_path, dataset_path, io_path):
     assert ret.success
     # Check that the sub-carole folder was created
     assert os.path.exists(os.path.join(dataset_path, "sub-carole"))
+    # Check that all the files written by the import were saved
+    assert get_git_status(dataset_path) == ""
 
 
 @pytest.mark.script_launch_mode("subprocess")
@@ -135,6 +158,51 @@ def test_run_sub_get(script_runner, dataset_path, io_path):
     assert ret.success
     # Check that the output file was created
     assert os.path.exists(output_file)
+    # Check that the channels are listed as records and not as embedded JSON strings
+    with open(output_file, "r") as f:
+        output_data = json.load(f)
+    channels = [
+        file_info["IeegChannelsTSV"]
+        for file_info in output_data
+        if "IeegChannelsTSV" in file_info
+    ]
+    assert channels
+    assert all(isinstance(channel, dict) for records in channels for channel in records)
+
+
+@pytest.mark.script_launch_mode("subprocess")
+@pytest.mark.order(after="test_run_sub_get")
+def test_run_sub_get_all(script_runner, dataset_path, io_path):
+    # Create input data
+    input_data = {"owner": "hipadmin", "path": dataset_path, "sub": "all"}
+    # Create JSON file path for input data
+    input_file = os.path.join(io_path, "get_subs.json")
+    # Write input data to file
+    with open(input_file, "w") as f:
+        json.dump(input_data, f, indent=4)
+    # Output file path
+    output_file = os.path.join(io_path, "get_subs_output.json")
+    # Run datahipy sub.get command
+    ret = script_runner.run(
+        "datahipy",
+        "--command",
+        "sub.get",
+        "--input_data",
+        input_file,
+        "--output_file",
+        output_file,
+        "--dataset_path",
+        dataset_path,
+    )
+    # Check that the command ran successfully
+    assert ret.success
+    # Check that the output maps each subject to the same files as for a single subject
+    with open(output_file, "r") as f:
+        output_data = json.load(f)
+    with open(os.path.join(io_path, "get_sub_output.json"), "r") as f:
+        carole_data = json.load(f)
+    assert list(output_data.keys()) == ["carole"]
+    assert output_data["carole"] == carole_data
 
 
 @pytest.mark.script_launch_mode("subprocess")
@@ -157,6 +225,11 @@ def test_run_sub_edit_clinical(script_runner, dataset_path, io_path):
         json.dump(input_data, f, indent=4)
     # Output updated participants.tsv file
     output_file = os.path.join(dataset_path, "participants.tsv")
+    # Create a file unrelated to the command, e.g. being edited by another client
+    unrelated_file = os.path.join(dataset_path, "code", "unrelated_edit.txt")
+    os.makedirs(os.path.dirname(unrelated_file), exist_ok=True)
+    with open(unrelated_file, "w") as f:
+        f.write("In-progress edit")
     # Run datahipy sub.edit.clinical command
     ret = script_runner.run(
         "datahipy",
@@ -171,6 +244,9 @@ def test_run_sub_edit_clinical(script_runner, dataset_path, io_path):
     )
     # Check that the command ran successfully
     assert ret.success
+    # Check that only the unrelated file was left out of the commit
+    assert get_git_status(dataset_path) == "?? code/unrelated_edit.txt\n"
+    os.remove(unrelated_file)
 
 
 @pytest.mark.script_launch_mode("subprocess")
@@ -271,3 +347,88 @@ def test_run_sub_delete(script_runner, dataset_path, io_path):
     assert ret.success
     # Check that the sub-carole folder was deleted
     assert not os.path.exists(os.path.join(dataset_path, "sub-carole"))
+    # Check that all the files written by the deletion were saved
+    assert get_git_status(dataset_path) == ""
+
+
+@pytest.mark.script_launch_mode("subprocess")
+@pytest.mark.order(after="test_run_sub_delete")
+def test_run_sub_delete_multiple(script_runner, input_path, dataset_path, io_path):
+    from datahipy.bids.tsv import iter_tsv_rows
+
+    subjects = ["alice", "bob"]
+    # Import one file for each subject to delete
+    input_data = {
+        "subjects": [
+            {"sub": sub, "age": "30", "sex": "F", "hospital": "CHUV"} for sub in subjects
+        ],
+        "files": [
+            {
+                "modality": "T1w",
+                "subject": sub,
+                "path": f"{input_path}/sub-carole/3DT1pre_deface.nii",
+                "entities": {"sub": sub, "ses": "preimp", "acq": "lowres"},
+            }
+            for sub in subjects
+        ],
+    }
+    input_file = os.path.join(io_path, "import_sub_multiple.json")
+    with open(input_file, "w") as f:
+        json.dump(input_data, f, indent=4)
+    ret = script_runner.run(
+        "datahipy",
+        "--command",
+        "sub.import",
+        "--input_data",
+        input_file,
+        "--dataset_path",
+        dataset_path,
+        "--input_path",
+        input_path,
+    )
+    assert ret.success
+    for sub in subjects:
+        assert os.path.exists(os.path.join(dataset_path, f"sub-{sub}"))
+    # Create input data (list of subjects)
+    input_data = {"subject": subjects}
+    # Create JSON file path for input data
+    input_file = os.path.join(io_path, "delete_sub_multiple.json")
+    # Write input data to file
+    with open(input_file, "w") as f:
+        json.dump(input_data, f, indent=4)
+    num_commits = get_num_commits(dataset_path)
+    # Run datahipy sub.delete command
+    ret = script_runner.run(
+        "datahipy",
+        "--command",
+        "sub.delete",
+        "--input_data",
+        input_file,
+        "--dataset_path",
+        dataset_path,
+    )
+    # Check that the command ran successfully
+    assert ret.success
+    participants = list(
+        iter_tsv_rows(os.path.join(dataset_path, "participants.tsv"), convert=False)
+    )
+    source_data_trace_tsv = os.path.join(dataset_path, "sourcedata", "source_data_trace.tsv")
+    trace_rows = (
+        list(iter_tsv_rows(source_data_trace_tsv, convert=False))
+        if os.path.exists(source_data_trace_tsv)
+        else []
+    )
+    for sub in subjects:
+        # Check that the subject folder was deleted
+        assert not os.path.exists(os.path.join(dataset_path, f"sub-{sub}"))
+        # Check that the subject was removed from participants.tsv
+        assert f"sub-{sub}" not in [row.get("participant_id") for row in participants]
+        # Check that the subject was removed from the source data trace
+        assert not [
+            row
+            for row in trace_rows
+            if any(value == sub or f"sub-{sub}" in value for value in row.values())
+        ]
+    # Check that the deletion was saved in a single commit
+    assert get_git_status(dataset_path) == ""
+    assert get_num_commits(dataset_path) == num_commits + 1
@@ -0,0 +1,132 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Benchmark the datahipy CLI "sub.import" command on a synthetic dataset with many subjects."""
+
+from __future__ import absolute_import
+import os
+import json
+import time
+import shutil
+import pytest
+
+# Number of synthetic subjects added to the dataset
+NUM_SYNTHETIC_SUBJECTS = 500
+
+
+def create_synthetic_dataset(dataset_path, synthetic_dataset_path, num_subjects):
+    """Copy a dataset with a subject "carole" and add synthetic subjects hard-linking its files."""
+    if os.path.exists(synthetic_dataset_path):
+        os.system(f"chmod -R a+w {synthetic_dataset_path}")
+        shutil.rmtree(synthetic_dataset_path)
+    # Copy the content of the annexed files but not the Datalad/Git metadata
+    shutil.copytree(
+        dataset_path,
+        synthetic_dataset_path,
+        ignore=shutil.ignore_patterns(".git*", ".datalad"),
+    )
+    sub_dir = os.path.join(synthetic_dataset_path, "sub-carole")
+    participants_tsv = os.path.join(synthetic_dataset_path, "participants.tsv")
+    with open(participants_tsv, "r") as f:
+        lines = f.read().splitlines()
+    carole_line = [line for line in lines if line.startswith("sub-carole\t")][0]
+    for idx in range(num_subjects):
+        sub = f"sub-synth{idx:03d}"
+        for root, _, files in os.walk(sub_dir):
+            new_root = root.replace(sub_dir, os.path.join(synthetic_dataset_path, sub), 1)
+            os.makedirs(new_root, exist_ok=True)
+            for filename in files:
+                os.link(
+                    os.path.join(root, filename),
+                    os.path.join(new_root, filename.replace("sub-carole", sub)),
+                )
+        lines.append(carole_line.replace("sub-carole", sub, 1))
+    with open(participants_tsv, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+@pytest.mark.script_launch_mode("inprocess")
+@pytest.mark.order(after="test_run_sub.py::test_run_sub_import")
+def test_run_sub_import_benchmark(script_runner, monkeypatch, dataset_path, input_path, io_path):
+    from bids_manager.ins_bids_class import BidsDataset
+    import datahipy.bids.bids_manager
+    from datahipy.bids.version import manage_bids_dataset_with_datalad
+
+    # Create the synthetic dataset managed by Datalad
+    synthetic_dataset_path = os.path.join(os.path.dirname(io_path), "SYNTHETIC_BIDS_DS")
+    create_synthetic_dataset(dataset_path, synthetic_dataset_path, NUM_SYNTHETIC_SUBJECTS)
+    manage_bids_dataset_with_datalad(synthetic_dataset_path)
+    # Count the full parses of the dataset by BIDS Manager and
+    # record the files walked by the post-import refinement
+    parse_count = {"value": 0}
+    refined_files = []
+    parse_bids = BidsDataset.parse_bids
+    iter_refinement_files = datahipy.bids.bids_manager.iter_refinement_files
+
+    def counting_parse_bids(self, *args, **kwargs):
+        parse_count["value"] += 1
+        return parse_bids(self, *args, **kwargs)
+
+    def recording_iter_refinement_files(bids_dir, subjects=None, sessions=None):
+        for filepath in iter_refinement_files(bids_dir, subjects=subjects, sessions=sessions):
+            refined_files.append(os.path.relpath(filepath, bids_dir))
+            yield filepath
+
+    monkeypatch.setattr(BidsDataset, "parse_bids", counting_parse_bids)
+    monkeypatch.setattr(
+        datahipy.bids.bids_manager,
+        "iter_refinement_files",
+        recording_iter_refinement_files,
+    )
+    # Create input data importing one file of a new subject with existing clinical keys
+    input_data = {
+        "subjects": [{"sub": "benchmark", "age": "42", "sex": "F", "hospital": "CHUV"}],
+        "files": [
+            {
+                "modality": "T1w",
+                "subject": "benchmark",
+                "path": f"{input_path}/sub-carole/3DT1pre_deface.nii",
+                "entities": {"sub": "benchmark", "ses": "preimp", "acq": "lowres"},
+            },
+        ],
+    }
+    input_file = os.path.join(io_path, "import_sub_benchmark.json")
+    with open(input_file, "w") as f:
+        json.dump(input_data, f, indent=4)
+    # Run datahipy sub.import command
+    start = time.perf_counter()
+    ret = script_runner.run(
+        "datahipy",
+        "--command",
+        "sub.import",
+        "--input_data",
+        input_file,
+        "--dataset_path",
+        synthetic_dataset_path,
+        "--input_path",
+        input_path,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"sub.import on {NUM_SYNTHETIC_SUBJECTS + 1} subjects ran in {elapsed:.2f}s "
+        f"with {parse_count['value']} BIDS Manager parse(s) and "
+        f"{len(refined_files)} file(s) walked by the refinement"
+    )
+    # Check that the command ran successfully
+    assert ret.success
+    assert os.path.exists(os.path.join(synthetic_dataset_path, "sub-benchmark"))
+    # Check that the dataset was parsed only once, when it was loaded,
+    # as no new clinical key had to be added to the requirements
+    assert parse_count["value"] <= 1
+    # Check that only the top-level files and the files of
+    # the imported subject and session were walked by the refinement
+    assert refined_files
+    assert all(
+        os.sep not in path
+        or (
+            path.startswith("sub-benchmark" + os.sep)
+            and "ses-" not in path.split(os.sep)[1]
+        )
+        or path.startswith(os.path.join("sub-benchmark", "ses-preimp") + os.sep)
+        for path in refined_files
+    )
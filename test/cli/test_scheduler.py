@@ -0,0 +1,90 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Test the fault-isolated worker pool used by the "datasets.get" command."""
+
+from __future__ import absolute_import
+import os
+import time
+import signal
+import pytest
+
+from datahipy.utils.cache import run_git
+from datahipy.utils.scheduler import run_tasks
+
+# Timeout of each task in seconds
+TASK_TIMEOUT = 1
+
+# Delay in seconds after the timeout before a worker is killed
+TASK_GRACE = 1
+
+
+def ignore_timeout_task(duration):
+    """Sleep for `duration` seconds, ignoring the timeout signal of the worker."""
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        try:
+            time.sleep(end - time.monotonic())
+        except BaseException:
+            pass
+    return duration
+
+
+def blocked_timeout_task(duration):
+    """Sleep for `duration` seconds with the timeout signal blocked, as in C code."""
+    signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGALRM])
+    time.sleep(duration)
+    return duration
+
+
+@pytest.mark.order(after="test_run_help.py::test_run_help")
+@pytest.mark.parametrize("hung_task", [ignore_timeout_task, blocked_timeout_task])
+def test_scheduler_kills_overdue_task(hung_task):
+    start = time.monotonic()
+    results = {
+        index: (result, error)
+        for index, result, error in run_tasks(
+            hung_task,
+            [(60,), (0,)],
+            max_workers=2,
+            timeout=TASK_TIMEOUT,
+            grace=TASK_GRACE,
+        )
+    }
+    # Check that the batch did not wait for the hung task to complete
+    assert time.monotonic() - start < 30
+    # Check that the hung task is reported by an error record
+    assert results[0][0] is None
+    assert results[0][1]["type"] == "TaskTimeoutError"
+    assert results[0][1]["message"] == "Task overran its deadline"
+    assert results[0][1]["attempts"] == 1
+    # Check that the other task completed
+    assert results[1] == (0, None)
+
+
+@pytest.mark.order(after="test_run_help.py::test_run_help")
+def test_scheduler_interrupts_hung_git(tmp_path, monkeypatch):
+    # Put a git executable that hangs first in the PATH inherited by the workers
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    git_path = bin_dir / "git"
+    git_path.write_text("#!/bin/sh\nsleep 60\n")
+    git_path.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    grace = 30
+    start = time.monotonic()
+    results = list(
+        run_tasks(
+            run_git, [(str(tmp_path), "status")], timeout=TASK_TIMEOUT, grace=grace
+        )
+    )
+    # Check that the task was stopped by its timeout signal, which must not be
+    # caught by the error handling of run_git, and not killed after the grace delay
+    assert time.monotonic() - start < grace
+    assert results == [
+        (
+            0,
+            None,
+            {"type": "TaskTimeoutError", "message": "Task timed out", "attempts": 1},
+        )
+    ]
@@ -0,0 +1,95 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Benchmark the TSV reader of datahipy against pandas on synthetic BIDS TSV files."""
+
+from __future__ import absolute_import
+import os
+import sys
+import json
+import time
+import subprocess
+import pytest
+
+# Number of rows of the synthetic participants.tsv file
+NUM_PARTICIPANTS = 20000
+
+# Number of rows of the synthetic channels.tsv file (e.g. a large SEEG montage)
+NUM_CHANNELS = 256
+
+
+def write_synthetic_tsv_files(io_path):
+    """Write synthetic participants.tsv and channels.tsv files and return their paths."""
+    participants_tsv = os.path.join(io_path, "benchmark_participants.tsv")
+    with open(participants_tsv, "w") as f:
+        f.write("participant_id\tage\tsex\tgroup\n")
+        for idx in range(NUM_PARTICIPANTS):
+            age = "n/a" if idx % 10 == 0 else str(20 + idx % 50)
+            f.write(f"sub-{idx:05d}\t{age}\t{'MF'[idx % 2]}\tgroup{idx % 3}\n")
+    channels_tsv = os.path.join(io_path, "benchmark_channels.tsv")
+    with open(channels_tsv, "w") as f:
+        f.write("name\ttype\tunits\tlow_cutoff\tsampling_frequency\tstatus\n")
+        for idx in range(NUM_CHANNELS):
+            f.write(f"v'{idx}\tSEEG\tmicroV\tn/a\t512\tgood\n")
+    return participants_tsv, channels_tsv
+
+
+def measure_import_time(module):
+    """Return the time in seconds to import a module in a new process."""
+    ret = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import time; start = time.perf_counter(); import {module}; "
+            "print(time.perf_counter() - start)",
+        ],
+        capture_output=True,
+        check=True,
+    )
+    return float(ret.stdout.decode().strip())
+
+
+@pytest.mark.order(after="test_run_help.py::test_run_help")
+def test_tsv_benchmark(io_path):
+    pd = pytest.importorskip("pandas")
+    from datahipy.bids.tsv import get_participants_tsv_summary, iter_tsv_rows
+
+    participants_tsv, channels_tsv = write_synthetic_tsv_files(io_path)
+    # Read the participants.tsv file with pandas
+    start = time.perf_counter()
+    participants_df = pd.read_csv(participants_tsv, sep="\t", header=0, na_filter=False)
+    ages = pd.to_numeric(participants_df["age"], errors="coerce")
+    pandas_summary = {
+        "AgeMin": ages.min(),
+        "AgeMax": ages.max(),
+        "ParticipantsCount": len(participants_df.index),
+        "ParticipantsGroups": list(participants_df["group"].unique()),
+    }
+    pandas_participants_time = time.perf_counter() - start
+    # Read the participants.tsv file with the datahipy TSV reader
+    start = time.perf_counter()
+    summary = get_participants_tsv_summary(participants_tsv)
+    tsv_participants_time = time.perf_counter() - start
+    # Read the channels.tsv file with pandas and with the datahipy TSV reader
+    start = time.perf_counter()
+    pandas_channels = json.loads(
+        pd.read_csv(channels_tsv, sep="\t").to_json(orient="records")
+    )
+    pandas_channels_time = time.perf_counter() - start
+    start = time.perf_counter()
+    channels = list(iter_tsv_rows(channels_tsv))
+    tsv_channels_time = time.perf_counter() - start
+    print(
+        f"participants.tsv ({NUM_PARTICIPANTS} rows): pandas {pandas_participants_time:.4f}s, "
+        f"datahipy {tsv_participants_time:.4f}s\n"
+        f"channels.tsv ({NUM_CHANNELS} rows): pandas {pandas_channels_time:.4f}s, "
+        f"datahipy {tsv_channels_time:.4f}s\n"
+        f"import time: pandas {measure_import_time('pandas'):.3f}s, "
+        f"datahipy.bids.tsv {measure_import_time('datahipy.bids.tsv'):.3f}s"
+    )
+    # Check that both readers give the same results
+    assert float(summary["AgeMin"]) == pandas_summary["AgeMin"]
+    assert float(summary["AgeMax"]) == pandas_summary["AgeMax"]
+    assert summary["ParticipantsCount"] == pandas_summary["ParticipantsCount"]
+    assert summary["ParticipantsGroups"] == pandas_summary["ParticipantsGroups"]
+    assert channels == pandas_channels
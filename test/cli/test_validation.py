@@ -0,0 +1,191 @@
+# Copyright (C) 2023, The HIP team and Contributors, All rights reserved.
+#  This software is distributed under the open-source Apache 2.0 license.
+
+"""Test the cache and the incremental merge of bids-validator outputs."""
+
+from __future__ import absolute_import
+import os
+import json
+import pytest
+
+from datahipy.bids import validation
+from datahipy.bids.const import BIDS_VERSION
+from datahipy.bids.validation import (
+    VALIDATOR_CACHE_NAMESPACE,
+    VALIDATOR_OPTIONS,
+    get_bids_validator_output_info,
+    get_changed_subjects,
+    get_participants_columns,
+    get_validated_fingerprints,
+    merge_validator_issues,
+)
+from datahipy.utils.cache import save_cache_entry
+
+
+def make_issue(code, *relative_paths):
+    """Return a bids-validator issue with an occurrence in each file."""
+    return {
+        "key": f"KEY_{code}",
+        "code": code,
+        "files": [
+            {"file": {"relativePath": path, "path": f"/ds{path}"}}
+            for path in relative_paths
+        ],
+    }
+
+
+def write_dataset(bids_dir, subjects):
+    """Write a minimal BIDS dataset with a participants.tsv file and subject directories."""
+    os.makedirs(bids_dir, exist_ok=True)
+    with open(os.path.join(bids_dir, "dataset_description.json"), "w") as f:
+        json.dump({"Name": "Validation cache", "BIDSVersion": BIDS_VERSION}, f)
+    with open(os.path.join(bids_dir, "participants.tsv"), "w") as f:
+        f.write("participant_id\tage\n")
+        for subject in subjects:
+            f.write(f"{subject}\t30\n")
+    for subject in subjects:
+        anat_dir = os.path.join(bids_dir, subject, "anat")
+        os.makedirs(anat_dir, exist_ok=True)
+        with open(os.path.join(anat_dir, f"{subject}_T1w.nii.gz"), "w") as f:
+            f.write(subject)
+
+
+@pytest.mark.order(after="test_run_help.py::test_run_help")
+def test_merge_validator_issues():
+    cached_issues = [
+        # File-level issue of a validated subject and of another subject
+        make_issue(1, "/sub-01/anat/sub-01_T1w.nii.gz", "/sub-02/anat/sub-02_T1w.nii.gz"),
+        # File-level issue only in the validated subject
+        make_issue(2, "/sub-01/anat/sub-01_T1w.json"),
+        # Issue on a top-level file
+        make_issue(3, "/participants.tsv"),
+        # Dataset-level issue
+        make_issue(4),
+    ]
+    new_issues = [
+        # Occurrence that is still reported in the validated subject
+        make_issue(1, "/sub-01/anat/sub-01_T1w.nii.gz"),
+        # Artifacts of the partial view of the dataset
+        make_issue(3, "/participants.tsv"),
+        make_issue(4),
+        make_issue(5),
+        # New issue of the validated subject with the code of a dataset-level issue
+        make_issue(4, "/sub-01/sub-01_scans.tsv"),
+    ]
+    merged = merge_validator_issues(cached_issues, new_issues, ["sub-01"])
+    assert merged == [
+        make_issue(1, "/sub-02/anat/sub-02_T1w.nii.gz", "/sub-01/anat/sub-01_T1w.nii.gz"),
+        make_issue(3, "/participants.tsv"),
+        make_issue(4),
+        make_issue(4, "/sub-01/sub-01_scans.tsv"),
+    ]
+    # Check that the cached issues are not modified
+    assert cached_issues[0] == make_issue(
+        1, "/sub-01/anat/sub-01_T1w.nii.gz", "/sub-02/anat/sub-02_T1w.nii.gz"
+    )
+
+
+@pytest.mark.order(after="test_run_help.py::test_run_help")
+def test_get_changed_subjects():
+    fingerprints = {"participants.tsv": "a", "sub-01": "b", "sub-02": "c", "sub-03": "d"}
+    columns = ["participant_id", "age"]
+    cached = {
+        "fingerprints": fingerprints,
+        "participants_columns": columns,
+        "returncode": 0,
+    }
+    assert get_changed_subjects(cached, dict(fingerprints), columns) == []
+    assert get_changed_subjects(cached, dict(fingerprints, **{"sub-02": "x"}), columns) == [
+        "sub-02"
+    ]
+    # Top-level file, added subject, new columns, and most subjects changed
+    for changed_fingerprints, changed_columns in [
+        (dict(fingerprints, **{"participants.tsv": "x"}), columns),
+        (dict(fingerprints, **{"sub-04": "x"}), columns),
+        (dict(fingerprints), columns + ["sex"]),
+        (dict(fingerprints, **{"sub-01": "x", "sub-02": "x"}), columns),
+    ]:
+        assert get_changed_subjects(cached, changed_fingerprints, changed_columns) is None
+    # Cache entry without the return code of the bids-validator
+    assert get_changed_subjects(dict(cached, returncode=None), fingerprints, columns) is None
+
+
+@pytest.mark.order(after="test_run_help.py::test_run_help")
+def test_get_bids_validator_output_info_cached(tmp_path, monkeypatch, cache_path):
+    bids_dir = str(tmp_path / "VALIDATION_CACHE_DS")
+    write_dataset(bids_dir, ["sub-01", "sub-02"])
+    issues = {
+        "errors": [make_issue(1, "/sub-01/anat/sub-01_T1w.nii.gz")],
+        "warnings": [],
+        "ignored": [],
+    }
+    cache_key = json.dumps({"schema": BIDS_VERSION, "options": VALIDATOR_OPTIONS})
+    save_cache_entry(
+        VALIDATOR_CACHE_NAMESPACE,
+        bids_dir,
+        cache_key,
+        {
+            "fingerprints": get_validated_fingerprints(bids_dir),
+            "participants_columns": get_participants_columns(bids_dir),
+            "issues": issues,
+            "returncode": 1,
+        },
+    )
+
+    def validate_bids_dataset(*args, **kwargs):
+        raise AssertionError("The bids-validator must not run on a cache hit")
+
+    monkeypatch.setattr(validation, "validate_bids_dataset", validate_bids_dataset)
+    output_info = get_bids_validator_output_info(bids_dir)
+    assert output_info["BIDSErrors"] == issues["errors"]
+    assert output_info["BIDSValid"] is False
+
+
+@pytest.mark.order(after="test_get_bids_validator_output_info_cached")
+def test_get_bids_validator_output_info_changed_subject(tmp_path, monkeypatch, cache_path):
+    bids_dir = str(tmp_path / "VALIDATION_CACHE_DS")
+    write_dataset(bids_dir, ["sub-01", "sub-02"])
+    # Cached validation that failed because of an error of sub-01
+    cache_key = json.dumps({"schema": BIDS_VERSION, "options": VALIDATOR_OPTIONS})
+    save_cache_entry(
+        VALIDATOR_CACHE_NAMESPACE,
+        bids_dir,
+        cache_key,
+        {
+            "fingerprints": get_validated_fingerprints(bids_dir),
+            "participants_columns": get_participants_columns(bids_dir),
+            "issues": {
+                "errors": [make_issue(1, "/sub-01/anat/sub-01_T1w.nii.gz")],
+                "warnings": [],
+                "ignored": [],
+            },
+            "returncode": 1,
+        },
+    )
+    # Fix the file of sub-01
+    with open(os.path.join(bids_dir, "sub-01", "anat", "sub-01_T1w.nii.gz"), "w") as f:
+        f.write("fixed sub-01")
+    validated_dirs = []
+
+    def validate_bids_dataset(view_dir, *args, **kwargs):
+        validated_dirs.append(view_dir)
+        assert sorted(os.listdir(view_dir)) == [
+            "dataset_description.json",
+            "participants.tsv",
+            "sub-01",
+        ]
+        warning = make_issue(2, "/sub-01/anat/sub-01_T1w.nii.gz")
+        warning["files"][0]["file"]["path"] = view_dir + "/sub-01/anat/sub-01_T1w.nii.gz"
+        # The view fails only because of a dataset-level error due to its partial content
+        output = {"issues": {"errors": [make_issue(3)], "warnings": [warning], "ignored": []}}
+        return output, 1
+
+    monkeypatch.setattr(validation, "validate_bids_dataset", validate_bids_dataset)
+    output_info = get_bids_validator_output_info(bids_dir)
+    assert len(validated_dirs) == 1
+    assert output_info["BIDSErrors"] == []
+    assert output_info["BIDSValid"] is True
+    # Check that the issues point to the files of the dataset instead of the view
+    assert output_info["BIDSWarnings"][0]["files"][0]["file"]["path"] == (
+        bids_dir + "/sub-01/anat/sub-01_T1w.nii.gz"
+    )
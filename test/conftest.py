@@ -107,3 +107,14 @@ def project_path(project_name):
             fix_permissions(path)
         shutil.rmtree(project_path)
     return project_path
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cache_path():
+    cache_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "tmp", "cache"))
+    if os.path.exists(cache_path):
+        shutil.rmtree(cache_path)
+    os.makedirs(cache_path, exist_ok=True)
+    # Isolate the datahipy cache used by the commands run during the tests
+    os.environ["DATAHIPY_CACHE_DIR"] = cache_path
+    return cache_path